@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+
+from app.admin.schemas import (
+    PoolStatsResponse,
+    ReplicaResponse,
+    SlowQueryResponse,
+    StatisticsCacheStatsResponse,
+)
+from app.database import get_pool_stats, get_replicas, get_slow_query_log
+from app.rolls.dao import get_statistics_cache
+
+router_admin = APIRouter(prefix="/admin", tags=["Администрирование"])
+
+
+@router_admin.get("/pool", response_model=PoolStatsResponse)
+async def get_pool():
+    """
+    Состояние пула соединений с БД: занятые и свободные соединения,
+    переполнение, среднее и максимальное ожидание соединения, таймауты.
+    """
+    return get_pool_stats()
+
+
+@router_admin.get("/replicas", response_model=list[ReplicaResponse])
+async def get_replicas_health():
+    """
+    Реплики для чтения (DB_REPLICA_URLS): результат последней проверки,
+    отставание в секундах и причина исключения из чтения.
+    """
+    return get_replicas().stats()
+
+
+@router_admin.get("/statistics-cache", response_model=StatisticsCacheStatsResponse)
+async def get_statistics_cache_stats():
+    """
+    Счётчики кэша статистики: попадания, промахи, вытеснения
+    (по размеру и времени жизни) и сброшенные после записи периоды.
+    """
+    return get_statistics_cache().stats()
+
+
+@router_admin.get("/slow-queries", response_model=list[SlowQueryResponse])
+async def get_slow_queries():
+    """
+    Последние медленные запросы (начиная с последнего): SQL, параметры,
+    метод DAO, длительность и план EXPLAIN (ANALYZE, BUFFERS).
+    Журнал включается настройкой SLOW_QUERY_LOG_ENABLED.
+    """
+    return get_slow_query_log().list()
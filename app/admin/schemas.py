@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Any, Literal
+
+from pydantic import BaseModel
+
+
+class PoolStatsResponse(BaseModel):
+    pool: str
+    size: int | None = None
+    checked_in: int | None = None
+    checked_out: int | None = None
+    overflow: int | None = None
+    max_overflow: int | None = None
+    checkouts: int | None = None
+    timeouts: int | None = None
+    wait_avg_ms: float | None = None
+    wait_max_ms: float | None = None
+
+
+class StatisticsCacheStatsResponse(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+
+class ReplicaResponse(BaseModel):
+    url: str
+    healthy: bool
+    lag: float | None
+    error: str | None
+    checked_at: datetime | None
+
+
+class SlowQueryResponse(BaseModel):
+    recorded_at: datetime
+    duration_ms: float
+    dao_method: str
+    statement: str
+    parameters: Any
+    plan: str | None
+    plan_status: Literal["disabled", "pending", "captured", "skipped", "failed"]
@@ -0,0 +1,221 @@
+"""
+Планы и время запросов к rolls при разных наборах индексов.
+
+Сравниваются три варианта:
+- before: индексы из первой миграции (только первичный ключ и ix_rolls_id);
+- btree: индексы миграции b41bb74d7d7f;
+- brin: вместо btree-индексов по created_at используется BRIN.
+
+Варианты before и brin собираются внутри транзакции, которая затем
+откатывается, поэтому схема БД после запуска не меняется.
+
+Запуск (нужна БД с применёнными миграциями):
+    python -m app.benchmarks.indexes --rows 1000000 --output indexes.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.database import dispose_engine, get_engine
+from app.rolls.dao import RollsDailyStatsDAO, RollsDAO, RollsInventoryDAO
+from app.rolls.models import Rolls
+from app.rolls.schemas import RollFilter
+
+TUNED_INDEXES = (
+    "ix_rolls_created_at_id",
+    "ix_rolls_deleted_at",
+    "ix_rolls_active_created_at",
+    "ix_rolls_created_at_brin",
+)
+
+VARIANTS = {
+    "before": [
+        *(f"DROP INDEX IF EXISTS {name}" for name in TUNED_INDEXES),
+        "CREATE INDEX ix_rolls_id ON rolls (id)",
+    ],
+    "btree": [],
+    "brin": [
+        *(f"DROP INDEX IF EXISTS {name}" for name in TUNED_INDEXES),
+        "CREATE INDEX ix_rolls_deleted_at ON rolls (deleted_at)",
+        "CREATE INDEX ix_rolls_created_at_brin ON rolls USING brin (created_at)",
+    ],
+}
+
+
+async def seed(rows: int, days: int):
+    """Дозаполняет rolls до rows строк рулонами за последние days дней"""
+    async with get_engine().begin() as conn:
+        existing = (await conn.execute(select(func.count()).select_from(Rolls))).scalar()
+        missing = rows - existing
+        if missing <= 0:
+            return
+        print(f"Добавляем {missing} рулонов...")
+        await conn.execute(
+            select(
+                func.ensure_rolls_partitions(
+                    func.localtimestamp() - timedelta(days=days), 3
+                )
+            )
+        )
+        # created_at растёт вместе с id, рулон лежит на складе до 60 дней
+        await conn.execute(
+            text("""
+                INSERT INTO rolls (length, weight, created_at, deleted_at)
+                SELECT
+                    round((5 + random() * 45)::numeric, 2),
+                    round((10 + random() * 90)::numeric, 2),
+                    created_at,
+                    nullif(
+                        least(
+                            created_at + random() * interval '60 days', localtimestamp
+                        ),
+                        localtimestamp
+                    )
+                FROM (
+                    SELECT
+                        localtimestamp
+                        - CAST(:span AS interval) * (1 - i / CAST(:missing AS float8))
+                        AS created_at
+                    FROM generate_series(1, CAST(:missing AS integer)) AS i
+                ) AS generated
+            """),
+            {"missing": missing, "span": timedelta(days=days)},
+        )
+    async with get_engine().connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE rolls"))
+    await RollsDailyStatsDAO.rebuild()
+    await RollsInventoryDAO.rebuild()
+
+
+def compile_query(query) -> str:
+    return str(
+        query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def build_queries(now: datetime) -> dict[str, str]:
+    """Запросы с теми же условиями, что строит RollsDAO"""
+    day_ago, week_ago, month_ago = (
+        now - timedelta(days=1),
+        now - timedelta(days=7),
+        now - timedelta(days=30),
+    )
+
+    def find_all(**filters):
+        conditions = RollsDAO._filter_conditions(RollFilter(**filters))
+        return compile_query(select(Rolls).where(*conditions))
+
+    return {
+        "find_all_created_day": find_all(created_at_min=day_ago, created_at_max=now),
+        "find_all_deleted_week": find_all(deleted_at_min=week_ago, deleted_at_max=now),
+        "find_all_created_month_heavy": find_all(
+            created_at_min=month_ago, weight_min=90
+        ),
+        "active_rolls_week": compile_query(
+            select(Rolls).where(Rolls.deleted_at.is_(None), Rolls.created_at >= week_ago)
+        ),
+        "page_by_created_at": compile_query(
+            select(Rolls)
+            .where(Rolls.created_at > month_ago)
+            .order_by(Rolls.created_at, Rolls.id)
+            .limit(100)
+        ),
+        "statistics_single_week": compile_query(
+            RollsDAO.statistics_query(week_ago, now, "single")
+        ),
+        "statistics_rollup_week": compile_query(
+            RollsDAO.statistics_query(week_ago, now, "rollup")
+        ),
+    }
+
+
+def summarize_plan(plan: dict) -> list[str]:
+    """Список узлов плана вида "Index Scan using ix_..." """
+    nodes = []
+
+    def walk(node):
+        name = node["Node Type"]
+        if "Index Name" in node:
+            name += f" using {node['Index Name']}"
+        nodes.append(name)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return nodes
+
+
+async def run_variant(variant: str, queries: dict[str, str], repeat: int) -> dict:
+    results = {}
+    async with get_engine().connect() as conn:
+        transaction = await conn.begin()
+        for statement in VARIANTS[variant]:
+            await conn.exec_driver_sql(statement)
+        if VARIANTS[variant]:
+            await conn.exec_driver_sql("ANALYZE rolls")
+
+        for name, sql in queries.items():
+            timings = []
+            for _ in range(repeat):
+                plan = (
+                    await conn.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"
+                    )
+                ).scalar()[0]
+                timings.append(plan["Execution Time"])
+            results[name] = {
+                "median_ms": statistics.median(timings),
+                "min_ms": min(timings),
+                "shared_buffers": plan["Plan"].get("Shared Hit Blocks", 0)
+                + plan["Plan"].get("Shared Read Blocks", 0),
+                "nodes": summarize_plan(plan),
+                "plan": plan,
+            }
+        await transaction.rollback()
+    return results
+
+
+async def main(args):
+    await seed(args.rows, args.days)
+    async with get_engine().connect() as conn:
+        total = (await conn.execute(select(func.count()).select_from(Rolls))).scalar()
+        now = (await conn.execute(select(func.max(Rolls.created_at)))).scalar()
+
+    queries = build_queries(now)
+    report = {"rows": total, "variants": {}}
+    for variant in VARIANTS:
+        report["variants"][variant] = await run_variant(variant, queries, args.repeat)
+
+    print(f"Строк в rolls: {total}")
+    print(f"{'запрос':32}" + "".join(f"{variant:>12}" for variant in VARIANTS))
+    for name in queries:
+        print(
+            f"{name:32}"
+            + "".join(
+                f"{report['variants'][variant][name]['median_ms']:>10.2f}ms"
+                for variant in VARIANTS
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2, default=str)
+
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Файл для JSON-отчёта с планами")
+    asyncio.run(main(parser.parse_args()))
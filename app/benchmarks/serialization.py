@@ -0,0 +1,142 @@
+"""
+Скорость отдачи списка рулонов: ORM + pydantic против строк Core + orjson.
+
+Сравниваются два пути:
+- orm: объекты Rolls с Decimal, валидация list[RollResponse] и json.dumps
+  (так список отдавался до перехода на ROLL_COLUMNS);
+- core: строки select(*ROLL_COLUMNS) с float, _asdict() и orjson.dumps
+  (текущий путь GET /rolls/).
+
+Без флага --db строки собираются в памяти и измеряется только сериализация.
+С флагом --db измеряется выборка из БД вместе с сериализацией (нужна БД
+с применёнными миграциями и не меньше --rows рулонов, см. app.benchmarks.indexes).
+
+Запуск:
+    python -m app.benchmarks.serialization --rows 100000 [--db]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from app.database import async_session_maker, dispose_engine
+from app.rolls.dao import ROLL_COLUMNS
+from app.rolls.models import Rolls
+from app.rolls.schemas import RollResponse
+
+roll_response_list = TypeAdapter(list[RollResponse])
+
+# В памяти строки Core заменяет namedtuple: у Row тот же _asdict()
+CoreRow = namedtuple("CoreRow", [column.key for column in ROLL_COLUMNS])
+
+
+def serialize_orm(rolls) -> bytes:
+    payload = roll_response_list.dump_python(
+        roll_response_list.validate_python(rolls, from_attributes=True), mode="json"
+    )
+    return json.dumps(payload).encode()
+
+
+def serialize_core(rows) -> bytes:
+    return orjson.dumps([row._asdict() for row in rows])
+
+
+def generate(rows: int) -> tuple[list[Rolls], list[CoreRow]]:
+    """Одни и те же рулоны в виде ORM-объектов и строк Core"""
+    start = datetime(2024, 1, 1)
+    objects = [
+        Rolls(
+            id=i,
+            length=Decimal(5 + i % 4500) / 100,
+            weight=Decimal(10 + i % 9000) / 100,
+            created_at=start + timedelta(minutes=i),
+            deleted_at=start + timedelta(minutes=i, days=30) if i % 3 else None,
+        )
+        for i in range(1, rows + 1)
+    ]
+    core = [
+        CoreRow(
+            roll.id,
+            float(roll.length),
+            float(roll.weight),
+            roll.created_at,
+            roll.deleted_at,
+        )
+        for roll in objects
+    ]
+    return objects, core
+
+
+def summarize(rows: int, timings: list[float]) -> dict:
+    median = statistics.median(timings)
+    return {"median_s": median, "rows_per_s": rows / median}
+
+
+def measure(func, data, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - started)
+    return summarize(len(data), timings)
+
+
+async def measure_db(rows: int, repeat: int) -> dict:
+    """Выборка и сериализация rows рулонов обоими путями"""
+    paths = {
+        "orm": (select(Rolls), lambda result: result.scalars().all(), serialize_orm),
+        "core": (select(*ROLL_COLUMNS), lambda result: result.all(), serialize_core),
+    }
+    report = {}
+    for name, (query, fetch, serialize) in paths.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            async with async_session_maker() as session:
+                data = fetch(await session.execute(query.order_by(Rolls.id).limit(rows)))
+            serialize(data)
+            timings.append(time.perf_counter() - started)
+        report[name] = summarize(len(data), timings)
+    await dispose_engine()
+    return report
+
+
+def main(args):
+    orm, core = generate(args.rows)
+    report = {
+        "rows": args.rows,
+        "serialize": {
+            "orm": measure(serialize_orm, orm, args.repeat),
+            "core": measure(serialize_core, core, args.repeat),
+        },
+    }
+    if args.db:
+        report["db"] = asyncio.run(measure_db(args.rows, args.repeat))
+
+    for section in ("serialize", "db"):
+        for path, result in report.get(section, {}).items():
+            print(
+                f"{section:10}{path:6}{result['median_s'] * 1000:>10.1f}ms"
+                f"{result['rows_per_s']:>14.0f} строк/с"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="Измерить и выборку из БД")
+    parser.add_argument("--output", help="Файл для JSON-отчёта")
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""
+Холодный старт воркера: сколько проходит от запуска процесса до ответа
+на первый запрос.
+
+Каждый замер выполняется в новом процессе интерпретатора и делится на фазы:
+- import: импорт app.main (настройки, модели, маршруты);
+- startup: lifespan приложения (движок, секции; пул прогревается в фоне);
+- first_request: первый GET /rolls/inventory через ASGI без сети.
+
+При preload_app (см. gunicorn.conf.py) фаза import выполняется один раз
+в мастер-процессе gunicorn, а воркеры после fork начинают сразу со startup.
+Нужна БД с применёнными миграциями (по умолчанию из .env).
+
+Запуск:
+    python -m app.benchmarks.startup [--runs 10]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+WORKER = """
+import asyncio
+import json
+import time
+
+# Клиент нужен только замеру, поэтому импортируется до отсчёта
+from httpx import ASGITransport, AsyncClient
+
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+
+async def main():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/rolls/inventory")
+            response.raise_for_status()
+        answered = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "startup": started - imported,
+        "first_request": answered - started,
+        "total": answered - start,
+    }))
+
+
+asyncio.run(main())
+"""
+
+PHASES = ("import", "startup", "first_request", "total")
+
+
+def measure() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    # Первый запуск прогревает кэш байткода и файловой системы
+    measure()
+    runs = [measure() for _ in range(args.runs)]
+
+    print(f"{'фаза':<15}{'медиана, мс':>14}{'максимум, мс':>15}")
+    for phase in PHASES:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<15}{statistics.median(values):>14.1f}{max(values):>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Нагрузочный прогон методов RollsDAO и всех эндпоинтов приложения.
+
+Для каждого масштаба из --scales таблица rolls дозаполняется до нужного
+числа строк (масштабы идут по возрастанию, уже вставленные строки
+переиспользуются), после чего каждый сценарий выполняется --requests раз
+с --concurrency параллельными вызовами:
+- dao: методы RollsDAO напрямую;
+- http: эндпоинты через httpx.ASGITransport, без сети и uvicorn.
+
+Для каждого сценария считаются перцентили задержки и пропускная способность.
+Кэш статистики на время прогона выключается, чтобы измерялись сами запросы.
+Отчёт пишется в JSON; с --baseline выводится сравнение p50 с прошлым отчётом.
+
+Запуск (нужна БД с применёнными миграциями, MODE=DEV):
+    python -m app.benchmarks.suite --scales 100000 1000000 --output bench.json
+    python -m app.benchmarks.suite --scales 1000000 --baseline bench.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select, text
+
+from app.benchmarks.indexes import seed
+from app.config import settings
+from app.database import dispose_engine, get_engine
+from app.main import app
+from app.rolls.dao import RollsDAO, RollsInventoryDAO
+from app.rolls.models import Rolls
+from app.rolls.schemas import RollFilter
+
+PERCENTILES = (50, 90, 95, 99)
+BULK_SIZE = 100
+BATCH_DELETE_SIZE = 10
+
+
+class Context:
+    """Общие данные сценариев одного масштаба"""
+
+    def __init__(self, now: datetime, days: int, fresh_ids: list[int]):
+        self.now = now
+        self.days = days
+        # Рулоны, созданные для сценариев удаления; каждый удаляется один раз
+        self.fresh_ids = iter(fresh_ids)
+
+    def window(self, i: int, length: timedelta) -> tuple[datetime, datetime]:
+        """Сдвигающееся окно, чтобы вызовы не попадали в одни и те же страницы"""
+        end = self.now - timedelta(days=i % max(self.days - 1, 1))
+        return end - length, end
+
+    def take_ids(self, count: int) -> list[int]:
+        return list(itertools.islice(self.fresh_ids, count))
+
+
+def new_rolls(count: int) -> list[dict]:
+    return [
+        {"length": 10 + i % 40, "weight": 20 + i % 80, "created_at": datetime.now()}
+        for i in range(count)
+    ]
+
+
+def dao_cases(ctx: Context) -> dict:
+    def find_all_day(i):
+        start, end = ctx.window(i, timedelta(days=1))
+        return RollsDAO.find_all(RollFilter(created_at_min=start, created_at_max=end))
+
+    def find_page(i):
+        start, _ = ctx.window(i, timedelta(days=30))
+        return RollsDAO.find_page(
+            RollFilter(created_at_min=start), limit=100, order_by="created_at"
+        )
+
+    def summary_month(i):
+        start, end = ctx.window(i, timedelta(days=30))
+        filters = RollFilter(created_at_min=start, created_at_max=end)
+        return RollsDAO.get_summary(filters)
+
+    async def stream_day(i):
+        start, end = ctx.window(i, timedelta(days=1))
+        filters = RollFilter(created_at_min=start, created_at_max=end)
+        async for _ in RollsDAO.stream_all(filters, settings.EXPORT_BATCH_SIZE):
+            pass
+
+    def statistics_case(length: timedelta, strategy: str):
+        def run(i):
+            return RollsDAO.get_statistics(*ctx.window(i, length), strategy=strategy)
+
+        return run
+
+    return {
+        "find_all_day": find_all_day,
+        "find_page_100": find_page,
+        "stream_all_day": stream_day,
+        "summary_month": summary_month,
+        "statistics_week_rollup": statistics_case(timedelta(days=7), "rollup"),
+        "statistics_week_single": statistics_case(timedelta(days=7), "single"),
+        "statistics_year_rollup": statistics_case(timedelta(days=365), "rollup"),
+        "statistics_series_month": lambda i: RollsDAO.get_statistics_series(
+            *ctx.window(i, timedelta(days=30)), "day"
+        ),
+        "percentiles_month": lambda i: RollsDAO.get_percentiles(
+            *ctx.window(i, timedelta(days=30))
+        ),
+        "add": lambda i: RollsDAO.add(length=10 + i % 40, weight=20 + i % 80),
+        f"add_many_{BULK_SIZE}": lambda i: RollsDAO.add_many(new_rolls(BULK_SIZE)),
+        "mark_as_deleted": lambda i: RollsDAO.mark_as_deleted(ctx.take_ids(1)[0]),
+        f"mark_many_as_deleted_{BATCH_DELETE_SIZE}": (
+            lambda i: RollsDAO.mark_many_as_deleted(ids=ctx.take_ids(BATCH_DELETE_SIZE))
+        ),
+        "inventory": lambda i: RollsInventoryDAO.get(),
+    }
+
+
+def http_cases(ctx: Context, client: AsyncClient) -> dict:
+    async def request(method: str, url: str, **kwargs):
+        response = await client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"{method} {url}: {response.status_code} {response.text}"
+            )
+        return response
+
+    def window_params(i: int, length: timedelta, prefix: str) -> dict:
+        start, end = ctx.window(i, length)
+        return {f"{prefix}_min": start.isoformat(), f"{prefix}_max": end.isoformat()}
+
+    def get_rolls_day(i):
+        # Без limit отдаётся только первая страница (ROLLS_PAGE_SIZE)
+        params = {**window_params(i, timedelta(days=1), "created_at"), "limit": 1000}
+        return request("GET", "/rolls/", params=params)
+
+    def get_rolls_page(i):
+        start, _ = ctx.window(i, timedelta(days=30))
+        params = {
+            "created_at_min": start.isoformat(),
+            "limit": 100,
+            "order_by": "created_at",
+        }
+        return request("GET", "/rolls/", params=params)
+
+    def get_summary(i):
+        params = window_params(i, timedelta(days=30), "created_at")
+        return request("GET", "/rolls/summary", params=params)
+
+    def export(file_format: str):
+        def run(i):
+            params = window_params(i, timedelta(days=1), "created_at")
+            params["format"] = file_format
+            return request("GET", "/rolls/export", params=params)
+
+        return run
+
+    def get_statistics(i):
+        start, end = ctx.window(i, timedelta(days=7))
+        params = {"start_date": start.isoformat(), "end_date": end.isoformat()}
+        return request("GET", "/rolls/statistics", params=params)
+
+    def get_statistics_series(i):
+        start, end = ctx.window(i, timedelta(days=30))
+        params = {"start_date": start.isoformat(), "end_date": end.isoformat()}
+        return request(
+            "GET", "/rolls/statistics/series", params={**params, "bucket": "day"}
+        )
+
+    def get_percentiles(i):
+        start, end = ctx.window(i, timedelta(days=30))
+        params = {"start_date": start.isoformat(), "end_date": end.isoformat()}
+        return request("GET", "/rolls/statistics/percentiles", params=params)
+
+    def bulk(i):
+        rolls = [
+            {"length": roll["length"], "weight": roll["weight"]}
+            for roll in new_rolls(BULK_SIZE)
+        ]
+        return request("POST", "/rolls/bulk", json=rolls)
+
+    return {
+        "GET /rolls/ day": get_rolls_day,
+        "GET /rolls/ page_100": get_rolls_page,
+        "GET /rolls/summary month": get_summary,
+        "GET /rolls/export ndjson": export("ndjson"),
+        "GET /rolls/export csv": export("csv"),
+        "GET /rolls/statistics week": get_statistics,
+        "GET /rolls/statistics/series month": get_statistics_series,
+        "GET /rolls/statistics/percentiles month": get_percentiles,
+        "POST /rolls/": lambda i: request(
+            "POST", "/rolls/", json={"length": 10 + i % 40, "weight": 20 + i % 80}
+        ),
+        f"POST /rolls/bulk {BULK_SIZE}": bulk,
+        "DELETE /rolls/{roll_id}": (
+            lambda i: request("DELETE", f"/rolls/{ctx.take_ids(1)[0]}")
+        ),
+        f"POST /rolls/batch-delete {BATCH_DELETE_SIZE}": lambda i: request(
+            "POST", "/rolls/batch-delete", json={"ids": ctx.take_ids(BATCH_DELETE_SIZE)}
+        ),
+        "GET /admin/pool": lambda i: request("GET", "/admin/pool"),
+        "GET /admin/statistics-cache": (
+            lambda i: request("GET", "/admin/statistics-cache")
+        ),
+        "GET /rolls/inventory": lambda i: request("GET", "/rolls/inventory"),
+        "GET /metrics": lambda i: request("GET", "/metrics"),
+        "GET /admin/slow-queries": lambda i: request("GET", "/admin/slow-queries"),
+        "GET /admin/replicas": lambda i: request("GET", "/admin/replicas"),
+    }
+
+
+def summarize(latencies: list[float], wall: float) -> dict:
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+    return {
+        "requests": len(latencies_ms),
+        "mean_ms": statistics.fmean(latencies_ms),
+        **{f"p{p}_ms": cuts[p - 1] for p in PERCENTILES},
+        "max_ms": latencies_ms[-1],
+        "throughput_rps": len(latencies_ms) / wall,
+    }
+
+
+async def measure(case, requests: int, concurrency: int, warmup: int) -> dict:
+    """Выполняет case(i) requests раз силами concurrency параллельных воркеров"""
+    for i in range(warmup):
+        await case(i)
+
+    counter = itertools.count(warmup)
+    latencies = []
+
+    async def worker():
+        for i in counter:
+            if i >= warmup + requests:
+                return
+            started = time.perf_counter()
+            await case(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def prepare_fresh_ids(count: int) -> list[int]:
+    """Рулоны для сценариев удаления, чтобы не трогать засеянные данные"""
+    ids = []
+    for offset in range(0, count, settings.BULK_MAX_ROLLS):
+        batch = min(settings.BULK_MAX_ROLLS, count - offset)
+        ids += await RollsDAO.add_many(new_rolls(batch))
+    return ids
+
+
+async def run_scale(rows: int, args) -> dict:
+    await seed(rows, args.days)
+    async with get_engine().connect() as conn:
+        total = (await conn.execute(select(func.count()).select_from(Rolls))).scalar()
+        now = (await conn.execute(select(func.max(Rolls.created_at)))).scalar()
+
+    calls = args.requests + args.warmup
+    # По одному набору для уровней dao и http
+    deletes_per_level = calls * (1 + BATCH_DELETE_SIZE)
+    fresh_ids = await prepare_fresh_ids(2 * deletes_per_level)
+    ctx = Context(now, args.days, fresh_ids)
+
+    report = {"rows": total, "dao": {}, "http": {}}
+    for name, case in dao_cases(ctx).items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        report["dao"][name] = await measure(
+            case, args.requests, args.concurrency, args.warmup
+        )
+        print_result(rows, "dao", name, report["dao"][name])
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, case in http_cases(ctx, client).items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            report["http"][name] = await measure(
+                case, args.requests, args.concurrency, args.warmup
+            )
+            print_result(rows, "http", name, report["http"][name])
+    return report
+
+
+def print_result(rows: int, level: str, name: str, result: dict):
+    print(
+        f"{rows:>10} {level:5}{name:40}"
+        f"{result['p50_ms']:>9.2f}{result['p90_ms']:>9.2f}{result['p99_ms']:>9.2f}ms"
+        f"{result['throughput_rps']:>10.1f} rps"
+    )
+
+
+def compare(report: dict, baseline: dict):
+    """Отношение p50 текущего прогона к p50 из baseline для совпадающих сценариев"""
+    previous = {scale["rows_requested"]: scale for scale in baseline["scales"]}
+    print(f"\nСравнение с {baseline['meta'].get('commit')} (p50, текущий / прошлый)")
+    for scale in report["scales"]:
+        old = previous.get(scale["rows_requested"])
+        if old is None:
+            continue
+        for level in ("dao", "http"):
+            for name, result in scale[level].items():
+                if name in old[level]:
+                    before, after = old[level][name]["p50_ms"], result["p50_ms"]
+                    print(
+                        f"{scale['rows_requested']:>10} {level:5}{name:40}"
+                        f"{before:>9.2f} -> {after:>9.2f}ms  x{after / before:.2f}"
+                    )
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    settings.STATISTICS_CACHE_ENABLED = False
+    async with get_engine().connect() as conn:
+        server_version = (await conn.execute(text("SHOW server_version"))).scalar()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "postgres": server_version,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "statistics_strategy": settings.STATISTICS_STRATEGY,
+            "pool_size": settings.DB_POOL_SIZE,
+        },
+        "scales": [],
+    }
+    print(f"{'rows':>10} {'level':5}{'case':40}{'p50':>9}{'p90':>9}{'p99':>9}")
+    for rows in sorted(args.scales):
+        scale = await run_scale(rows, args)
+        report["scales"].append({"rows_requested": rows, **scale})
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            compare(report, json.load(file))
+
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--only", nargs="*", help="Только сценарии, содержащие подстроку"
+    )
+    parser.add_argument("--output", help="Файл для JSON-отчёта")
+    parser.add_argument("--baseline", help="Прошлый JSON-отчёт для сравнения")
+    asyncio.run(main(parser.parse_args()))
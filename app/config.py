@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Literal, Optional
 
 from pydantic import ConfigDict
@@ -19,6 +20,108 @@ class Settings(BaseSettings):
     TEST_DB_PASS: Optional[str] = None
     TEST_DB_NAME: Optional[str] = None
 
+    # Пул соединений (в режиме TEST пул не используется)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    # Размер кэша подготовленных запросов на соединение, 0 — отключить (pgbouncer)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Открывать DB_POOL_SIZE соединений при старте приложения
+    DB_POOL_WARMUP: bool = True
+
+    # Реплики для чтения (URL через запятую): find_* и статистика читаются
+    # с них по кругу, запись идёт в основную БД. Реплика, отстающая больше
+    # DB_REPLICA_MAX_LAG секунд или недоступная, исключается до следующей
+    # проверки (раз в DB_REPLICA_CHECK_INTERVAL секунд). После записи клиент
+    # READ_YOUR_WRITES_WINDOW секунд читает с основной БД (cookie last_write)
+    DB_REPLICA_URLS: str = ""
+    DB_REPLICA_MAX_LAG: float = 10
+    DB_REPLICA_CHECK_INTERVAL: float = 5
+    READ_YOUR_WRITES_WINDOW: float = 10
+
+    # "rollup" — статистика по дневным агрегатам, "single" — одним запросом
+    # по rolls, "legacy" — прежний расчёт по частям
+    STATISTICS_STRATEGY: Literal['rollup', 'single', 'legacy'] = 'rollup'
+    # Кэш статистики: размер, время жизни для незакончившихся периодов (сек.)
+    # и для закончившихся. Кэш у каждого воркера свой, и записи других
+    # воркеров его не сбрасывают, поэтому закончившиеся периоды тоже живут
+    # ограниченное время (None — пока их не затронет запись в этом процессе)
+    STATISTICS_CACHE_ENABLED: bool = True
+    STATISTICS_CACHE_SIZE: int = 256
+    STATISTICS_CACHE_TTL: float = 5
+    STATISTICS_CACHE_CLOSED_TTL: Optional[float] = 300
+    # Наибольшее количество интервалов в /rolls/statistics/series
+    STATISTICS_SERIES_MAX_BUCKETS: int = 1000
+    # Сжатие дневных t-digest для перцентилей: больше — точнее и крупнее
+    QUANTILE_SKETCH_COMPRESSION: int = 200
+
+    # На сколько месяцев вперёд создавать секции rolls: при старте приложения
+    # и затем раз в ROLLS_PARTITIONS_INTERVAL секунд
+    ROLLS_PARTITIONS_AHEAD: int = 3
+    ROLLS_PARTITIONS_INTERVAL: float = 86400
+
+    # Архивирование: рулоны, удалённые больше ARCHIVE_AFTER_DAYS дней назад,
+    # переносятся в rolls_archive пачками по ARCHIVE_BATCH_SIZE раз в
+    # ARCHIVE_INTERVAL секунд. ARCHIVE_AFTER_DAYS можно только уменьшать:
+    # запросы читают архив, только если период захватывает время до этой границы
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 5000
+    ARCHIVE_INTERVAL: float = 600
+
+    # Количество строк, читаемых из курсора за раз при выгрузке рулонов
+    EXPORT_BATCH_SIZE: int = 5000
+    # Размер страницы GET /rolls/ без limit; все рулоны отдаёт /rolls/export
+    ROLLS_PAGE_SIZE: int = 100
+    # Максимальное количество рулонов в одном запросе массового добавления
+    # и размер его тела в байтах; проверяются до разбора рулонов
+    BULK_MAX_ROLLS: int = 100000
+    BULK_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Групповая запись POST /rolls/: одновременные запросы за GROUP_COMMIT_WINDOW_MS
+    # миллисекунд (или GROUP_COMMIT_MAX_BATCH рулонов) добавляются одним
+    # INSERT и одним commit
+    GROUP_COMMIT_ENABLED: bool = False
+    GROUP_COMMIT_WINDOW_MS: float = 5
+    GROUP_COMMIT_MAX_BATCH: int = 100
+
+    # Метрики Prometheus на /metrics: HTTP-запросы по маршрутам и SQL-запросы
+    # по методам DAO
+    METRICS_ENABLED: bool = True
+
+    # Журнал медленных запросов (/admin/slow-queries): порог в миллисекундах,
+    # количество хранимых записей и снятие плана EXPLAIN (ANALYZE, BUFFERS)
+    SLOW_QUERY_LOG_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 500
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN: bool = True
+
     model_config = ConfigDict(env_file=".env")
 
-settings = Settings()
+
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Настройки читаются из окружения при первом обращении, а не при импорте;
+    get_settings.cache_clear() перечитывает их. Кэш статистики и групповая
+    запись после этого создаются заново, движок — после dispose_engine()
+    """
+    return Settings()
+
+
+class LazySettings:
+    """Обращается к get_settings(), поэтому импорт settings ничего не читает"""
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+    def __delattr__(self, name):
+        delattr(get_settings(), name)
+
+
+settings = LazySettings()
@@ -1,6 +1,7 @@
 from sqlalchemy import delete, insert, select, update
 
-from app.database import async_session_maker
+from app.database import async_session_maker, read_session_maker
+from app.metrics.db import dao_method
 
 
 class BaseDAO:
@@ -8,21 +9,24 @@ class BaseDAO:
 
 
     @classmethod
+    @dao_method
     async def find_one_or_none(cls, **filter_by):
-        async with async_session_maker() as session:
+        async with read_session_maker()() as session:
             query = select(cls.model.__table__.columns).filter_by(**filter_by)
             result = await session.execute(query)
             return result.mappings().one_or_none()
 
     @classmethod
+    @dao_method
     async def find_all(cls, **filter_by):
-        async with async_session_maker() as session:
+        async with read_session_maker()() as session:
             query = select(cls.model.__table__.columns).filter_by(**filter_by)
             result = await session.execute(query)
             return result.mappings().all()
     
 
     @classmethod
+    @dao_method
     async def add(cls, **data):
         query = insert(cls.model).values(**data).returning(cls.model.__table__.columns)
         async with async_session_maker() as session:
@@ -31,6 +35,7 @@ class BaseDAO:
             return result.mappings().first()
 
     @classmethod
+    @dao_method
     async def delete(cls, **filter_by):
         async with async_session_maker() as session:
             query = delete(cls.model).filter_by(**filter_by).returning(cls.model.__table__.columns)
@@ -39,6 +44,7 @@ class BaseDAO:
             return result.mappings().first()
     
     @classmethod
+    @dao_method
     async def update(cls, id: int, **update_values):
          async with async_session_maker() as session:
             query = update(cls.model).filter_by(id=id).values(**update_values).returning(cls.model.__table__.columns)
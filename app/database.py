@@ -1,23 +1,201 @@
-from sqlalchemy import NullPool
+import asyncio
+import logging
+import time
+
+from sqlalchemy import NullPool, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import settings
+from app.metrics.db import instrument_engine
+from app.metrics.slow_queries import SlowQueryLog
+from app.replicas import ReplicaSet, read_from_primary, read_pin
+
+logger = logging.getLogger("app.database")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, который считает ожидание соединений и таймауты"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+def database_url() -> str:
+    if settings.MODE == "TEST":
+        return f"postgresql+asyncpg://{settings.TEST_DB_USER}:{settings.TEST_DB_PASS}@{settings.TEST_DB_HOST}:{settings.TEST_DB_PORT}/{settings.TEST_DB_NAME}"
+    return f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+
+
+def database_params() -> dict:
+    if settings.MODE == "TEST":
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            # Кэш подготовленных запросов SQLAlchemy и самого asyncpg
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+    }
+
+
+class LazySessionMaker(sessionmaker):
+    """sessionmaker, который создаёт движок при открытии первой сессии"""
+
+    def __call__(self, **local_kw):
+        if self.kw["bind"] is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+
+# Движок, реплики и журнал медленных запросов создаются при первом
+# обращении (get_engine), а не при импорте: так воркеры gunicorn после
+# preload не делят соединения мастер-процесса, а Alembic и тесты успевают
+# поменять настройки. Закрываются в dispose_engine при остановке приложения
+async_session_maker = LazySessionMaker(class_=AsyncSession, expire_on_commit=False)
+_engine = None
+_replicas = None
+_slow_query_log = None
 
 
-if settings.MODE == "TEST":
-    DATABASE_URL = f"postgresql+asyncpg://{settings.TEST_DB_USER}:{settings.TEST_DB_PASS}@{settings.TEST_DB_HOST}:{settings.TEST_DB_PORT}/{settings.TEST_DB_NAME}"
-    DATABASE_PARAMS = {"poolclass": NullPool}
-else:
-    DATABASE_URL = f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
-    DATABASE_PARAMS = {}
+def get_engine():
+    global _engine, _replicas
+    if _engine is None:
+        params = database_params()
+        _engine = create_async_engine(database_url(), **params)
+        _replicas = ReplicaSet(
+            [url.strip() for url in settings.DB_REPLICA_URLS.split(",") if url.strip()],
+            params,
+            max_lag=settings.DB_REPLICA_MAX_LAG,
+        )
+        async_session_maker.configure(bind=_engine)
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            get_slow_query_log().instrument(_engine)
+        if settings.METRICS_ENABLED:
+            for engine in [_engine, *_replicas.engines]:
+                instrument_engine(engine.sync_engine)
+    return _engine
 
-engine = create_async_engine(DATABASE_URL, **DATABASE_PARAMS)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+def get_replicas() -> ReplicaSet:
+    get_engine()
+    return _replicas
+
+
+def get_slow_query_log() -> SlowQueryLog:
+    global _slow_query_log
+    if _slow_query_log is None:
+        _slow_query_log = SlowQueryLog(
+            size=settings.SLOW_QUERY_LOG_SIZE,
+            threshold=settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+            explain=settings.SLOW_QUERY_EXPLAIN,
+        )
+    return _slow_query_log
+
+
+async def dispose_engine():
+    """Закрывает соединения основной БД и реплик; get_engine создаст их заново"""
+    global _engine, _replicas
+    if _engine is None:
+        return
+    await _replicas.dispose()
+    await _engine.dispose()
+    async_session_maker.configure(bind=None)
+    _engine = _replicas = None
+
+
+def read_session_maker():
+    """
+    sessionmaker для чтения: здоровая реплика, если они настроены и запрос
+    не требует читать свои записи, иначе основная БД. Внутри HTTP-запроса
+    все чтения идут туда же, куда первое (read_pin)
+    """
+    pin = read_pin.get()
+    if pin is not None and "session_maker" in pin:
+        return pin["session_maker"]
+
+    replicas = get_replicas()
+    if not replicas or read_from_primary.get():
+        session_maker = async_session_maker
+    else:
+        session_maker = replicas.session_maker() or async_session_maker
+    if pin is not None:
+        pin["session_maker"] = session_maker
+    return session_maker
 
 
 class Base(DeclarativeBase):
     pass
 
 
-print(DATABASE_URL)
+def get_pool_stats() -> dict:
+    """Текущее состояние пула соединений"""
+    pool = get_engine().sync_engine.pool
+    if not isinstance(pool, InstrumentedPool):
+        return {"pool": type(pool).__name__}
+
+    wait_avg = pool.wait_total / pool.checkouts if pool.checkouts else 0.0
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_avg_ms": wait_avg * 1000,
+        "wait_max_ms": pool.wait_max * 1000,
+    }
+
+
+async def warm_up_pool(connections: int):
+    """
+    Заранее открывает соединения, чтобы первые запросы не ждали подключения.
+    Ошибки не мешают старту приложения, но пишутся в лог
+    """
+
+    engine = get_engine()
+
+    async def open_connection():
+        conn = await engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    opened = await asyncio.gather(
+        *(open_connection() for _ in range(connections)), return_exceptions=True
+    )
+    errors = [conn for conn in opened if isinstance(conn, BaseException)]
+    for conn in opened:
+        if not isinstance(conn, BaseException):
+            await conn.close()
+    if errors:
+        logger.warning(
+            "Прогрев пула: не открыто %d из %d соединений: %s",
+            len(errors), connections, str(errors[0]) or type(errors[0]).__name__,
+        )
@@ -1,7 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 
+from app.admin.router import router_admin
+from app.config import settings
+from app.database import dispose_engine, get_replicas, warm_up_pool
+from app.metrics.middleware import MetricsMiddleware
+from app.metrics.router import router_metrics
+from app.replicas import ReadYourWritesMiddleware
+from app.rolls.archiver import run_archiver
+from app.rolls.dao import RollsDAO
+from app.rolls.group_commit import close_group_committer
+from app.rolls.partitioner import run_partitioner
 from app.rolls.router import router_rolls
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Движок и реплики создаются в воркере, а не при импорте в мастер-процессе gunicorn
+    replicas = get_replicas()
+    tasks = []
+    if settings.DB_POOL_WARMUP and settings.MODE != "TEST":
+        # Пул прогревается в фоне: воркер принимает запросы, не дожидаясь
+        # всех соединений
+        tasks.append(asyncio.create_task(warm_up_pool(settings.DB_POOL_SIZE)))
+    if settings.MODE != "TEST":
+        # Секции на ближайшие месяцы; без них новые рулоны попадут в rolls_default.
+        # Дальше их создаёт фоновая задача, пока воркер работает
+        await RollsDAO.ensure_partitions()
+        tasks.append(asyncio.create_task(run_partitioner()))
+    if settings.ARCHIVE_ENABLED and settings.MODE != "TEST":
+        tasks.append(asyncio.create_task(run_archiver()))
+    if replicas:
+        tasks.append(
+            asyncio.create_task(
+                replicas.run_health_checks(settings.DB_REPLICA_CHECK_INTERVAL)
+            )
+        )
+    yield
+    # Рулоны, ожидающие групповой записи, записываются до остановки
+    await close_group_committer()
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await dispose_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router_rolls)
+app.include_router(router_admin)
+app.include_router(router_metrics)
+
+# Настройки middleware и /metrics читают при запросах, а не здесь,
+# поэтому импорт app.main не требует окружения.
+# Без реплик только помечает запросы; чтение и так идёт с основной БД
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,149 @@
+from bisect import bisect_left
+
+# Границы корзин гистограмм в секундах
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Счётчик с метками. Значения хранятся по кортежу значений меток"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.labels, labels), value
+
+    def clear(self):
+        self.values.clear()
+
+
+class Histogram:
+    """
+    Гистограмма с метками в формате Prometheus. Для каждого набора меток
+    хранятся количества по корзинам (не накопленные), сумма и количество.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets=HTTP_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # Корзины, затем +Inf, затем сумма
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labels, labels, le),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", _format_labels(self.labels, labels), series[-1]
+            yield f"{self.name}_count", _format_labels(self.labels, labels), cumulative
+
+    def clear(self):
+        self.values.clear()
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса. При нескольких воркерах каждый воркер отдаёт свои
+    значения, суммирование остаётся на стороне Prometheus.
+    """
+
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.register(
+    Counter(
+        "http_requests_total",
+        "Количество HTTP-запросов",
+        ("method", "route", "status"),
+    )
+)
+http_request_duration_seconds = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Время обработки HTTP-запроса",
+        ("method", "route"),
+        HTTP_BUCKETS,
+    )
+)
+db_query_duration_seconds = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Время выполнения SQL-запросов по методам DAO",
+        ("dao_method",),
+        DB_BUCKETS,
+    )
+)
+db_query_errors_total = registry.register(
+    Counter(
+        "db_query_errors_total",
+        "Количество SQL-запросов, завершившихся ошибкой",
+        ("dao_method",),
+    )
+)
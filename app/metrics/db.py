@@ -0,0 +1,77 @@
+import inspect
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+
+from app.metrics.collector import db_query_duration_seconds, db_query_errors_total
+
+# Метод DAO, из которого сейчас выполняются запросы
+current_dao_method: ContextVar[str] = ContextVar("current_dao_method", default="other")
+
+
+def dao_method(func):
+    """
+    Помечает запросы, выполненные внутри метода DAO, его именем
+    (вида RollsDAO.find_all) через current_dao_method.
+    Ставится под @classmethod / @staticmethod.
+    """
+
+    def method_name(args) -> str:
+        owner = args[0] if args and isinstance(args[0], type) else None
+        return f"{owner.__name__}.{func.__name__}" if owner else func.__qualname__
+
+    if inspect.isasyncgenfunction(func):
+
+        @wraps(func)
+        async def generator_wrapper(*args, **kwargs):
+            name = method_name(args)
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    # Метка ставится только на время шага генератора, чтобы
+                    # не попасть на запросы вызывающего кода между шагами
+                    token = current_dao_method.set(name)
+                    try:
+                        item = await anext(generator)
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        current_dao_method.reset(token)
+                    yield item
+            finally:
+                await generator.aclose()
+
+        return generator_wrapper
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_dao_method.set(method_name(args))
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_dao_method.reset(token)
+
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_query_duration_seconds.observe(
+        time.perf_counter() - context._query_started, current_dao_method.get()
+    )
+
+
+def _handle_error(exception_context):
+    db_query_errors_total.inc(current_dao_method.get())
+
+
+def instrument_engine(engine):
+    """Подключает учёт запросов к движку (sync_engine для AsyncEngine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
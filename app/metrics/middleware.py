@@ -0,0 +1,42 @@
+import time
+
+from app.config import settings
+from app.metrics.collector import http_request_duration_seconds, http_requests_total
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware, которое считает запросы и время их обработки по шаблону
+    маршрута (/rolls/{roll_id}), а не по фактическому пути, чтобы количество
+    рядов метрик не зависело от id в запросах.
+    При METRICS_ENABLED=False пропускает запросы без подсчёта.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Роутер дописывает найденный маршрут в тот же scope
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_request_duration_seconds.observe(
+                time.perf_counter() - started, method, template
+            )
+            http_requests_total.inc(method, template, str(status_code))
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.metrics.collector import registry
+
+router_metrics = APIRouter(tags=["Метрики"])
+
+
+@router_metrics.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Метрики в текстовом формате Prometheus: количество и время HTTP-запросов
+    по шаблонам маршрутов, количество и время SQL-запросов по методам DAO.
+    При METRICS_ENABLED=False не отдаются (404).
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Метрики выключены"
+        )
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
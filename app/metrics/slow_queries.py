@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app.metrics.db import current_dao_method
+
+logger = logging.getLogger("app.slow_queries")
+
+# Опция выполнения, которой помечаются запросы самого журнала,
+# чтобы их EXPLAIN не попадал в журнал повторно
+SKIP_OPTION = "skip_slow_query_log"
+
+# Запросы, которые EXPLAIN ANALYZE выполнил бы с побочными эффектами:
+# изменение данных (в том числе в WITH), блокировка строк SELECT ... FOR
+# и вызовы функций с побочными эффектами (последовательности, DDL секций,
+# advisory-блокировки, уведомления)
+WRITE_PATTERN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE)\b|\bFOR\s+(KEY\s+)?SHARE\b"
+    r"|\b(nextval|setval|ensure_rolls_partitions|pg_advisory_\w+|pg_notify)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def is_read_only(statement: str) -> bool:
+    """Можно ли снять план запроса с ANALYZE, то есть выполнив его ещё раз"""
+    words = statement.lstrip().split(None, 1)
+    return (
+        bool(words)
+        and words[0].upper() in ("SELECT", "WITH", "VALUES", "TABLE")
+        and WRITE_PATTERN.search(statement) is None
+    )
+
+
+def _to_json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _to_json(item) for key, item in value.items()}
+    return str(value)
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных запросов: последние size запросов дольше threshold
+    секунд с параметрами, методом DAO и планом EXPLAIN (ANALYZE, BUFFERS).
+
+    План снимается в фоновой задаче на отдельном соединении внутри
+    транзакции, которая затем откатывается. ANALYZE выполняет запрос ещё раз,
+    поэтому используется только для чтения (is_read_only); для
+    INSERT/UPDATE/DELETE и блокирующих SELECT снимается план без выполнения
+    (EXPLAIN), чтобы не повторять запись, триггеры и блокировки.
+    Одновременно снимается не больше одного плана, остальные пропускаются,
+    чтобы разбор медленных запросов не нагружал БД ещё сильнее.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        threshold: float,
+        explain: bool = True,
+        explain_timeout: float = 30,
+    ):
+        self.threshold = threshold
+        self.explain = explain
+        self.explain_timeout = explain_timeout
+        self.entries: deque[dict] = deque(maxlen=size)
+        self.engine = None
+        self._explaining = False
+        self._tasks: set[asyncio.Task] = set()
+
+    def instrument(self, engine):
+        """Подключает журнал к AsyncEngine"""
+        self.engine = engine
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def remove(self):
+        sync_engine = self.engine.sync_engine
+        event.remove(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        self.engine = None
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        context._slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        duration = time.perf_counter() - context._slow_query_started
+        if duration < self.threshold or context.execution_options.get(SKIP_OPTION):
+            return
+
+        entry = {
+            "recorded_at": datetime.now(),
+            "duration_ms": duration * 1000,
+            "dao_method": current_dao_method.get(),
+            "statement": statement,
+            "parameters": _to_json(parameters),
+            "plan": None,
+            "plan_status": "disabled",
+        }
+        self.entries.append(entry)
+        logger.warning(
+            "Медленный запрос %.1f мс в %s: %s; параметры: %s",
+            entry["duration_ms"], entry["dao_method"], statement, entry["parameters"],
+        )
+
+        if not self.explain:
+            return
+        if executemany or self._explaining:
+            entry["plan_status"] = "skipped"
+            return
+        self._explaining = True
+        entry["plan_status"] = "pending"
+        task = asyncio.get_running_loop().create_task(
+            self._capture_plan(entry, statement, parameters)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _capture_plan(self, entry: dict, statement: str, parameters):
+        current_dao_method.set("slow_query_log")
+        options = {SKIP_OPTION: True}
+        timeout_ms = int(self.explain_timeout * 1000)
+        try:
+            async with self.engine.connect() as conn:
+                async with conn.begin() as transaction:
+                    await conn.exec_driver_sql(
+                        f"SET LOCAL statement_timeout = {timeout_ms}",
+                        execution_options=options,
+                    )
+                    await conn.exec_driver_sql(
+                        f"SET LOCAL lock_timeout = {timeout_ms}",
+                        execution_options=options,
+                    )
+                    explain = "EXPLAIN"
+                    if is_read_only(statement):
+                        explain = "EXPLAIN (ANALYZE, BUFFERS)"
+                    plan = await conn.exec_driver_sql(
+                        f"{explain} {statement}",
+                        parameters,
+                        execution_options=options,
+                    )
+                    entry["plan"] = "\n".join(row[0] for row in plan)
+                    await transaction.rollback()
+            entry["plan_status"] = "captured"
+            logger.warning(
+                "План медленного запроса из %s:\n%s", entry["dao_method"], entry["plan"]
+            )
+        except Exception as e:
+            entry["plan"] = str(e)
+            entry["plan_status"] = "failed"
+        finally:
+            self._explaining = False
+
+    async def wait_plans(self):
+        """Дожидается снятия планов, которые ещё в работе"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def list(self) -> list[dict]:
+        """Записи журнала, начиная с последней"""
+        return list(reversed(self.entries))
+
+    def clear(self):
+        self.entries.clear()
@@ -1,3 +1,4 @@
+import re
 import sys
 from logging.config import fileConfig
 from os.path import abspath, dirname
@@ -5,8 +6,9 @@ from os.path import abspath, dirname
 from alembic import context
 from sqlalchemy import engine_from_config, pool
 
-from app.database import DATABASE_URL, Base
-from app.rolls.models import Rolls
+from app.database import Base, database_url
+# Импорт регистрирует модели в Base.metadata для autogenerate
+import app.rolls.models  # noqa: F401
 
 sys.path.insert(0, dirname(dirname(abspath(__file__))))
 
@@ -14,7 +16,7 @@ sys.path.insert(0, dirname(dirname(abspath(__file__))))
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
-config.set_main_option("sqlalchemy.url", f"{DATABASE_URL}?async_fallback=True")
+config.set_main_option("sqlalchemy.url", f"{database_url()}?async_fallback=True")
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -27,6 +29,14 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names) -> bool:
+    """Секции rolls создаются функцией ensure_rolls_partitions, а не моделями"""
+    if type_ == "table":
+        return re.fullmatch(r"rolls_(p\d{6}|default)", name) is None
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -49,6 +59,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -72,7 +83,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,87 @@
+"""add table rolls_daily_stats
+
+Revision ID: 2816bc740370
+Revises: 4fa37575809b
+Create Date: 2026-10-17 10:12:31.418250
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '2816bc740370'
+down_revision: Union[str, None] = '4fa37575809b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('rolls_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('added_count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('added_length_sum', sa.Numeric(precision=20, scale=2), server_default='0', nullable=False),
+    sa.Column('added_length_min', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('added_length_max', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('added_weight_sum', sa.Numeric(precision=20, scale=2), server_default='0', nullable=False),
+    sa.Column('added_weight_min', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('added_weight_max', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('deleted_count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('deleted_weight_sum', sa.Numeric(precision=20, scale=2), server_default='0', nullable=False),
+    sa.Column('dwell_min', sa.Interval(), nullable=True),
+    sa.Column('dwell_max', sa.Interval(), nullable=True),
+    sa.PrimaryKeyConstraint('day')
+    )
+    # Заполняем агрегаты по уже существующим рулонам
+    op.execute("""
+        INSERT INTO rolls_daily_stats (
+            day, added_count, added_length_sum, added_length_min, added_length_max,
+            added_weight_sum, added_weight_min, added_weight_max,
+            deleted_count, deleted_weight_sum, dwell_min, dwell_max
+        )
+        SELECT
+            coalesce(added.day, deleted.day),
+            coalesce(added.added_count, 0),
+            coalesce(added.added_length_sum, 0),
+            added.added_length_min,
+            added.added_length_max,
+            coalesce(added.added_weight_sum, 0),
+            added.added_weight_min,
+            added.added_weight_max,
+            coalesce(deleted.deleted_count, 0),
+            coalesce(deleted.deleted_weight_sum, 0),
+            deleted.dwell_min,
+            deleted.dwell_max
+        FROM (
+            SELECT
+                date(created_at) AS day,
+                count(*) AS added_count,
+                sum(length) AS added_length_sum,
+                min(length) AS added_length_min,
+                max(length) AS added_length_max,
+                sum(weight) AS added_weight_sum,
+                min(weight) AS added_weight_min,
+                max(weight) AS added_weight_max
+            FROM rolls
+            WHERE created_at IS NOT NULL
+            GROUP BY date(created_at)
+        ) AS added
+        FULL OUTER JOIN (
+            SELECT
+                date(deleted_at) AS day,
+                count(*) AS deleted_count,
+                sum(weight) AS deleted_weight_sum,
+                min(deleted_at - created_at) AS dwell_min,
+                max(deleted_at - created_at) AS dwell_max
+            FROM rolls
+            WHERE deleted_at IS NOT NULL
+            GROUP BY date(deleted_at)
+        ) AS deleted ON added.day = deleted.day
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rolls_daily_stats')
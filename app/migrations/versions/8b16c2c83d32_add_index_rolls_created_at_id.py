@@ -0,0 +1,26 @@
+"""add index rolls created_at id
+
+Revision ID: 8b16c2c83d32
+Revises: 2816bc740370
+Create Date: 2026-10-17 11:02:47.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8b16c2c83d32'
+down_revision: Union[str, None] = '2816bc740370'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_rolls_created_at_id', 'rolls', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rolls_created_at_id', table_name='rolls')
@@ -0,0 +1,27 @@
+"""add rolls_inventory version
+
+Revision ID: a9d3e5b17c42
+Revises: f4c9a2e7b013
+Create Date: 2026-10-17 21:12:05.483921
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3e5b17c42'
+down_revision: Union[str, None] = 'f4c9a2e7b013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('rolls_inventory', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rolls_inventory', 'version')
@@ -0,0 +1,55 @@
+"""tune rolls indexes
+
+Revision ID: b41bb74d7d7f
+Revises: 8b16c2c83d32
+Create Date: 2026-10-17 12:20:05.113092
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41bb74d7d7f'
+down_revision: Union[str, None] = '8b16c2c83d32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def use_brin() -> bool:
+    """BRIN по created_at включается через alembic -x rolls_brin=true"""
+    value = context.get_x_argument(as_dictionary=True).get('rolls_brin', 'false')
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дублирует первичный ключ
+    op.drop_index('ix_rolls_id', table_name='rolls')
+    op.create_index('ix_rolls_deleted_at', 'rolls', ['deleted_at'], unique=False)
+    op.create_index(
+        'ix_rolls_active_created_at',
+        'rolls',
+        ['created_at'],
+        unique=False,
+        postgresql_where=sa.text('deleted_at IS NULL'),
+    )
+    if use_brin():
+        # Рулоны добавляются в порядке created_at, поэтому BRIN на порядки
+        # меньше btree и подходит для больших диапазонов дат
+        op.create_index(
+            'ix_rolls_created_at_brin',
+            'rolls',
+            ['created_at'],
+            unique=False,
+            postgresql_using='brin',
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP INDEX IF EXISTS ix_rolls_created_at_brin')
+    op.drop_index('ix_rolls_active_created_at', table_name='rolls')
+    op.drop_index('ix_rolls_deleted_at', table_name='rolls')
+    op.create_index('ix_rolls_id', 'rolls', ['id'], unique=False)
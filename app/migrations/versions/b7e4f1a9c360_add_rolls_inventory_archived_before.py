@@ -0,0 +1,33 @@
+"""add rolls_inventory archived_before
+
+Revision ID: b7e4f1a9c360
+Revises: a9d3e5b17c42
+Create Date: 2026-10-17 23:40:12.118305
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4f1a9c360'
+down_revision: Union[str, None] = 'a9d3e5b17c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('rolls_inventory', sa.Column('archived_before', sa.TIMESTAMP(), nullable=True))
+    # Граница для уже перенесённых рулонов: сразу после последнего из них
+    op.execute(
+        "UPDATE rolls_inventory SET archived_before = ("
+        "SELECT max(greatest(created_at, deleted_at)) + interval '1 microsecond' "
+        "FROM rolls_archive)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rolls_inventory', 'archived_before')
@@ -0,0 +1,153 @@
+"""partition rolls by month
+
+Revision ID: c5e1a7f0d2b4
+Revises: b41bb74d7d7f
+Create Date: 2026-10-17 15:42:10.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1a7f0d2b4'
+down_revision: Union[str, None] = 'b41bb74d7d7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копия app.rolls.partitions.CREATE_ENSURE_FUNCTION на момент миграции
+CREATE_ENSURE_FUNCTION = """
+CREATE OR REPLACE FUNCTION ensure_rolls_partitions(
+    since timestamp, months_ahead integer DEFAULT 3
+) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', since);
+    last_month timestamp :=
+        date_trunc('month', localtimestamp) + make_interval(months => months_ahead);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    -- Одновременный вызов из нескольких процессов ждёт первый
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_rolls_partitions'));
+    WHILE month_start <= last_month LOOP
+        partition_name := 'rolls_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            -- Пока секции не было, строки месяца лежали в rolls_default,
+            -- а создать секцию поверх таких строк Postgres не даёт
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE rolls INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                partition_name
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM rolls_default'
+                ' WHERE created_at >= %L AND created_at < %L RETURNING *)'
+                ' INSERT INTO %I SELECT * FROM moved',
+                month_start, month_start + interval '1 month', partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE rolls ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + interval '1 month'
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$
+"""
+
+INDEXES = ('ix_rolls_created_at_id', 'ix_rolls_deleted_at', 'ix_rolls_active_created_at')
+
+
+def create_indexes(table: str, brin: bool) -> None:
+    op.execute(f'CREATE INDEX ix_rolls_created_at_id ON {table} (created_at, id)')
+    op.execute(f'CREATE INDEX ix_rolls_deleted_at ON {table} (deleted_at)')
+    op.execute(
+        f'CREATE INDEX ix_rolls_active_created_at ON {table} (created_at) '
+        'WHERE deleted_at IS NULL'
+    )
+    if brin:
+        op.execute(f'CREATE INDEX ix_rolls_created_at_brin ON {table} USING brin (created_at)')
+
+
+def rename_old_table() -> bool:
+    """Переименовывает rolls и её индексы в *_old; возвращает, был ли BRIN"""
+    brin = bool(
+        op.get_bind().exec_driver_sql(
+            "SELECT to_regclass('ix_rolls_created_at_brin') IS NOT NULL"
+        ).scalar()
+    )
+    op.execute('ALTER TABLE rolls RENAME TO rolls_old')
+    op.execute('ALTER INDEX rolls_pkey RENAME TO rolls_old_pkey')
+    for index in (*INDEXES, *(('ix_rolls_created_at_brin',) if brin else ())):
+        op.execute(f'ALTER INDEX {index} RENAME TO {index}_old')
+    return brin
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    brin = rename_old_table()
+    # created_at входит в ключ секционирования и первичный ключ
+    op.execute(
+        'UPDATE rolls_old SET created_at = coalesce(deleted_at, localtimestamp) '
+        'WHERE created_at IS NULL'
+    )
+
+    op.execute("""
+        CREATE TABLE rolls (
+            id integer NOT NULL DEFAULT nextval('rolls_id_seq'::regclass),
+            length numeric(10, 2) NOT NULL,
+            weight numeric(10, 2) NOT NULL,
+            created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            deleted_at timestamp,
+            CONSTRAINT rolls_pkey PRIMARY KEY (id, created_at),
+            CONSTRAINT check_length_positive CHECK (length >= 0),
+            CONSTRAINT check_weight_positive CHECK (weight >= 0)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute('CREATE TABLE rolls_default PARTITION OF rolls DEFAULT')
+    op.execute(CREATE_ENSURE_FUNCTION)
+    op.execute("""
+        SELECT ensure_rolls_partitions(
+            coalesce((SELECT min(created_at) FROM rolls_old), localtimestamp)
+        )
+    """)
+    create_indexes('rolls', brin)
+
+    op.execute("""
+        INSERT INTO rolls (id, length, weight, created_at, deleted_at)
+        SELECT id, length, weight, created_at, deleted_at FROM rolls_old
+    """)
+    op.execute('ALTER SEQUENCE rolls_id_seq OWNED BY rolls.id')
+    op.execute('DROP TABLE rolls_old')
+    op.execute('ANALYZE rolls')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    brin = rename_old_table()
+
+    op.execute("""
+        CREATE TABLE rolls (
+            id integer NOT NULL DEFAULT nextval('rolls_id_seq'::regclass),
+            length numeric(10, 2) NOT NULL,
+            weight numeric(10, 2) NOT NULL,
+            created_at timestamp DEFAULT CURRENT_TIMESTAMP,
+            deleted_at timestamp,
+            CONSTRAINT rolls_pkey PRIMARY KEY (id),
+            CONSTRAINT check_length_positive CHECK (length >= 0),
+            CONSTRAINT check_weight_positive CHECK (weight >= 0)
+        )
+    """)
+    op.execute("""
+        INSERT INTO rolls (id, length, weight, created_at, deleted_at)
+        SELECT id, length, weight, created_at, deleted_at FROM rolls_old
+    """)
+    create_indexes('rolls', brin)
+    op.execute('ALTER SEQUENCE rolls_id_seq OWNED BY rolls.id')
+    # Вместе с секционированной таблицей удаляются и все её секции
+    op.execute('DROP TABLE rolls_old')
+    op.execute('DROP FUNCTION IF EXISTS ensure_rolls_partitions(timestamp, integer)')
+    op.execute('ANALYZE rolls')
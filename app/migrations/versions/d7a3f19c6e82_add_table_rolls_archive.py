@@ -0,0 +1,48 @@
+"""add table rolls_archive
+
+Revision ID: d7a3f19c6e82
+Revises: c5e1a7f0d2b4
+Create Date: 2026-10-17 17:05:48.913402
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3f19c6e82'
+down_revision: Union[str, None] = 'c5e1a7f0d2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('rolls_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('length', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('weight', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('deleted_at', sa.TIMESTAMP(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_rolls_archive_created_at_id', 'rolls_archive', ['created_at', 'id'], unique=False)
+    op.create_index('ix_rolls_archive_deleted_at', 'rolls_archive', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Возвращаем архивные рулоны в rolls, предварительно создав их секции
+    op.execute("""
+        SELECT ensure_rolls_partitions(min(created_at))
+        FROM rolls_archive
+        HAVING count(*) > 0
+    """)
+    op.execute("""
+        INSERT INTO rolls (id, length, weight, created_at, deleted_at)
+        SELECT id, length, weight, created_at, deleted_at FROM rolls_archive
+    """)
+    op.drop_index('ix_rolls_archive_deleted_at', table_name='rolls_archive')
+    op.drop_index('ix_rolls_archive_created_at_id', table_name='rolls_archive')
+    op.drop_table('rolls_archive')
@@ -0,0 +1,61 @@
+"""add table rolls_inventory
+
+Revision ID: e2b8c4d91f57
+Revises: d7a3f19c6e82
+Create Date: 2026-10-17 18:21:07.552930
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8c4d91f57'
+down_revision: Union[str, None] = 'd7a3f19c6e82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('rolls_inventory',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('length_sum', sa.Numeric(precision=20, scale=2), server_default='0', nullable=False),
+    sa.Column('length_min', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('length_max', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('weight_sum', sa.Numeric(precision=20, scale=2), server_default='0', nullable=False),
+    sa.Column('weight_min', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('weight_max', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.CheckConstraint('id = 1', name='check_inventory_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_rolls_active_length', 'rolls', ['length'], unique=False, postgresql_where=sa.text('deleted_at IS NULL'))
+    op.create_index('ix_rolls_active_weight', 'rolls', ['weight'], unique=False, postgresql_where=sa.text('deleted_at IS NULL'))
+    # Заполняем счётчики по рулонам, которые сейчас на складе
+    op.execute("""
+        INSERT INTO rolls_inventory (
+            id, count, length_sum, length_min, length_max,
+            weight_sum, weight_min, weight_max
+        )
+        SELECT
+            1,
+            count(*),
+            coalesce(sum(length), 0),
+            min(length),
+            max(length),
+            coalesce(sum(weight), 0),
+            min(weight),
+            max(weight)
+        FROM rolls
+        WHERE deleted_at IS NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rolls_active_weight', table_name='rolls', postgresql_where=sa.text('deleted_at IS NULL'))
+    op.drop_index('ix_rolls_active_length', table_name='rolls', postgresql_where=sa.text('deleted_at IS NULL'))
+    op.drop_table('rolls_inventory')
@@ -0,0 +1,33 @@
+"""add rolls_daily_stats digests
+
+Revision ID: f4c9a2e7b013
+Revises: e2b8c4d91f57
+Create Date: 2026-10-17 19:48:33.120584
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c9a2e7b013'
+down_revision: Union[str, None] = 'e2b8c4d91f57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дайджесты существующих дней остаются NULL до python -m app.tools.digests
+    op.add_column('rolls_daily_stats', sa.Column('length_digest', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('rolls_daily_stats', sa.Column('weight_digest', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('rolls_daily_stats', sa.Column('dwell_digest', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rolls_daily_stats', 'dwell_digest')
+    op.drop_column('rolls_daily_stats', 'weight_digest')
+    op.drop_column('rolls_daily_stats', 'length_digest')
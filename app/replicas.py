@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+
+logger = logging.getLogger("app.replicas")
+
+# Читать с основной БД, а не с реплик (запрос после записи)
+read_from_primary: ContextVar[bool] = ContextVar("read_from_primary", default=False)
+# sessionmaker для чтения, выбранный первым чтением HTTP-запроса: остальные
+# чтения запроса идут туда же, чтобы версия данных и сами данные (ETag)
+# не читались с разных реплик с разным отставанием
+read_pin: ContextVar[dict | None] = ContextVar("read_pin", default=None)
+
+# Состояние репликации сервера, по которому replica_lag считает отставание.
+# Статус WAL receiver виден пользователю с ролью pg_read_all_stats
+# (или pg_monitor); без неё реплика считается отключённой от основной БД
+LAG_QUERY = text("""
+    SELECT
+        pg_is_in_recovery() AS in_recovery,
+        pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() AS replayed_all,
+        EXISTS (
+            SELECT FROM pg_stat_wal_receiver WHERE status = 'streaming'
+        ) AS streaming,
+        extract(epoch FROM now() - pg_last_xact_replay_timestamp()) AS replay_age
+""")
+
+
+def replica_lag(
+    in_recovery: bool, replayed_all: bool | None, streaming: bool, replay_age
+) -> float | None:
+    """
+    Отставание реплики в секундах по результату LAG_QUERY: None для сервера,
+    который не является репликой; 0, если реплика получает WAL от основной БД
+    и применила всё полученное (иначе на простаивающей основной БД отставание
+    росло бы без записей); иначе — время с последней применённой транзакции
+    (бесконечность, если она неизвестна). Отключённая от основной БД реплика
+    тоже применила всё полученное, поэтому без streaming 0 не бывает.
+    """
+    if not in_recovery:
+        return None
+    if replayed_all and streaming:
+        return 0.0
+    if replay_age is None:
+        return float("inf")
+    return float(replay_age)
+
+
+class ReplicaSet:
+    """
+    Реплики для чтения. Сессии выдаются по кругу среди здоровых реплик:
+    доступных и отстающих не больше чем на max_lag секунд. Здоровье
+    проверяется фоновой задачей run_health_checks; до первой проверки
+    все реплики считаются здоровыми.
+    """
+
+    def __init__(self, urls: list[str], engine_params: dict, max_lag: float):
+        self.urls = urls
+        self.engines = [create_async_engine(url, **engine_params) for url in urls]
+        self.session_makers = [
+            sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for engine in self.engines
+        ]
+        self.max_lag = max_lag
+        self.health = [
+            {"healthy": True, "lag": None, "error": None, "checked_at": None}
+            for _ in urls
+        ]
+        self._counter = itertools.count()
+
+    def __bool__(self):
+        return bool(self.engines)
+
+    def session_maker(self):
+        """sessionmaker следующей здоровой реплики или None, если таких нет"""
+        healthy = [
+            session_maker
+            for session_maker, health in zip(self.session_makers, self.health)
+            if health["healthy"]
+        ]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def check(self, timeout: float = 5):
+        """Проверяет доступность и отставание всех реплик"""
+        await asyncio.gather(
+            *(self._check(index, timeout) for index in range(len(self.engines)))
+        )
+
+    async def _check(self, index: int, timeout: float):
+        health = self.health[index]
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.engines[index].connect() as conn:
+                    state = (await conn.execute(LAG_QUERY)).one()
+            lag = replica_lag(*state)
+            healthy = lag is None or lag <= self.max_lag
+            error = None if healthy else f"Отставание {lag:.1f} с больше {self.max_lag} с"
+        except Exception as e:
+            lag, healthy, error = None, False, str(e) or type(e).__name__
+
+        if healthy != health["healthy"]:
+            logger.warning(
+                "Реплика %s %s%s",
+                self.display_url(index),
+                "снова доступна" if healthy else "исключена из чтения",
+                f": {error}" if error else "",
+            )
+        health.update(healthy=healthy, lag=lag, error=error, checked_at=time.time())
+
+    async def run_health_checks(self, interval: float):
+        """Фоновая задача: проверяет реплики раз в interval секунд"""
+        while True:
+            await self.check(timeout=interval)
+            await asyncio.sleep(interval)
+
+    def display_url(self, index: int) -> str:
+        return make_url(self.urls[index]).render_as_string(hide_password=True)
+
+    def stats(self) -> list[dict]:
+        return [
+            {"url": self.display_url(index), **health}
+            for index, health in enumerate(self.health)
+        ]
+
+    async def dispose(self):
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI-middleware, которое направляет чтение на основную БД, если клиент
+    только что писал: в запросах с заголовком X-Read-Your-Writes, с cookie
+    last_write (ставится на window секунд после успешной записи) и в самих
+    запросах на запись. Кроме того, закрепляет за каждым запросом одну
+    реплику (read_pin). Без window берётся настройка READ_YOUR_WRITES_WINDOW
+    (при запросе, а не при создании приложения).
+    """
+
+    HEADER = b"x-read-your-writes"
+    COOKIE = "last_write"
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app, window: float | None = None):
+        self.app = app
+        self._window = window
+
+    @property
+    def window(self) -> float:
+        if self._window is not None:
+            return self._window
+        return settings.READ_YOUR_WRITES_WINDOW
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        is_write = scope["method"] not in self.SAFE_METHODS
+        token = read_from_primary.set(is_write or self._wants_primary(scope))
+        pin_token = read_pin.set({})
+
+        async def send_wrapper(message):
+            if (
+                is_write
+                and message["type"] == "http.response.start"
+                and message["status"] < 400
+            ):
+                cookie = (
+                    f"{self.COOKIE}={time.time():.3f}; Max-Age={int(self.window)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            read_pin.reset(pin_token)
+            read_from_primary.reset(token)
+
+    def _wants_primary(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self.HEADER and value.lower() in (b"1", b"true"):
+                return True
+            if name == b"cookie":
+                cookie = SimpleCookie()
+                cookie.load(value.decode("latin-1"))
+                if self.COOKIE in cookie:
+                    try:
+                        written_at = float(cookie[self.COOKIE].value)
+                    except ValueError:
+                        continue
+                    if time.time() - written_at < self.window:
+                        return True
+        return False
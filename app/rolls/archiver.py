@@ -0,0 +1,24 @@
+import asyncio
+import logging
+
+from app.config import settings
+from app.rolls.dao import RollsDAO
+
+logger = logging.getLogger("app.archiver")
+
+
+async def run_archiver(interval: float | None = None):
+    """
+    Фоновая задача: раз в interval секунд (ARCHIVE_INTERVAL) переносит
+    давно удалённые рулоны в rolls_archive. Ошибки пишутся в лог и не
+    останавливают задачу.
+    """
+    interval = interval or settings.ARCHIVE_INTERVAL
+    while True:
+        try:
+            archived = await RollsDAO.archive()
+            if archived:
+                logger.info("Перенесено в архив рулонов: %d", archived)
+        except Exception:
+            logger.exception("Не удалось перенести рулоны в архив")
+        await asyncio.sleep(interval)
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class StatisticsCache:
+    """
+    LRU-кэш статистики по периодам (start_date, end_date).
+
+    Периоды, которые ещё не закончились, живут не дольше ttl секунд.
+    Закончившиеся периоды хранятся closed_ttl секунд (None — без ограничения),
+    пока запись в rolls их не затронет: invalidate_since(moment) удаляет
+    только периоды с end_date >= moment.
+    Кэш живёт в памяти процесса и не видит записи других воркеров, поэтому
+    при нескольких воркерах closed_ttl ограничивает, как долго они отдают
+    статистику без чужих записей.
+
+    generation растёт при каждом сбросе: значение, посчитанное до сброса,
+    не сохраняется (set с устаревшим generation пропускается).
+    """
+
+    def __init__(self, max_size: int, ttl: float, closed_ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.closed_ttl = closed_ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def get(self, key):
+        """Возвращает (найдено, значение)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        value, end_date, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(
+        self,
+        key,
+        end_date: datetime,
+        value,
+        max_ttl: float | None = None,
+        generation: int | None = None,
+    ):
+        """
+        max_ttl ограничивает время жизни и закончившихся периодов — например,
+        для значений, прочитанных с реплики, которая могла не получить
+        последние записи на момент сброса кэша.
+        generation — значение self.generation до расчёта value; если с тех пор
+        кэш сбрасывался, value мог не учесть запись и не сохраняется.
+        Возвращает, сохранено ли значение.
+        """
+        if generation is not None and generation != self.generation:
+            return False
+        ttl = self.ttl if end_date >= datetime.now() else self.closed_ttl
+        if max_ttl is not None:
+            ttl = max_ttl if ttl is None else min(ttl, max_ttl)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, end_date, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate_since(self, moment: datetime):
+        """Удаляет периоды, на которые влияют рулоны, добавленные не раньше moment"""
+        self.generation += 1
+        stale = [
+            key for key, (_, end_date, _) in self._entries.items() if end_date >= moment
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,17 +1,763 @@
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
 
-from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy import (
+    ARRAY,
+    TIMESTAMP,
+    Date,
+    Float,
+    Integer,
+    and_,
+    any_,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import INTERVAL
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from app.config import get_settings, settings
 from app.dao.base import BaseDAO
-from app.database import async_session_maker
-from app.rolls.models import Rolls
-from app.rolls.schemas import RollFilter
+from app.database import async_session_maker, get_replicas, read_session_maker
+from app.metrics.db import dao_method
+from app.rolls.cache import StatisticsCache
+from app.rolls.models import Rolls, RollsArchive, RollsDailyStats, RollsInventory
+from app.rolls.schemas import RollCursor, RollFilter
+from app.rolls.sketches import TDigest
+
+
+def roll_columns(table, fields: tuple[str, ...] | None = None) -> tuple:
+    """
+    Колонки рулона для выдачи клиенту: Numeric сразу приводится к float в SQL,
+    чтобы строки не проходили через Decimal и сериализовались напрямую.
+    fields оставляет только перечисленные колонки в указанном порядке.
+    """
+    columns = (
+        table.c.id,
+        cast(table.c.length, Float).label("length"),
+        cast(table.c.weight, Float).label("weight"),
+        table.c.created_at,
+        table.c.deleted_at,
+    )
+    if fields is None:
+        return columns
+    by_name = {column.key: column for column in columns}
+    return tuple(by_name[field] for field in fields)
+
+
+ROLL_COLUMNS = roll_columns(Rolls.__table__)
+
+# Колонки, общие для rolls и rolls_archive
+ARCHIVE_COLUMNS = ("id", "length", "weight", "created_at", "deleted_at")
+
+_statistics_cache = None
+
+
+def get_statistics_cache() -> StatisticsCache:
+    """
+    Кэш статистики процесса. Создаётся при первом обращении, а не при импорте,
+    и заново после get_settings.cache_clear(), чтобы взять новые настройки
+    """
+    global _statistics_cache
+    config = get_settings()
+    if _statistics_cache is None or _statistics_cache[0] is not config:
+        _statistics_cache = (
+            config,
+            StatisticsCache(
+                max_size=config.STATISTICS_CACHE_SIZE,
+                ttl=config.STATISTICS_CACHE_TTL,
+                closed_ttl=config.STATISTICS_CACHE_CLOSED_TTL,
+            ),
+        )
+    return _statistics_cache[1]
+
+
+def _to_days(interval: timedelta | None) -> float | None:
+    """Переводит интервал в дни"""
+    return interval.total_seconds() / 86400 if interval else None
+
+
+def _to_local(moment: datetime) -> datetime:
+    """
+    Приводит дату к локальному времени без часового пояса,
+    в котором хранятся created_at и deleted_at
+    """
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+def _full_days(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    """Границы [full_start, full_end) дней, целиком попавших в период"""
+    full_start = datetime.combine(start.date(), time.min)
+    if full_start < start:
+        full_start += timedelta(days=1)
+    return full_start, datetime.combine(end.date(), time.min)
+
+
+def _bucket_start(moment: datetime, bucket: str) -> datetime:
+    """Начало интервала bucket, в который попадает moment (как date_trunc)"""
+    if bucket == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime.combine(moment.date(), time.min)
+    if bucket == "day":
+        return day
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Недопустимый интервал: {bucket}")
+
+
+def _bucket_count(start: datetime, end: datetime, bucket: str) -> int:
+    """Количество интервалов bucket, пересекающих период [start, end]"""
+    first, last = _bucket_start(start, bucket), _bucket_start(end, bucket)
+    if bucket == "month":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    step = {
+        "hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)
+    }[bucket]
+    return (last - first) // step + 1
+
+
+def archive_cutoff() -> datetime:
+    """Момент, раньше которого удалённые рулоны переносятся в архив по умолчанию"""
+    return datetime.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archived_before():
+    """
+    Граница архива из rolls_inventory.archived_before (SQL-подзапрос):
+    рулоны, добавленные и удалённые раньше неё, могут лежать в rolls_archive,
+    остальные всегда лежат в rolls. Читается в том же запросе, что и рулоны,
+    поэтому согласована с ними при параллельном переносе в архив.
+    """
+    return (
+        select(RollsInventory.archived_before)
+        .where(RollsInventory.id == RollsInventoryDAO.ROW_ID)
+        .scalar_subquery()
+    )
+
+
+def archive_reached(*moments) -> list:
+    """
+    Условия, при которых нужно читать rolls_archive для рулонов, добавленных
+    или удалённых не раньше moments. Не зависят от строк, поэтому Postgres
+    проверяет их один раз и не читает архив, если они ложны.
+    """
+    watermark = archived_before()
+    moments = [moment for moment in moments if moment is not None]
+    if not moments:
+        return [watermark.is_not(None)]
+    return [watermark > cast(literal(moment), TIMESTAMP) for moment in moments]
+
+
+# Дайджесты дня без рулонов; ими заполняется новая строка rolls_daily_stats
+EMPTY_DIGESTS = {
+    "length_digest": TDigest().to_json(),
+    "weight_digest": TDigest().to_json(),
+    "dwell_digest": TDigest().to_json(),
+}
+
+
+def dwell_days(rolls):
+    """
+    Срок хранения рулона в днях (SQL-выражение по таблице или подзапросу rolls);
+    делится в float, как и в Python, чтобы значения совпадали до бита
+    """
+    return cast(func.extract("epoch", rolls.c.deleted_at - rolls.c.created_at), Float) / 86400
+
+
+def all_rolls(since: datetime | None = None):
+    """
+    Подзапрос по всем рулонам: rolls вместе с rolls_archive. С since архив
+    читается, только если в нём могут быть рулоны, добавленные или удалённые
+    не раньше since.
+    """
+    return union_all(
+        select(*(Rolls.__table__.c[name] for name in ARCHIVE_COLUMNS)),
+        select(*(RollsArchive.__table__.c[name] for name in ARCHIVE_COLUMNS)).where(
+            *archive_reached(since)
+        ),
+    ).subquery("rolls")
+
+
+class RollsDailyStatsDAO(BaseDAO):
+    model = RollsDailyStats
+
+    @classmethod
+    @dao_method
+    async def apply_added(cls, session, rolls):
+        """Учитывает добавленные рулоны в дневных агрегатах (в транзакции session)"""
+        by_day = {}
+        for roll in rolls:
+            by_day.setdefault(roll.created_at.date(), []).append(roll)
+        if not by_day:
+            return
+
+        values = [
+            {
+                "day": day,
+                "added_count": len(day_rolls),
+                "added_length_sum": sum(roll.length for roll in day_rolls),
+                "added_length_min": min(roll.length for roll in day_rolls),
+                "added_length_max": max(roll.length for roll in day_rolls),
+                "added_weight_sum": sum(roll.weight for roll in day_rolls),
+                "added_weight_min": min(roll.weight for roll in day_rolls),
+                "added_weight_max": max(roll.weight for roll in day_rolls),
+                **EMPTY_DIGESTS,
+            }
+            for day, day_rolls in by_day.items()
+        ]
+        query = pg_insert(RollsDailyStats).values(values)
+        query = query.on_conflict_do_update(
+            index_elements=[RollsDailyStats.day],
+            set_={
+                "added_count": RollsDailyStats.added_count + query.excluded.added_count,
+                "added_length_sum": RollsDailyStats.added_length_sum
+                + query.excluded.added_length_sum,
+                "added_length_min": func.least(
+                    RollsDailyStats.added_length_min, query.excluded.added_length_min
+                ),
+                "added_length_max": func.greatest(
+                    RollsDailyStats.added_length_max, query.excluded.added_length_max
+                ),
+                "added_weight_sum": RollsDailyStats.added_weight_sum
+                + query.excluded.added_weight_sum,
+                "added_weight_min": func.least(
+                    RollsDailyStats.added_weight_min, query.excluded.added_weight_min
+                ),
+                "added_weight_max": func.greatest(
+                    RollsDailyStats.added_weight_max, query.excluded.added_weight_max
+                ),
+            },
+        ).returning(
+            RollsDailyStats.day, RollsDailyStats.length_digest, RollsDailyStats.weight_digest
+        )
+        days = (await session.execute(query)).all()
+
+        # Строки дней уже заблокированы upsert-ом до конца транзакции,
+        # поэтому дайджесты можно обновить чтением-изменением-записью
+        digests = []
+        for day in days:
+            day_rolls = by_day[day.day]
+            digests.append(
+                {
+                    "day": day.day,
+                    "length_digest": cls._merged_digest(
+                        day.length_digest, [float(roll.length) for roll in day_rolls]
+                    ),
+                    "weight_digest": cls._merged_digest(
+                        day.weight_digest, [float(roll.weight) for roll in day_rolls]
+                    ),
+                }
+            )
+        await session.execute(update(RollsDailyStats), digests)
+
+    @classmethod
+    @dao_method
+    async def apply_deleted(cls, session, rolls):
+        """Учитывает удалённые рулоны в дневных агрегатах (в транзакции session)"""
+        by_day = {}
+        for roll in rolls:
+            by_day.setdefault(roll.deleted_at.date(), []).append(roll)
+        if not by_day:
+            return
+
+        values = []
+        for day, day_rolls in by_day.items():
+            dwell = [
+                roll.deleted_at - roll.created_at
+                for roll in day_rolls
+                if roll.created_at is not None
+            ]
+            values.append(
+                {
+                    "day": day,
+                    "deleted_count": len(day_rolls),
+                    "deleted_weight_sum": sum(roll.weight for roll in day_rolls),
+                    "dwell_min": min(dwell, default=None),
+                    "dwell_max": max(dwell, default=None),
+                    **EMPTY_DIGESTS,
+                }
+            )
+        query = pg_insert(RollsDailyStats).values(values)
+        query = query.on_conflict_do_update(
+            index_elements=[RollsDailyStats.day],
+            set_={
+                "deleted_count": RollsDailyStats.deleted_count
+                + query.excluded.deleted_count,
+                "deleted_weight_sum": RollsDailyStats.deleted_weight_sum
+                + query.excluded.deleted_weight_sum,
+                "dwell_min": func.least(
+                    RollsDailyStats.dwell_min, query.excluded.dwell_min
+                ),
+                "dwell_max": func.greatest(
+                    RollsDailyStats.dwell_max, query.excluded.dwell_max
+                ),
+            },
+        ).returning(RollsDailyStats.day, RollsDailyStats.dwell_digest)
+        days = (await session.execute(query)).all()
+
+        digests = []
+        for day in days:
+            day_rolls = by_day[day.day]
+            dwell = [
+                (roll.deleted_at - roll.created_at).total_seconds() / 86400
+                for roll in day_rolls
+                if roll.created_at is not None
+            ]
+            digests.append(
+                {
+                    "day": day.day,
+                    "dwell_digest": cls._merged_digest(day.dwell_digest, dwell),
+                }
+            )
+        await session.execute(update(RollsDailyStats), digests)
+
+    @staticmethod
+    def _merged_digest(stored: dict | None, values: list[float]):
+        """
+        Дайджест дня после добавления values. Новые дни создаются с пустыми
+        дайджестами; не посчитанный дайджест (NULL) так и остаётся NULL,
+        пока его не заполнит rebuild_digests
+        """
+        if stored is None:
+            return None
+        return TDigest.merge(
+            [TDigest.from_json(stored)], values, settings.QUANTILE_SKETCH_COMPRESSION
+        ).to_json()
+
+    @classmethod
+    @dao_method
+    async def rebuild(cls):
+        """Пересчитывает дневные агрегаты с нуля по таблицам rolls и rolls_archive"""
+        rolls = all_rolls()
+        added_day = func.date(rolls.c.created_at)
+        added = (
+            select(
+                added_day.label("day"),
+                func.count().label("added_count"),
+                func.sum(rolls.c.length).label("added_length_sum"),
+                func.min(rolls.c.length).label("added_length_min"),
+                func.max(rolls.c.length).label("added_length_max"),
+                func.sum(rolls.c.weight).label("added_weight_sum"),
+                func.min(rolls.c.weight).label("added_weight_min"),
+                func.max(rolls.c.weight).label("added_weight_max"),
+            )
+            .where(rolls.c.created_at.is_not(None))
+            .group_by(added_day)
+            .subquery("added")
+        )
+        deleted_day = func.date(rolls.c.deleted_at)
+        time_between = rolls.c.deleted_at - rolls.c.created_at
+        deleted = (
+            select(
+                deleted_day.label("day"),
+                func.count().label("deleted_count"),
+                func.sum(rolls.c.weight).label("deleted_weight_sum"),
+                func.min(time_between).label("dwell_min"),
+                func.max(time_between).label("dwell_max"),
+            )
+            .where(rolls.c.deleted_at.is_not(None))
+            .group_by(deleted_day)
+            .subquery("deleted")
+        )
+        rollup = select(
+            func.coalesce(added.c.day, deleted.c.day),
+            func.coalesce(added.c.added_count, 0),
+            func.coalesce(added.c.added_length_sum, 0),
+            added.c.added_length_min,
+            added.c.added_length_max,
+            func.coalesce(added.c.added_weight_sum, 0),
+            added.c.added_weight_min,
+            added.c.added_weight_max,
+            func.coalesce(deleted.c.deleted_count, 0),
+            func.coalesce(deleted.c.deleted_weight_sum, 0),
+            deleted.c.dwell_min,
+            deleted.c.dwell_max,
+        ).select_from(added.join(deleted, added.c.day == deleted.c.day, full=True))
+
+        async with async_session_maker() as session:
+            await session.execute(delete(RollsDailyStats))
+            await session.execute(
+                insert(RollsDailyStats).from_select(
+                    [
+                        "day",
+                        "added_count",
+                        "added_length_sum",
+                        "added_length_min",
+                        "added_length_max",
+                        "added_weight_sum",
+                        "added_weight_min",
+                        "added_weight_max",
+                        "deleted_count",
+                        "deleted_weight_sum",
+                        "dwell_min",
+                        "dwell_max",
+                    ],
+                    rollup,
+                )
+            )
+            await cls._fill_digests(session)
+            await RollsInventoryDAO.bump_version(session)
+            await session.commit()
+        get_statistics_cache().clear()
+
+    @classmethod
+    @dao_method
+    async def rebuild_digests(cls):
+        """Пересчитывает дневные t-digest с нуля по rolls и rolls_archive"""
+        async with async_session_maker() as session:
+            # Записи ждут, пока дайджесты не будут пересчитаны
+            await session.execute(select(RollsDailyStats.day).with_for_update())
+            await cls._fill_digests(session)
+            await RollsInventoryDAO.bump_version(session)
+            await session.commit()
+        get_statistics_cache().clear()
+
+    @staticmethod
+    async def _fill_digests(session):
+        """Заполняет дайджесты всех дней rolls_daily_stats (в транзакции session)"""
+        rolls = all_rolls()
+        compression = settings.QUANTILE_SKETCH_COMPRESSION
+        digests = {
+            day: {"day": day, **EMPTY_DIGESTS}
+            for day in (await session.execute(select(RollsDailyStats.day))).scalars()
+        }
+
+        added_day = func.date(rolls.c.created_at)
+        added = select(
+            added_day,
+            func.array_agg(cast(rolls.c.length, Float)),
+            func.array_agg(cast(rolls.c.weight, Float)),
+        ).group_by(added_day)
+        for day, lengths, weights in await session.execute(added):
+            digests[day]["length_digest"] = TDigest.merge([], lengths, compression).to_json()
+            digests[day]["weight_digest"] = TDigest.merge([], weights, compression).to_json()
+
+        deleted_day = func.date(rolls.c.deleted_at)
+        deleted = (
+            select(deleted_day, func.array_agg(dwell_days(rolls)))
+            .where(rolls.c.deleted_at.is_not(None))
+            .group_by(deleted_day)
+        )
+        for day, dwell in await session.execute(deleted):
+            digests[day]["dwell_digest"] = TDigest.merge([], dwell, compression).to_json()
+
+        if digests:
+            await session.execute(update(RollsDailyStats), list(digests.values()))
+
+
+class RollsInventoryDAO(BaseDAO):
+    model = RollsInventory
+
+    # id единственной строки rolls_inventory
+    ROW_ID = 1
+
+    @classmethod
+    async def get(cls):
+        """Текущие счётчики склада (None, если они ещё не посчитаны)"""
+        return await cls.find_one_or_none(id=cls.ROW_ID)
+
+    @classmethod
+    @dao_method
+    async def get_version(cls) -> int | None:
+        """
+        Версия данных rolls (None, если строки счётчиков нет). Внутри
+        HTTP-запроса читается с того же сервера, что и сами данные (read_pin),
+        а сервер применяет записи по порядку, поэтому данные не старее версии.
+        """
+        query = select(RollsInventory.version).where(RollsInventory.id == cls.ROW_ID)
+        async with read_session_maker()() as session:
+            return (await session.execute(query)).scalar_one_or_none()
+
+    @classmethod
+    @dao_method
+    async def lock(cls, session):
+        """
+        Блокирует строку счётчиков до конца транзакции session. apply_deleted
+        вызывает её прямо перед UPDATE счётчиков: следующий запрос (в READ
+        COMMITTED у каждого свой снимок) видит рулоны, удалённые параллельными
+        записями, которые обновили счётчики раньше, поэтому пересчёт минимума
+        не возьмёт уже удалённый рулон. Сами записи в rolls (в том числе COPY
+        в add_many) идут параллельно, по очереди выполняются только обновления
+        счётчиков в конце транзакций.
+        """
+        await session.execute(
+            select(RollsInventory.id)
+            .where(RollsInventory.id == cls.ROW_ID)
+            .with_for_update()
+        )
+
+    @classmethod
+    @dao_method
+    async def bump_version(cls, session):
+        """
+        Увеличивает версию данных (в транзакции session), не меняя счётчики:
+        после пересчёта агрегатов закэшированная по версии статистика устарела
+        """
+        await session.execute(
+            pg_insert(RollsInventory)
+            .values(id=cls.ROW_ID)
+            .on_conflict_do_update(
+                index_elements=[RollsInventory.id],
+                set_={
+                    "version": RollsInventory.version + 1,
+                    "updated_at": datetime.now(),
+                },
+            )
+        )
+
+    @classmethod
+    @dao_method
+    async def apply_added(cls, session, rolls):
+        """
+        Учитывает добавленные рулоны в счётчиках склада (в транзакции session)
+        и увеличивает версию данных.
+        """
+        if not rolls:
+            return
+
+        active = [roll for roll in rolls if roll.deleted_at is None]
+        query = (
+            update(RollsInventory)
+            .where(RollsInventory.id == cls.ROW_ID)
+            .values(version=RollsInventory.version + 1, updated_at=datetime.now())
+        )
+        # Уже удалённые рулоны меняют только версию
+        if active:
+            query = query.values(
+                count=RollsInventory.count + len(active),
+                length_sum=RollsInventory.length_sum + sum(roll.length for roll in active),
+                length_min=func.least(
+                    RollsInventory.length_min, min(roll.length for roll in active)
+                ),
+                length_max=func.greatest(
+                    RollsInventory.length_max, max(roll.length for roll in active)
+                ),
+                weight_sum=RollsInventory.weight_sum + sum(roll.weight for roll in active),
+                weight_min=func.least(
+                    RollsInventory.weight_min, min(roll.weight for roll in active)
+                ),
+                weight_max=func.greatest(
+                    RollsInventory.weight_max, max(roll.weight for roll in active)
+                ),
+            )
+        await session.execute(query)
+
+    @classmethod
+    @dao_method
+    async def apply_deleted(cls, session, rolls):
+        """
+        Учитывает удалённые рулоны в счётчиках склада (в транзакции session,
+        после UPDATE rolls) и увеличивает версию данных. Если удалён рулон
+        с крайним значением, минимум или максимум пересчитывается по частичным
+        индексам ix_rolls_active_* (после lock, см. её описание).
+        """
+        if not rolls:
+            return
+
+        await cls.lock(session)
+
+        def active_aggregate(aggregate, column):
+            return (
+                select(aggregate(column))
+                .where(Rolls.deleted_at.is_(None))
+                .scalar_subquery()
+            )
+
+        def recomputed_min(stored, column, removed):
+            return case(
+                (stored >= min(removed), active_aggregate(func.min, column)),
+                else_=stored,
+            )
+
+        def recomputed_max(stored, column, removed):
+            return case(
+                (stored <= max(removed), active_aggregate(func.max, column)),
+                else_=stored,
+            )
+
+        lengths = [roll.length for roll in rolls]
+        weights = [roll.weight for roll in rolls]
+        query = (
+            update(RollsInventory)
+            .where(RollsInventory.id == cls.ROW_ID)
+            .values(
+                count=RollsInventory.count - len(rolls),
+                length_sum=RollsInventory.length_sum - sum(lengths),
+                length_min=recomputed_min(RollsInventory.length_min, Rolls.length, lengths),
+                length_max=recomputed_max(RollsInventory.length_max, Rolls.length, lengths),
+                weight_sum=RollsInventory.weight_sum - sum(weights),
+                weight_min=recomputed_min(RollsInventory.weight_min, Rolls.weight, weights),
+                weight_max=recomputed_max(RollsInventory.weight_max, Rolls.weight, weights),
+                version=RollsInventory.version + 1,
+                updated_at=datetime.now(),
+            )
+        )
+        await session.execute(query)
+
+    @classmethod
+    @dao_method
+    async def rebuild(cls):
+        """
+        Пересчитывает счётчики склада с нуля по таблице rolls и увеличивает
+        версию данных (рулоны могли быть загружены в обход DAO).
+        Возвращает счётчики до и после пересчёта.
+        """
+        active = (
+            select(
+                func.count().label("count"),
+                func.coalesce(func.sum(Rolls.length), 0).label("length_sum"),
+                func.min(Rolls.length).label("length_min"),
+                func.max(Rolls.length).label("length_max"),
+                func.coalesce(func.sum(Rolls.weight), 0).label("weight_sum"),
+                func.min(Rolls.weight).label("weight_min"),
+                func.max(Rolls.weight).label("weight_max"),
+            )
+            .where(Rolls.deleted_at.is_(None))
+        )
+        async with async_session_maker() as session:
+            await session.execute(
+                pg_insert(RollsInventory)
+                .values(id=cls.ROW_ID)
+                .on_conflict_do_nothing(index_elements=[RollsInventory.id])
+            )
+            # Блокировка строки счётчиков ждёт записи, уже обновившие счётчики.
+            # Записи, ещё не дошедшие до счётчиков, агрегаты ниже не видят
+            # и после пересчёта учтут свои рулоны сами
+            before = (
+                await session.execute(
+                    select(RollsInventory.__table__.columns)
+                    .where(RollsInventory.id == cls.ROW_ID)
+                    .with_for_update()
+                )
+            ).mappings().one()
+            counters = (await session.execute(active)).mappings().one()
+            after = (
+                await session.execute(
+                    update(RollsInventory)
+                    .where(RollsInventory.id == cls.ROW_ID)
+                    .values(
+                        **counters,
+                        version=RollsInventory.version + 1,
+                        updated_at=datetime.now(),
+                    )
+                    .returning(RollsInventory.__table__.columns)
+                )
+            ).mappings().one()
+            await session.commit()
+        return before, after
 
 
 class RollsDAO(BaseDAO):
     model = Rolls
 
     @classmethod
+    @dao_method
+    async def add(cls, **data):
+        query = insert(Rolls).values(**data).returning(Rolls.__table__.columns)
+        async with async_session_maker() as session:
+            roll = (await session.execute(query)).one()
+            await RollsDailyStatsDAO.apply_added(session, [roll])
+            await RollsInventoryDAO.apply_added(session, [roll])
+            await session.commit()
+        cls._invalidate_statistics([roll])
+        return roll._mapping
+
+    @classmethod
+    @dao_method
+    async def add_rolls(cls, rolls: list[dict]) -> list:
+        """
+        Добавляет рулоны одним многострочным INSERT ... RETURNING и одним
+        commit. Возвращает добавленные строки в порядке переданных рулонов.
+        """
+        if not rolls:
+            return []
+
+        query = insert(Rolls).returning(
+            *Rolls.__table__.columns, sort_by_parameter_order=True
+        )
+        async with async_session_maker() as session:
+            added = (await session.execute(query, rolls)).all()
+            await RollsDailyStatsDAO.apply_added(session, added)
+            await RollsDailyStatsDAO.apply_deleted(
+                session, [roll for roll in added if roll.deleted_at is not None]
+            )
+            await RollsInventoryDAO.apply_added(session, added)
+            await session.commit()
+        cls._invalidate_statistics(added)
+        return [roll._mapping for roll in added]
+
+    @classmethod
+    @dao_method
+    async def add_many(cls, rolls: list[dict]) -> list[int]:
+        """
+        Добавляет рулоны одной транзакцией через COPY.
+        id выделяются из последовательности заранее, поэтому возвращаются
+        в том же порядке, что и переданные рулоны.
+        """
+        if not rolls:
+            return []
+
+        async with async_session_maker() as session:
+            id_sequence = func.pg_get_serial_sequence(Rolls.__tablename__, "id")
+            ids = (
+                await session.execute(
+                    select(func.nextval(id_sequence)).select_from(
+                        func.generate_series(1, len(rolls))
+                    )
+                )
+            ).scalars().all()
+
+            columns = ("id", "length", "weight", "created_at", "deleted_at")
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                Rolls.__tablename__,
+                columns=columns,
+                records=(
+                    (
+                        roll_id,
+                        Decimal(str(roll["length"])),
+                        Decimal(str(roll["weight"])),
+                        roll["created_at"],
+                        roll.get("deleted_at"),
+                    )
+                    for roll_id, roll in zip(ids, rolls)
+                ),
+            )
+
+            # Агрегаты считаем по сохранённым значениям (после округления Numeric)
+            added = (
+                await session.execute(
+                    select(
+                        Rolls.length, Rolls.weight, Rolls.created_at, Rolls.deleted_at
+                    ).where(Rolls.id == any_(literal(ids, ARRAY(Integer))))
+                )
+            ).all()
+            await RollsDailyStatsDAO.apply_added(session, added)
+            await RollsDailyStatsDAO.apply_deleted(
+                session, [roll for roll in added if roll.deleted_at is not None]
+            )
+            await RollsInventoryDAO.apply_added(session, added)
+            await session.commit()
+        cls._invalidate_statistics(added)
+        return ids
+
+    @classmethod
+    @dao_method
     async def mark_as_deleted(cls, roll_id: int):
         async with async_session_maker() as session:
             query = (
@@ -21,51 +767,978 @@ class RollsDAO(BaseDAO):
                 .returning(Rolls)
             )
             result = await session.execute(query)
+            roll = result.scalar_one_or_none()
+            if roll is not None:
+                await RollsDailyStatsDAO.apply_deleted(session, [roll])
+                await RollsInventoryDAO.apply_deleted(session, [roll])
+            await session.commit()
+        if roll is not None:
+            cls._invalidate_statistics([roll])
+        return roll
+
+    @classmethod
+    @dao_method
+    async def mark_many_as_deleted(
+        cls, ids: list[int] | None = None, filters: RollFilter | None = None
+    ):
+        """
+        Помечает удалёнными все рулоны из списка ids (или подходящие под фильтры)
+        одним UPDATE. Для ids дополнительно сообщает, какие рулоны не найдены,
+        а какие уже были удалены раньше.
+        """
+        if ids is not None:
+            ids = list(dict.fromkeys(ids))
+            conditions = [Rolls.id == any_(literal(ids, ARRAY(Integer)))]
+        else:
+            conditions = cls._filter_conditions(filters)
+            if not conditions:
+                raise ValueError("Не задан ни один фильтр для удаления")
+
+        async with async_session_maker() as session:
+            query = (
+                update(Rolls)
+                .where(*conditions, Rolls.deleted_at.is_(None))
+                .values(deleted_at=datetime.now())
+                .returning(Rolls.__table__.columns)
+            )
+            deleted = (await session.execute(query)).all()
+            await RollsDailyStatsDAO.apply_deleted(session, deleted)
+
+            not_found, already_deleted = [], []
+            if ids is not None:
+                deleted_ids = {roll.id for roll in deleted}
+                rest = [roll_id for roll_id in ids if roll_id not in deleted_ids]
+                if rest:
+                    # Архивные рулоны тоже уже удалены
+                    rest_ids = literal(rest, ARRAY(Integer))
+                    existing = set(
+                        (
+                            await session.execute(
+                                union_all(
+                                    select(Rolls.id).where(Rolls.id == any_(rest_ids)),
+                                    select(RollsArchive.id).where(
+                                        RollsArchive.id == any_(rest_ids)
+                                    ),
+                                )
+                            )
+                        ).scalars()
+                    )
+                    for roll_id in rest:
+                        if roll_id in existing:
+                            already_deleted.append(roll_id)
+                        else:
+                            not_found.append(roll_id)
+
+            await RollsInventoryDAO.apply_deleted(session, deleted)
+            await session.commit()
+
+        cls._invalidate_statistics(deleted)
+        return {
+            "deleted": [roll._mapping for roll in deleted],
+            "not_found": not_found,
+            "already_deleted": already_deleted,
+        }
+
+    @classmethod
+    @dao_method
+    async def ensure_partitions(
+        cls, since: datetime | None = None, months_ahead: int | None = None
+    ) -> int:
+        """
+        Создаёт месячные секции rolls от месяца since (по умолчанию текущего)
+        на months_ahead месяцев вперёд. Возвращает количество новых секций.
+        """
+        if months_ahead is None:
+            months_ahead = settings.ROLLS_PARTITIONS_AHEAD
+        query = select(func.ensure_rolls_partitions(since or datetime.now(), months_ahead))
+        async with async_session_maker() as session:
+            created = (await session.execute(query)).scalar()
+            await session.commit()
+        return created
+
+    @classmethod
+    @dao_method
+    async def archive(
+        cls, before: datetime | None = None, batch_size: int | None = None
+    ) -> int:
+        """
+        Переносит в rolls_archive рулоны, удалённые и добавленные раньше
+        before (по умолчанию archive_cutoff()). Сначала отдельной транзакцией
+        сдвигает границу архива rolls_inventory.archived_before до before,
+        чтобы запросы начали читать архив до появления в нём рулонов; граница
+        только растёт. Каждая пачка из batch_size рулонов переносится одним
+        запросом в отдельной транзакции; строки, заблокированные другими
+        транзакциями, пропускаются до следующего запуска.
+        Возвращает количество перенесённых рулонов.
+        """
+        before = before or archive_cutoff()
+        if before > datetime.now():
+            raise ValueError("Граница архива не может быть в будущем")
+        batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+
+        async with async_session_maker() as session:
+            await session.execute(
+                pg_insert(RollsInventory)
+                .values(id=RollsInventoryDAO.ROW_ID, archived_before=before)
+                .on_conflict_do_update(
+                    index_elements=[RollsInventory.id],
+                    set_={
+                        "archived_before": func.greatest(
+                            RollsInventory.archived_before, before
+                        )
+                    },
+                )
+            )
             await session.commit()
-            return result.scalar_one_or_none()
-    
+
+        locked = (
+            select(Rolls.id, Rolls.created_at)
+            # Рулоны позже сохранённой границы не переносятся, иначе запросы
+            # их бы не нашли
+            .where(
+                Rolls.deleted_at < before,
+                Rolls.created_at < before,
+                archived_before() >= cast(literal(before), TIMESTAMP),
+            )
+            .order_by(Rolls.deleted_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .cte("locked")
+        )
+        moved = (
+            delete(Rolls)
+            .where(
+                tuple_(Rolls.id, Rolls.created_at).in_(
+                    select(locked.c.id, locked.c.created_at)
+                )
+            )
+            .returning(*(Rolls.__table__.c[name] for name in ARCHIVE_COLUMNS))
+            .cte("moved")
+        )
+        query = (
+            insert(RollsArchive)
+            .from_select(
+                ARCHIVE_COLUMNS, select(*(moved.c[name] for name in ARCHIVE_COLUMNS))
+            )
+            .returning(RollsArchive.id)
+        )
+
+        archived = 0
+        while True:
+            async with async_session_maker() as session:
+                count = len((await session.execute(query)).all())
+                await session.commit()
+            archived += count
+            if count < batch_size:
+                return archived
+
+    @staticmethod
+    def check_fields(fields) -> tuple[str, ...]:
+        """
+        Проверяет поля для выборки части колонок по колонкам модели Rolls.
+        Возвращает их без повторов; ValueError при пустом списке или
+        неизвестном поле.
+        """
+        fields = tuple(dict.fromkeys(fields))
+        if not fields:
+            raise ValueError("Не указано ни одного поля")
+        unknown = [field for field in fields if field not in Rolls.__table__.columns]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        return fields
+
+    @classmethod
+    def _rolls_source(cls, filters: RollFilter, columns=roll_columns):
+        """
+        Подзапрос с колонками columns(table) (по умолчанию ROLL_COLUMNS)
+        по рулонам под фильтры: из rolls и, если фильтры захватывают архив
+        (см. archive_reached), из rolls_archive
+        """
+        archive = RollsArchive.__table__
+        return union_all(
+            select(*columns(Rolls.__table__)).where(*cls._filter_conditions(filters)),
+            select(*columns(archive)).where(
+                *cls._filter_conditions(filters, archive),
+                *archive_reached(
+                    *(
+                        _to_local(moment)
+                        for moment in (filters.created_at_min, filters.deleted_at_min)
+                        if moment is not None
+                    )
+                ),
+            ),
+        ).subquery("rolls")
+
+    @staticmethod
+    def _created_at_lower_bound(moment: datetime, with_active: bool):
+        """
+        Нижняя граница created_at рулонов, удалённых не раньше moment
+        (и, если with_active, ещё лежащих на складе). Рулон удаляется не раньше,
+        чем добавлен, поэтому граница — moment минус наибольший срок хранения
+        среди удалённых с этого дня (из rolls_daily_stats).
+        Значение считается подзапросом один раз за запрос, и Postgres по нему
+        отсекает старые секции rolls во время выполнения.
+        Граница зависит от дневных агрегатов, поэтому используется только
+        в статистике; если агрегатов с этого дня нет, границы нет.
+        """
+        dwell = (
+            select(func.max(RollsDailyStats.dwell_max))
+            .where(RollsDailyStats.day >= moment.date())
+            .scalar_subquery()
+        )
+        moment = cast(literal(moment), TIMESTAMP)
+        bound = func.coalesce(moment - dwell, cast(literal("-infinity"), TIMESTAMP))
+        if not with_active:
+            return bound
+        oldest_active = (
+            select(func.min(Rolls.created_at))
+            .where(Rolls.deleted_at.is_(None))
+            .scalar_subquery()
+        )
+        # least пропускает NULL, если рулонов на складе нет
+        return func.least(bound, oldest_active)
+
+    @classmethod
+    def _filter_conditions(cls, filters: RollFilter, table=Rolls.__table__) -> list:
+        """
+        Условия WHERE для переданных фильтров. table — rolls или rolls_archive.
+        Условия не зависят от дневных агрегатов: по ним выбираются и удаляются
+        рулоны, и расхождение агрегатов не должно терять строки.
+        """
+        columns = table.c
+        conditions = []
+
+        if filters.id_min is not None:
+            conditions.append(columns.id >= filters.id_min)
+        if filters.id_max is not None:
+            conditions.append(columns.id <= filters.id_max)
+        if filters.weight_min is not None:
+            conditions.append(columns.weight >= filters.weight_min)
+        if filters.weight_max is not None:
+            conditions.append(columns.weight <= filters.weight_max)
+        if filters.length_min is not None:
+            conditions.append(columns.length >= filters.length_min)
+        if filters.length_max is not None:
+            conditions.append(columns.length <= filters.length_max)
+        if filters.created_at_min is not None:
+            conditions.append(columns.created_at >= filters.created_at_min)
+        if filters.created_at_max is not None:
+            conditions.append(columns.created_at <= filters.created_at_max)
+        if filters.deleted_at_min is not None:
+            conditions.append(columns.deleted_at >= filters.deleted_at_min)
+        if filters.deleted_at_max is not None:
+            conditions.append(columns.deleted_at <= filters.deleted_at_max)
+
+        return conditions
+
     @classmethod
-    async def find_all(cls, filters: RollFilter):
+    @dao_method
+    async def find_all(cls, filters: RollFilter, fields: tuple[str, ...] | None = None):
         """
         Получает список рулонов с учетом фильтров.
         Фильтры применяются только к тем параметрам, которые переданы.
+        Возвращает строки (не ORM-объекты) с колонками ROLL_COLUMNS
+        или только с колонками fields, если они переданы.
+        Архив читается, только если фильтры его захватывают.
         """
-        async with async_session_maker() as session:
-            query = select(Rolls)
-            
-            # Создаем список условий для фильтрации
-            conditions = []
-            
-            if filters.id_min is not None:
-                conditions.append(Rolls.id >= filters.id_min)
-            if filters.id_max is not None:
-                conditions.append(Rolls.id <= filters.id_max)
-            if filters.weight_min is not None:
-                conditions.append(Rolls.weight >= filters.weight_min)
-            if filters.weight_max is not None:
-                conditions.append(Rolls.weight <= filters.weight_max)
-            if filters.length_min is not None:
-                conditions.append(Rolls.length >= filters.length_min)
-            if filters.length_max is not None:
-                conditions.append(Rolls.length <= filters.length_max)
-            if filters.created_at_min is not None:
-                conditions.append(Rolls.created_at >= filters.created_at_min)
-            if filters.created_at_max is not None:
-                conditions.append(Rolls.created_at <= filters.created_at_max)
-            if filters.deleted_at_min is not None:
-                conditions.append(Rolls.deleted_at >= filters.deleted_at_min)
-            if filters.deleted_at_max is not None:
-                conditions.append(Rolls.deleted_at <= filters.deleted_at_max)
-            
-            if conditions:
-                query = query.where(and_(*conditions))
-            
+        columns = roll_columns
+        if fields is not None:
+            fields = cls.check_fields(fields)
+            columns = partial(roll_columns, fields=fields)
+
+        async with read_session_maker()() as session:
+            # Условия фильтрации применяются внутри подзапроса к каждой таблице
+            query = select(cls._rolls_source(filters, columns))
+
             result = await session.execute(query)
-            return result.scalars().all()
-        
+            return result.all()
+
     @classmethod
-    async def get_statistics(cls, start_date: datetime, end_date: datetime):
-        async with async_session_maker() as session:
+    @dao_method
+    async def find_page(
+        cls,
+        filters: RollFilter,
+        limit: int | None = None,
+        cursor: RollCursor | None = None,
+        order_by: str = "id",
+        fields: tuple[str, ...] | None = None,
+    ):
+        """
+        Страница рулонов с keyset-пагинацией по (id) или (created_at, id).
+        Возвращает рулоны и курсор следующей страницы (None, если она последняя).
+        С fields строки начинаются с колонок fields, за которыми идут
+        недостающие колонки сортировки.
+        """
+        if cursor is not None and cursor.order_by != order_by:
+            raise ValueError("Курсор не соответствует параметру order_by")
+
+        columns = roll_columns
+        if fields is not None:
+            # Колонки сортировки нужны для условия курсора и следующего курсора
+            ordering_fields = ("created_at", "id") if order_by == "created_at" else ("id",)
+            fields = cls.check_fields(fields)
+            selected = fields + tuple(
+                field for field in ordering_fields if field not in fields
+            )
+            columns = partial(roll_columns, fields=selected)
+
+        rolls = cls._rolls_source(filters, columns)
+        conditions = []
+        if order_by == "id":
+            ordering = (rolls.c.id,)
+            if cursor is not None:
+                conditions.append(rolls.c.id > cursor.id)
+        elif order_by == "created_at":
+            ordering = (rolls.c.created_at, rolls.c.id)
+            if cursor is not None:
+                conditions.append(
+                    tuple_(rolls.c.created_at, rolls.c.id)
+                    > tuple_(cursor.created_at, cursor.id)
+                )
+        else:
+            raise ValueError(f"Недопустимая сортировка: {order_by}")
+
+        query = select(rolls).where(*conditions).order_by(*ordering)
+        if limit is not None:
+            # Лишняя строка показывает, есть ли следующая страница
+            query = query.limit(limit + 1)
+
+        async with read_session_maker()() as session:
+            rolls = (await session.execute(query)).all()
+
+        if limit is None or len(rolls) <= limit:
+            return rolls, None
+
+        rolls = rolls[:limit]
+        last = rolls[-1]
+        next_cursor = RollCursor(
+            order_by=order_by,
+            id=last.id,
+            created_at=last.created_at if order_by == "created_at" else None,
+        )
+        return rolls, next_cursor
+
+    @classmethod
+    @dao_method
+    async def stream_all(cls, filters: RollFilter, batch_size: int):
+        """
+        Отдаёт рулоны по фильтрам пачками по batch_size строк.
+        Строки читаются через серверный курсор, поэтому в памяти
+        одновременно находится только одна пачка.
+        """
+        rolls = cls._rolls_source(filters)
+        query = (
+            select(rolls)
+            .order_by(rolls.c.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async with read_session_maker()() as session:
+            result = await session.stream(query)
+            async for batch in result.partitions():
+                yield batch
+
+    @classmethod
+    @dao_method
+    async def get_summary(cls, filters: RollFilter):
+        """
+        Количество рулонов под фильтры и сумма, среднее, минимум и максимум
+        их длины и веса. Считается одним запросом в БД без выборки строк.
+        """
+        rolls = cls._rolls_source(
+            filters, columns=lambda table: (table.c.length, table.c.weight)
+        )
+        query = select(
+            func.count().label("total_rolls"),
+            func.coalesce(func.sum(rolls.c.length), 0).label("total_length"),
+            func.coalesce(func.sum(rolls.c.weight), 0).label("total_weight"),
+            func.avg(rolls.c.length).label("avg_length"),
+            func.avg(rolls.c.weight).label("avg_weight"),
+            func.min(rolls.c.length).label("min_length"),
+            func.max(rolls.c.length).label("max_length"),
+            func.min(rolls.c.weight).label("min_weight"),
+            func.max(rolls.c.weight).label("max_weight"),
+        )
+        async with read_session_maker()() as session:
+            return (await session.execute(query)).one()._mapping
+
+    @classmethod
+    @dao_method
+    async def get_statistics(
+        cls,
+        start_date: datetime,
+        end_date: datetime,
+        strategy: str | None = None,
+        version: int | None = None,
+    ):
+        """
+        Статистика по рулонам за период.
+        strategy выбирает способ расчёта: "rollup" — полные дни из дневных
+        агрегатов rolls_daily_stats, "single" — один запрос по таблице rolls,
+        "legacy" — прежний расчёт несколькими запросами (для сверки результатов).
+        По умолчанию берётся из настройки STATISTICS_STRATEGY.
+        Результаты кэшируются в get_statistics_cache(). С version (версия данных,
+        прочитанная до расчёта, для ETag) она входит в ключ кэша, поэтому
+        значение, посчитанное до записи в другом воркере, не отдаётся
+        с ETag более новой версии.
+        """
+        start_date, end_date = _to_local(start_date), _to_local(end_date)
+        strategy = strategy or settings.STATISTICS_STRATEGY
+        if not settings.STATISTICS_CACHE_ENABLED:
+            return await cls._calculate_statistics(start_date, end_date, strategy)
+
+        key = (strategy, start_date, end_date)
+        if version is not None:
+            key += (version,)
+        cache = get_statistics_cache()
+        found, statistics = cache.get(key)
+        if not found:
+            # Запись, сбросившая кэш во время расчёта, могла в него не попасть
+            generation = cache.generation
+            statistics = await cls._calculate_statistics(start_date, end_date, strategy)
+            cache.set(
+                key,
+                end_date,
+                statistics,
+                max_ttl=settings.STATISTICS_CACHE_TTL if get_replicas() else None,
+                generation=generation,
+            )
+        # Копия, чтобы вызывающий код не мог изменить закэшированное значение
+        return dict(statistics) if statistics is not None else None
+
+    @classmethod
+    @dao_method
+    async def get_statistics_series(
+        cls, start_date: datetime, end_date: datetime, bucket: str
+    ) -> list:
+        """
+        Количество и вес добавленных и удалённых рулонов по интервалам
+        bucket ("hour", "day", "week", "month") за период. Пустые интервалы
+        тоже возвращаются (с нулями). Количество интервалов ограничено
+        настройкой STATISTICS_SERIES_MAX_BUCKETS.
+        """
+        start_date, end_date = _to_local(start_date), _to_local(end_date)
+        buckets = _bucket_count(start_date, end_date, bucket)
+        if buckets > settings.STATISTICS_SERIES_MAX_BUCKETS:
+            raise ValueError(
+                f"Слишком много интервалов: {buckets}, "
+                f"не более {settings.STATISTICS_SERIES_MAX_BUCKETS}"
+            )
+
+        query = cls.statistics_series_query(start_date, end_date, bucket)
+        async with read_session_maker()() as session:
+            return (await session.execute(query)).all()
+
+    @classmethod
+    @dao_method
+    async def get_percentiles(
+        cls, start_date: datetime, end_date: datetime, quantiles=(0.5, 0.9, 0.99)
+    ):
+        """
+        Квантили длины и веса рулонов, добавленных за период, и срока
+        хранения (в днях) рулонов, удалённых за период. Для полных дней
+        объединяются дневные t-digest из rolls_daily_stats, значения неполных
+        крайних дней и дней без дайджеста берутся из rolls точно.
+        Возвращает None, если за период рулоны не добавлялись и не удалялись.
+        """
+        start_date, end_date = _to_local(start_date), _to_local(end_date)
+        full_start, full_end = _full_days(start_date, end_date)
+        daily = select(
+            RollsDailyStats.day,
+            RollsDailyStats.length_digest,
+            RollsDailyStats.weight_digest,
+            RollsDailyStats.dwell_digest,
+        ).where(
+            RollsDailyStats.day >= full_start.date(),
+            RollsDailyStats.day < full_end.date(),
+        )
+
+        async with read_session_maker()() as session:
+            days = (await session.execute(daily)).all()
+            raw_added_days = [
+                day.day for day in days if day.length_digest is None or day.weight_digest is None
+            ]
+            raw_deleted_days = [day.day for day in days if day.dwell_digest is None]
+
+            rolls = all_rolls(since=start_date)
+
+            def not_covered(column, raw_days):
+                return and_(
+                    column >= start_date,
+                    column <= end_date,
+                    or_(
+                        column < full_start,
+                        column >= full_end,
+                        func.date(column) == any_(literal(raw_days, ARRAY(Date))),
+                    ),
+                )
+
+            added = not_covered(rolls.c.created_at, raw_added_days)
+            deleted = not_covered(rolls.c.deleted_at, raw_deleted_days)
+            raw = select(
+                func.array_agg(cast(rolls.c.length, Float)).filter(added),
+                func.array_agg(cast(rolls.c.weight, Float)).filter(added),
+                func.array_agg(dwell_days(rolls)).filter(deleted),
+            ).where(
+                or_(added, deleted),
+                # Равносильные границы для отсечения секций
+                rolls.c.created_at <= end_date,
+                rolls.c.created_at
+                >= cls._created_at_lower_bound(start_date, with_active=False),
+            )
+            lengths, weights, dwell = (await session.execute(raw)).one()
+
+        raw_days = {"length_digest": set(raw_added_days), "weight_digest": set(raw_added_days)}
+        raw_days["dwell_digest"] = set(raw_deleted_days)
+
+        def merged(name, values):
+            digests = [
+                TDigest.from_json(getattr(day, name))
+                for day in days
+                if day.day not in raw_days[name]
+            ]
+            return TDigest.merge(digests, values or (), settings.QUANTILE_SKETCH_COMPRESSION)
+
+        length = merged("length_digest", lengths)
+        weight = merged("weight_digest", weights)
+        dwell = merged("dwell_digest", dwell)
+        if not length.count and not dwell.count:
+            return None
+
+        def percentiles(digest):
+            return {f"p{round(q * 100)}": digest.quantile(q) for q in quantiles}
+
+        return {
+            "total_added": int(length.count),
+            "total_deleted": int(dwell.count),
+            "length": percentiles(length),
+            "weight": percentiles(weight),
+            "dwell": percentiles(dwell),
+        }
+
+    @classmethod
+    def statistics_series_query(cls, start_date: datetime, end_date: datetime, bucket: str):
+        """
+        Один запрос: интервалы из generate_series, к которым присоединяются
+        сгруппированные по date_trunc добавления и удаления за период.
+        Для интервалов от дня и больше полные дни периода берутся из
+        rolls_daily_stats, а по таблице rolls считаются только крайние дни.
+        """
+        rolls = all_rolls(since=start_date)
+        if bucket == "hour":
+            full_start = full_end = end_date
+        else:
+            full_start, full_end = _full_days(start_date, end_date)
+        daily = RollsDailyStats.__table__.c
+
+        def grouped(name, moment, count, weight, *conditions):
+            moments = union_all(
+                select(
+                    func.date_trunc(bucket, moment).label("bucket_start"),
+                    literal(1).label("count"),
+                    rolls.c.weight,
+                ).where(
+                    moment >= start_date,
+                    moment <= end_date,
+                    or_(moment < full_start, moment >= full_end),
+                    *conditions,
+                ),
+                select(
+                    func.date_trunc(bucket, cast(daily.day, TIMESTAMP)),
+                    count,
+                    weight,
+                ).where(
+                    daily.day >= full_start.date(),
+                    daily.day < full_end.date(),
+                    count > 0,
+                ),
+            ).subquery()
+            return (
+                select(
+                    moments.c.bucket_start,
+                    func.sum(moments.c.count).label("count"),
+                    func.sum(moments.c.weight).label("weight"),
+                )
+                .group_by(moments.c.bucket_start)
+                .cte(name)
+            )
+
+        added = grouped(
+            "added", rolls.c.created_at, daily.added_count, daily.added_weight_sum
+        )
+        deleted = grouped(
+            "deleted",
+            rolls.c.deleted_at,
+            daily.deleted_count,
+            daily.deleted_weight_sum,
+            # Равносильные границы для отсечения секций
+            rolls.c.created_at <= end_date,
+            rolls.c.created_at >= cls._created_at_lower_bound(start_date, with_active=False),
+        )
+        buckets = select(
+            func.generate_series(
+                cast(literal(_bucket_start(start_date, bucket)), TIMESTAMP),
+                cast(literal(end_date), TIMESTAMP),
+                cast(literal(f"1 {bucket}"), INTERVAL),
+            ).label("bucket_start")
+        ).cte("buckets")
+
+        return (
+            select(
+                buckets.c.bucket_start,
+                func.coalesce(added.c.count, 0).label("added_count"),
+                func.coalesce(deleted.c.count, 0).label("deleted_count"),
+                func.coalesce(added.c.weight, 0).label("added_weight"),
+                func.coalesce(deleted.c.weight, 0).label("deleted_weight"),
+            )
+            .select_from(
+                buckets.outerjoin(
+                    added, added.c.bucket_start == buckets.c.bucket_start
+                ).outerjoin(deleted, deleted.c.bucket_start == buckets.c.bucket_start)
+            )
+            .order_by(buckets.c.bucket_start)
+        )
+
+    @staticmethod
+    def _invalidate_statistics(rolls):
+        """
+        Сбрасывает кэш статистики после записи. Рулон, добавленный в момент
+        created_at, влияет на статистику всех периодов с end_date >= created_at
+        (он учитывается в них до самого удаления), удаление — на те же периоды.
+        """
+        created = [roll.created_at for roll in rolls if roll.created_at is not None]
+        if created:
+            get_statistics_cache().invalidate_since(min(created))
+
+    @classmethod
+    async def _calculate_statistics(
+        cls, start_date: datetime, end_date: datetime, strategy: str
+    ):
+        if strategy == "legacy":
+            return await cls._get_statistics_legacy(start_date, end_date)
+
+        query = cls.statistics_query(start_date, end_date, strategy)
+        async with read_session_maker()() as session:
+            row = (await session.execute(query)).one()
+
+        if not row.total_rolls:
+            return None
+
+        return {
+            "total_added": row.total_added,
+            "total_deleted": row.total_deleted,
+            "avg_length": row.avg_length,
+            "avg_weight": row.avg_weight,
+            "max_length": row.max_length,
+            "min_length": row.min_length,
+            "max_weight": row.max_weight,
+            "min_weight": row.min_weight,
+            "total_weight": row.total_weight,
+            "max_time_between_add_delete": _to_days(row.max_time),  # в днях
+            "min_time_between_add_delete": _to_days(row.min_time),  # в днях
+            "day_min_rolls": row.day_min_rolls,
+            "day_max_rolls": row.day_max_rolls,
+            "day_min_weight": row.day_min_weight,
+            "day_max_weight": row.day_max_weight,
+        }
+
+    @classmethod
+    def statistics_query(cls, start_date: datetime, end_date: datetime, strategy: str):
+        """
+        Запрос статистики за период для стратегий "rollup" и "single".
+        Если период начинается раньше границы архива, рулоны читаются
+        из rolls вместе с rolls_archive.
+        """
+        rolls = all_rolls(since=start_date)
+        if strategy == "rollup":
+            return cls._statistics_rollup_query(rolls, start_date, end_date)
+        if strategy == "single":
+            return cls._statistics_single_query(rolls, start_date, end_date)
+        raise ValueError(f"Неизвестная стратегия расчёта статистики: {strategy}")
+
+    @classmethod
+    def _statistics_single_query(cls, rolls, start_date: datetime, end_date: datetime):
+        """
+        Вся статистика одним запросом: одна выборка из rolls (таблицы или подзапроса) в CTE,
+        агрегаты с FILTER и выбор дней через оконные функции.
+        При равенстве значений выбирается более ранний день.
+        """
+        created_in_range = and_(
+            rolls.c.created_at >= start_date, rolls.c.created_at <= end_date
+        )
+        deleted_in_range = and_(
+            rolls.c.deleted_at >= start_date, rolls.c.deleted_at <= end_date
+        )
+        # Рулоны, которые были на складе хотя бы в какой-то момент периода
+        in_window = and_(
+            rolls.c.created_at <= end_date,
+            or_(rolls.c.deleted_at.is_(None), rolls.c.deleted_at >= start_date),
+        )
+
+        base = (
+            select(
+                rolls.c.length,
+                rolls.c.weight,
+                rolls.c.created_at,
+                rolls.c.deleted_at,
+                created_in_range.label("created_in_range"),
+                deleted_in_range.label("deleted_in_range"),
+                in_window.label("in_window"),
+            )
+            .where(
+                or_(in_window, deleted_in_range),
+                # Равносильные границы для отсечения секций
+                rolls.c.created_at <= end_date,
+                rolls.c.created_at
+                >= cls._created_at_lower_bound(start_date, with_active=True),
+            )
+            .cte("base")
+        )
+
+        active = and_(base.c.in_window, base.c.created_at >= start_date)
+        removed = and_(base.c.in_window, base.c.deleted_at.is_not(None))
+        time_between = base.c.deleted_at - base.c.created_at
+
+        totals = select(
+            func.count()
+            .filter(or_(base.c.created_in_range, base.c.deleted_in_range))
+            .label("total_rolls"),
+            func.count().filter(base.c.created_in_range).label("total_added"),
+            func.count().filter(base.c.deleted_in_range).label("total_deleted"),
+            func.avg(base.c.length).filter(active).label("avg_length"),
+            func.avg(base.c.weight).filter(active).label("avg_weight"),
+            func.max(base.c.length).filter(active).label("max_length"),
+            func.min(base.c.length).filter(active).label("min_length"),
+            func.max(base.c.weight).filter(active).label("max_weight"),
+            func.min(base.c.weight).filter(active).label("min_weight"),
+            func.sum(base.c.weight).filter(active).label("total_weight"),
+            func.max(time_between).filter(removed).label("max_time"),
+            func.min(time_between).filter(removed).label("min_time"),
+        ).cte("totals")
+
+        day = func.date(base.c.created_at)
+        per_day = (
+            select(
+                day.label("day"),
+                func.count().label("rolls_count"),
+                func.sum(base.c.weight).label("total_weight"),
+            )
+            .where(base.c.in_window)
+            .group_by(day)
+            .cte("per_day")
+        )
+        days = cls._rank_days(per_day)
+
+        return select(totals, days).select_from(totals.join(days, true()))
+
+    @classmethod
+    def _statistics_rollup_query(cls, rolls, start_date: datetime, end_date: datetime):
+        """
+        Статистика из дневных агрегатов: дни, целиком попавшие в период,
+        берутся из rolls_daily_stats, а по таблице rolls считаются только
+        неполные крайние дни и рулоны, пересекающие границы периода.
+        Всё вычисляется одним запросом.
+        """
+        # Полные дни периода: [full_start, full_end)
+        full_start, full_end = _full_days(start_date, end_date)
+
+        def in_full_days(column):
+            return and_(column >= full_start, column < full_end)
+
+        created_in_range = and_(
+            rolls.c.created_at >= start_date, rolls.c.created_at <= end_date
+        )
+        deleted_in_range = and_(
+            rolls.c.deleted_at >= start_date, rolls.c.deleted_at <= end_date
+        )
+        in_window = and_(
+            rolls.c.created_at <= end_date,
+            or_(rolls.c.deleted_at.is_(None), rolls.c.deleted_at >= start_date),
+        )
+
+        # Строки rolls, не покрытые агрегатами полных дней
+        raw = (
+            select(
+                rolls.c.length,
+                rolls.c.weight,
+                rolls.c.created_at,
+                rolls.c.deleted_at,
+                and_(created_in_range, ~in_full_days(rolls.c.created_at)).label(
+                    "added"
+                ),
+                and_(deleted_in_range, ~in_full_days(rolls.c.deleted_at)).label(
+                    "deleted"
+                ),
+                and_(in_window, ~in_full_days(rolls.c.created_at)).label("per_day"),
+                and_(
+                    in_window,
+                    rolls.c.deleted_at.is_not(None),
+                    ~in_full_days(rolls.c.deleted_at),
+                ).label("removed"),
+            )
+            .where(
+                or_(
+                    and_(rolls.c.created_at < full_start, in_window),
+                    and_(rolls.c.created_at >= full_end, rolls.c.created_at <= end_date),
+                    and_(
+                        rolls.c.deleted_at >= start_date, rolls.c.deleted_at < full_start
+                    ),
+                    and_(rolls.c.deleted_at >= full_end, rolls.c.created_at <= end_date),
+                ),
+                # Равносильные границы для отсечения секций
+                rolls.c.created_at <= end_date,
+                rolls.c.created_at
+                >= cls._created_at_lower_bound(start_date, with_active=True),
+            )
+            .cte("raw")
+        )
+        active = and_(
+            raw.c.added,
+            or_(raw.c.deleted_at.is_(None), raw.c.deleted_at >= start_date),
+        )
+        time_between = raw.c.deleted_at - raw.c.created_at
+        raw_totals = select(
+            func.count().filter(raw.c.added).label("added_count"),
+            func.count().filter(raw.c.deleted).label("deleted_count"),
+            func.count().filter(active).label("active_count"),
+            func.sum(raw.c.length).filter(active).label("length_sum"),
+            func.min(raw.c.length).filter(active).label("length_min"),
+            func.max(raw.c.length).filter(active).label("length_max"),
+            func.sum(raw.c.weight).filter(active).label("weight_sum"),
+            func.min(raw.c.weight).filter(active).label("weight_min"),
+            func.max(raw.c.weight).filter(active).label("weight_max"),
+            func.min(time_between).filter(raw.c.removed).label("dwell_min"),
+            func.max(time_between).filter(raw.c.removed).label("dwell_max"),
+        ).cte("raw_totals")
+
+        daily = (
+            select(RollsDailyStats)
+            .where(
+                RollsDailyStats.day >= full_start.date(),
+                RollsDailyStats.day < full_end.date(),
+            )
+            .cte("daily")
+        )
+        has_added = daily.c.added_count > 0
+        daily_totals = select(
+            func.sum(daily.c.added_count).label("added_count"),
+            func.sum(daily.c.deleted_count).label("deleted_count"),
+            func.sum(daily.c.added_length_sum).filter(has_added).label("length_sum"),
+            func.min(daily.c.added_length_min).label("length_min"),
+            func.max(daily.c.added_length_max).label("length_max"),
+            func.sum(daily.c.added_weight_sum).filter(has_added).label("weight_sum"),
+            func.min(daily.c.added_weight_min).label("weight_min"),
+            func.max(daily.c.added_weight_max).label("weight_max"),
+            func.min(daily.c.dwell_min).label("dwell_min"),
+            func.max(daily.c.dwell_max).label("dwell_max"),
+        ).cte("daily_totals")
+
+        def combined_sum(name):
+            raw_value, daily_value = raw_totals.c[name], daily_totals.c[name]
+            return func.coalesce(raw_value + daily_value, raw_value, daily_value)
+
+        total_added = raw_totals.c.added_count + func.coalesce(
+            daily_totals.c.added_count, 0
+        )
+        total_deleted = raw_totals.c.deleted_count + func.coalesce(
+            daily_totals.c.deleted_count, 0
+        )
+        active_count = raw_totals.c.active_count + func.coalesce(
+            daily_totals.c.added_count, 0
+        )
+        totals = (
+            select(
+                (total_added + total_deleted).label("total_rolls"),
+                total_added.label("total_added"),
+                total_deleted.label("total_deleted"),
+                (combined_sum("length_sum") / func.nullif(active_count, 0)).label(
+                    "avg_length"
+                ),
+                (combined_sum("weight_sum") / func.nullif(active_count, 0)).label(
+                    "avg_weight"
+                ),
+                func.greatest(
+                    raw_totals.c.length_max, daily_totals.c.length_max
+                ).label("max_length"),
+                func.least(raw_totals.c.length_min, daily_totals.c.length_min).label(
+                    "min_length"
+                ),
+                func.greatest(
+                    raw_totals.c.weight_max, daily_totals.c.weight_max
+                ).label("max_weight"),
+                func.least(raw_totals.c.weight_min, daily_totals.c.weight_min).label(
+                    "min_weight"
+                ),
+                combined_sum("weight_sum").label("total_weight"),
+                func.greatest(raw_totals.c.dwell_max, daily_totals.c.dwell_max).label(
+                    "max_time"
+                ),
+                func.least(raw_totals.c.dwell_min, daily_totals.c.dwell_min).label(
+                    "min_time"
+                ),
+            )
+            .select_from(raw_totals.join(daily_totals, true()))
+            .cte("totals")
+        )
+
+        raw_day = func.date(raw.c.created_at)
+        per_day = union_all(
+            select(
+                raw_day.label("day"),
+                func.count().label("rolls_count"),
+                func.sum(raw.c.weight).label("total_weight"),
+            )
+            .where(raw.c.per_day)
+            .group_by(raw_day),
+            select(
+                daily.c.day,
+                daily.c.added_count,
+                daily.c.added_weight_sum,
+            ).where(has_added),
+        ).cte("per_day")
+        days = cls._rank_days(per_day)
+
+        return select(totals, days).select_from(totals.join(days, true()))
+
+    @staticmethod
+    def _rank_days(per_day):
+        """
+        По CTE (day, rolls_count, total_weight) выбирает дни с минимальным и
+        максимальным количеством и весом. При равенстве берётся более ранний день.
+        """
+        ranked = select(
+            per_day.c.day,
+            func.row_number()
+            .over(order_by=(per_day.c.rolls_count.asc(), per_day.c.day))
+            .label("min_rolls_rank"),
+            func.row_number()
+            .over(order_by=(per_day.c.rolls_count.desc(), per_day.c.day))
+            .label("max_rolls_rank"),
+            func.row_number()
+            .over(order_by=(per_day.c.total_weight.asc(), per_day.c.day))
+            .label("min_weight_rank"),
+            func.row_number()
+            .over(order_by=(per_day.c.total_weight.desc(), per_day.c.day))
+            .label("max_weight_rank"),
+        ).cte("ranked")
+        return select(
+            func.min(ranked.c.day)
+            .filter(ranked.c.min_rolls_rank == 1)
+            .label("day_min_rolls"),
+            func.min(ranked.c.day)
+            .filter(ranked.c.max_rolls_rank == 1)
+            .label("day_max_rolls"),
+            func.min(ranked.c.day)
+            .filter(ranked.c.min_weight_rank == 1)
+            .label("day_min_weight"),
+            func.min(ranked.c.day)
+            .filter(ranked.c.max_weight_rank == 1)
+            .label("day_max_weight"),
+        ).cte("days")
+
+    @classmethod
+    async def _get_statistics_legacy(cls, start_date: datetime, end_date: datetime):
+        # Оставлен для сверки и читает только rolls, без rolls_archive
+        async with read_session_maker()() as session:
             # Проверяем, есть ли рулоны в указанный период
             total_rolls_query = select(func.count()).where(
                 or_(
@@ -82,10 +1755,10 @@ class RollsDAO(BaseDAO):
                 )
             )
             total_rolls = (await session.execute(total_rolls_query)).scalar_one()
-            
+
             if not total_rolls:
                 return None
-            
+
             # Количество добавленных рулонов
             added_query = select(func.count()).where(
                 and_(
@@ -94,7 +1767,7 @@ class RollsDAO(BaseDAO):
                 )
             )
             total_added = (await session.execute(added_query)).scalar_one()
-            
+
             # Количество удалённых рулонов
             deleted_query = select(func.count()).where(
                 and_(
@@ -103,7 +1776,7 @@ class RollsDAO(BaseDAO):
                 )
             )
             total_deleted = (await session.execute(deleted_query)).scalar_one()
-            
+
             # Средняя длина и вес
             avg_length_weight_query = select(
                 func.avg(Rolls.length).label("avg_length"),
@@ -122,7 +1795,7 @@ class RollsDAO(BaseDAO):
             avg_result = (await session.execute(avg_length_weight_query)).one()
             avg_length = avg_result.avg_length
             avg_weight = avg_result.avg_weight
-            
+
             # Максимальная и минимальная длина и вес
             max_min_length_weight_query = select(
                 func.max(Rolls.length).label("max_length"),
@@ -144,7 +1817,7 @@ class RollsDAO(BaseDAO):
             min_length = max_min_result.min_length
             max_weight = max_min_result.max_weight
             min_weight = max_min_result.min_weight
-            
+
             # Суммарный вес
             total_weight_query = select(func.sum(Rolls.weight)).where(
                 and_(
@@ -157,7 +1830,7 @@ class RollsDAO(BaseDAO):
                 )
             )
             total_weight = (await session.execute(total_weight_query)).scalar_one_or_none()
-            
+
             # Максимальный и минимальный промежуток между добавлением и удалением
             time_between_query = select(
                 func.max((Rolls.deleted_at - Rolls.created_at)).label("max_time"),
@@ -187,7 +1860,7 @@ class RollsDAO(BaseDAO):
                     )
                 )
             ).group_by(func.date(Rolls.created_at))
-            
+
             rolls_per_day_result = (await session.execute(rolls_per_day_query)).all()
 
             if rolls_per_day_result:
@@ -196,7 +1869,7 @@ class RollsDAO(BaseDAO):
             else:
                 day_min_rolls = None
                 day_max_rolls = None
-            
+
             # День с минимальным и максимальным суммарным весом
             weight_per_day_query = select(
                 func.date(Rolls.created_at).label("day"),
@@ -210,7 +1883,7 @@ class RollsDAO(BaseDAO):
                     )
                 )
             ).group_by(func.date(Rolls.created_at))
-            
+
             weight_per_day_result = (await session.execute(weight_per_day_query)).all()
             if weight_per_day_result:
                 day_min_weight = min(weight_per_day_result, key=lambda x: x.total_weight).day
@@ -218,7 +1891,7 @@ class RollsDAO(BaseDAO):
             else:
                 day_min_weight = None
                 day_max_weight = None
-            
+
             return {
                 "total_added": total_added,
                 "total_deleted": total_deleted,
@@ -0,0 +1,103 @@
+import asyncio
+
+from app.config import get_settings
+from app.rolls.dao import RollsDAO
+
+
+class GroupCommitter:
+    """
+    Групповая запись: рулоны из одновременных вызовов add копятся window
+    секунд (или до max_batch штук) и добавляются одной транзакцией через
+    RollsDAO.add_rolls, поэтому на пачку приходится один сброс WAL.
+    Каждый вызывающий получает свою строку. Если пачка не записалась,
+    её рулоны добавляются по одному, чтобы ошибку получили только те
+    вызывающие, чей рулон её вызвал.
+
+    Отмена ожидающего вызова (например, клиент отключился) не убирает
+    его рулон из пачки.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.fallbacks = 0
+
+    async def add(self, **data):
+        """Добавляет рулон в ближайшую пачку и ждёт её записи"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((data, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._commit(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, batch: list[tuple[dict, asyncio.Future]]):
+        self.batches += 1
+        try:
+            rolls = await RollsDAO.add_rolls([data for data, _ in batch])
+        except Exception:
+            self.fallbacks += 1
+            for data, future in batch:
+                try:
+                    roll = await RollsDAO.add(**data)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(roll)
+            return
+
+        for (_, future), roll in zip(batch, rolls):
+            if not future.done():
+                future.set_result(roll)
+
+    async def close(self):
+        """Записывает накопленные рулоны и дожидается всех пачек"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_group_committer = None
+
+
+def get_group_committer() -> GroupCommitter:
+    """
+    Групповая запись процесса. Создаётся при первом обращении, а не при
+    импорте, и заново после get_settings.cache_clear()
+    """
+    global _group_committer
+    config = get_settings()
+    if _group_committer is None or _group_committer[0] is not config:
+        _group_committer = (
+            config,
+            GroupCommitter(
+                window=config.GROUP_COMMIT_WINDOW_MS / 1000,
+                max_batch=config.GROUP_COMMIT_MAX_BATCH,
+            ),
+        )
+    return _group_committer[1]
+
+
+async def close_group_committer():
+    """Записывает рулоны, ожидающие групповой записи (при остановке приложения)"""
+    if _group_committer is not None:
+        await _group_committer[1].close()
@@ -1,19 +1,141 @@
-from sqlalchemy import TIMESTAMP, CheckConstraint, Column, Integer, Numeric,func
+from sqlalchemy import (
+    TIMESTAMP,
+    BigInteger,
+    CheckConstraint,
+    Column,
+    Date,
+    Index,
+    Integer,
+    Interval,
+    Numeric,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 
 from app.database import Base
+from app.rolls.partitions import register_partition_ddl
 
 
 class Rolls(Base):
     __tablename__ = "rolls"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Таблица секционирована по месяцам created_at, поэтому created_at входит
+    # в первичный ключ; id по-прежнему выдаётся последовательностью
+    id = Column(Integer, primary_key=True, autoincrement=True)
     length = Column(Numeric(10, 2), nullable=False)
-    weight = Column(Numeric(10, 2), nullable=False) 
-    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
-    deleted_at = Column(TIMESTAMP, nullable=True) 
-
+    weight = Column(Numeric(10, 2), nullable=False)
+    created_at = Column(
+        TIMESTAMP,
+        primary_key=True,
+        nullable=False,
+        server_default=func.current_timestamp(),
+    )
+    deleted_at = Column(TIMESTAMP, nullable=True)
 
     __table_args__ = (
         CheckConstraint('length >= 0', name='check_length_positive'),
         CheckConstraint('weight >= 0', name='check_weight_positive'),
-    )
\ No newline at end of file
+        # Диапазоны по created_at и keyset-пагинация по (created_at, id)
+        Index('ix_rolls_created_at_id', 'created_at', 'id'),
+        Index('ix_rolls_deleted_at', 'deleted_at'),
+        # Рулоны, которые сейчас на складе
+        Index(
+            'ix_rolls_active_created_at',
+            'created_at',
+            postgresql_where=text('deleted_at IS NULL'),
+        ),
+        # Пересчёт минимума и максимума в rolls_inventory после удаления
+        Index(
+            'ix_rolls_active_length',
+            'length',
+            postgresql_where=text('deleted_at IS NULL'),
+        ),
+        Index(
+            'ix_rolls_active_weight',
+            'weight',
+            postgresql_where=text('deleted_at IS NULL'),
+        ),
+        # BRIN-индекс ix_rolls_created_at_brin создаётся миграцией b41bb74d7d7f
+        # по желанию (alembic -x rolls_brin=true upgrade head)
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+
+# Секции rolls_pYYYYMM создаёт ensure_rolls_partitions (см. app.rolls.partitions)
+register_partition_ddl(Rolls.__table__)
+
+
+class RollsDailyStats(Base):
+    """
+    Дневные агрегаты по рулонам.
+    Поля added_* считаются по дню добавления, deleted_* и dwell_* — по дню удаления.
+    *_digest — t-digest (app.rolls.sketches) длины и веса добавленных рулонов
+    и срока хранения удалённых (в днях); NULL, если дайджест ещё не посчитан
+    по всем рулонам дня.
+    """
+    __tablename__ = "rolls_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    added_count = Column(BigInteger, nullable=False, server_default="0")
+    added_length_sum = Column(Numeric(20, 2), nullable=False, server_default="0")
+    added_length_min = Column(Numeric(10, 2), nullable=True)
+    added_length_max = Column(Numeric(10, 2), nullable=True)
+    added_weight_sum = Column(Numeric(20, 2), nullable=False, server_default="0")
+    added_weight_min = Column(Numeric(10, 2), nullable=True)
+    added_weight_max = Column(Numeric(10, 2), nullable=True)
+    deleted_count = Column(BigInteger, nullable=False, server_default="0")
+    deleted_weight_sum = Column(Numeric(20, 2), nullable=False, server_default="0")
+    dwell_min = Column(Interval, nullable=True)
+    dwell_max = Column(Interval, nullable=True)
+    length_digest = Column(JSONB(none_as_null=True), nullable=True)
+    weight_digest = Column(JSONB(none_as_null=True), nullable=True)
+    dwell_digest = Column(JSONB(none_as_null=True), nullable=True)
+
+
+class RollsInventory(Base):
+    """
+    Счётчики рулонов, которые сейчас на складе (deleted_at IS NULL),
+    версия данных rolls и граница архива. Единственная строка с id = 1 обновляется
+    в той же транзакции, что и запись в rolls.
+    """
+    __tablename__ = "rolls_inventory"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(BigInteger, nullable=False, server_default="0")
+    length_sum = Column(Numeric(20, 2), nullable=False, server_default="0")
+    length_min = Column(Numeric(10, 2), nullable=True)
+    length_max = Column(Numeric(10, 2), nullable=True)
+    weight_sum = Column(Numeric(20, 2), nullable=False, server_default="0")
+    weight_min = Column(Numeric(10, 2), nullable=True)
+    weight_max = Column(Numeric(10, 2), nullable=True)
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+    # Версия данных rolls: растёт при каждом добавлении и удалении рулонов
+    # и при пересчёте агрегатов, по ней считаются ETag списков и статистики
+    version = Column(BigInteger, nullable=False, server_default="0")
+    # Граница архива: в rolls_archive только рулоны, добавленные и удалённые
+    # раньше неё (NULL — архив пуст). Её сдвигает RollsDAO.archive до переноса
+    archived_before = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint('id = 1', name='check_inventory_single_row'),
+    )
+
+
+class RollsArchive(Base):
+    """
+    Рулоны, удалённые больше ARCHIVE_AFTER_DAYS дней назад. Их переносит из
+    rolls фоновое архивирование; после переноса рулоны больше не меняются.
+    """
+    __tablename__ = "rolls_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    length = Column(Numeric(10, 2), nullable=False)
+    weight = Column(Numeric(10, 2), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+    deleted_at = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        Index('ix_rolls_archive_created_at_id', 'created_at', 'id'),
+        Index('ix_rolls_archive_deleted_at', 'deleted_at'),
+    )
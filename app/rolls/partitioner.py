@@ -0,0 +1,26 @@
+import asyncio
+import logging
+
+from app.config import settings
+from app.rolls.dao import RollsDAO
+
+logger = logging.getLogger("app.partitioner")
+
+
+async def run_partitioner(interval: float | None = None):
+    """
+    Фоновая задача: раз в interval секунд (ROLLS_PARTITIONS_INTERVAL) создаёт
+    секции rolls на ROLLS_PARTITIONS_AHEAD месяцев вперёд, чтобы долго
+    работающий воркер не начал писать в rolls_default. Первые секции создаются
+    при старте приложения, поэтому задача сначала ждёт. Ошибки пишутся в лог
+    и не останавливают задачу.
+    """
+    interval = interval or settings.ROLLS_PARTITIONS_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            created = await RollsDAO.ensure_partitions()
+            if created:
+                logger.info("Создано секций rolls: %d", created)
+        except Exception:
+            logger.exception("Не удалось создать секции rolls")
@@ -0,0 +1,69 @@
+"""
+DDL секционирования rolls по месяцам created_at.
+
+Секции называются rolls_pYYYYMM, строки вне созданных секций попадают
+в rolls_default. Функция ensure_rolls_partitions создаёт месячные секции
+от месяца since до текущего месяца плюс months_ahead и переносит в них
+строки этих месяцев из rolls_default. Тот же SQL выполняет миграция
+c5e1a7f0d2b4.
+"""
+from sqlalchemy import DDL, event
+
+DEFAULT_PARTITION = "rolls_default"
+
+CREATE_DEFAULT_PARTITION = f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF rolls DEFAULT"
+
+CREATE_ENSURE_FUNCTION = """
+CREATE OR REPLACE FUNCTION ensure_rolls_partitions(
+    since timestamp, months_ahead integer DEFAULT 3
+) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', since);
+    last_month timestamp :=
+        date_trunc('month', localtimestamp) + make_interval(months => months_ahead);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    -- Одновременный вызов из нескольких процессов ждёт первый
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_rolls_partitions'));
+    WHILE month_start <= last_month LOOP
+        partition_name := 'rolls_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            -- Пока секции не было, строки месяца лежали в rolls_default,
+            -- а создать секцию поверх таких строк Postgres не даёт
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE rolls INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                partition_name
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM rolls_default'
+                ' WHERE created_at >= %L AND created_at < %L RETURNING *)'
+                ' INSERT INTO %I SELECT * FROM moved',
+                month_start, month_start + interval '1 month', partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE rolls ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + interval '1 month'
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$
+"""
+
+DROP_ENSURE_FUNCTION = "DROP FUNCTION IF EXISTS ensure_rolls_partitions(timestamp, integer)"
+
+
+def register_partition_ddl(table):
+    """
+    Создаёт DEFAULT-секцию и функцию ensure_rolls_partitions вместе с таблицей,
+    чтобы metadata.create_all (например, в тестах) давал рабочую схему
+    """
+    event.listen(table, "after_create", DDL(CREATE_DEFAULT_PARTITION))
+    # DDL подставляет параметры через %, а в теле функции он используется в format()
+    event.listen(table, "after_create", DDL(CREATE_ENSURE_FUNCTION.replace("%", "%%")))
+    event.listen(table, "after_drop", DDL(DROP_ENSURE_FUNCTION))
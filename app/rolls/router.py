@@ -1,18 +1,82 @@
+import csv
+import hashlib
+import io
 from datetime import datetime
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, HTTPException, Query, status
+import orjson
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from app.rolls.dao import RollsDAO
+from app.config import settings
+from app.rolls.dao import RollsDAO, RollsInventoryDAO
+from app.rolls.group_commit import get_group_committer
 from app.rolls.schemas import (
+    RollBatchDelete,
+    RollBatchDeleteResponse,
+    RollBulkResponse,
     RollCreate,
+    RollCursor,
     RollFilter,
+    RollInventoryResponse,
+    RollPageResponse,
+    RollPercentilesResponse,
     RollResponse,
+    RollStatisticsBucket,
     RollStatisticsResponse,
+    RollSummaryResponse,
 )
 
 router_rolls = APIRouter(prefix="/rolls", tags=["Руллоны"])
 
+roll_create_list = TypeAdapter(list[RollCreate])
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Слабое сравнение ETag со списком из заголовка If-None-Match"""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+async def conditional_etag(request: Request, response: Response) -> str | None:
+    """
+    Зависимость для GET-эндпоинтов, ответ которых определяется только данными
+    rolls и параметрами запроса. ETag строится из версии данных
+    (rolls_inventory.version) и параметров; если он совпал с If-None-Match,
+    отвечает 304 до выполнения запросов к rolls. Иначе ставит ETag в ответ
+    (эндпоинты, возвращающие Response сами, ставят его из результата)
+    и сохраняет версию в request.state.data_version.
+    """
+    version = await RollsInventoryDAO.get_version()
+    request.state.data_version = version
+    if version is None:
+        return None
+
+    params = sorted(request.query_params.multi_items())
+    digest = hashlib.blake2b(
+        f"{request.url.path}?{params}".encode(), digest_size=8
+    ).hexdigest()
+    etag = f'W/"{version}-{digest}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    response.headers["ETag"] = etag
+    return etag
+
 
 @router_rolls.post(
     "/", response_model=RollResponse, status_code=status.HTTP_201_CREATED
@@ -23,8 +87,10 @@ async def create_roll(roll_data: RollCreate):
     - **length**: Длина рулона (обязательный параметр).
     - **weight**: Вес рулона (обязательный параметр).
     """
+    # При групповой записи рулон добавляется вместе с одновременными запросами
+    add = get_group_committer().add if settings.GROUP_COMMIT_ENABLED else RollsDAO.add
     try:
-        new_roll = await RollsDAO.add(
+        new_roll = await add(
             length=roll_data.length,
             weight=roll_data.weight,
             created_at=datetime.now(),
@@ -45,6 +111,89 @@ async def create_roll(roll_data: RollCreate):
         )
 
 
+@router_rolls.post(
+    "/bulk", response_model=RollBulkResponse, status_code=status.HTTP_201_CREATED
+)
+async def create_rolls_bulk(request: Request):
+    """
+    Массовое добавление рулонов одной транзакцией.
+    Тело запроса — JSON-массив объектов **RollCreate** или NDJSON
+    (Content-Type: application/x-ndjson), по одному рулону в строке.
+    Возвращает id добавленных рулонов в порядке их следования в запросе.
+    Размер тела (BULK_MAX_BYTES) и количество рулонов (BULK_MAX_ROLLS)
+    проверяются до разбора и валидации рулонов.
+    """
+    too_many_rolls = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=(
+            f"За один запрос можно добавить не более {settings.BULK_MAX_ROLLS} рулонов"
+        ),
+    )
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Тело запроса больше {settings.BULK_MAX_BYTES} байт",
+    )
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.BULK_MAX_BYTES:
+        raise too_large
+    # Тело без Content-Length (chunked) тоже не читается дальше лимита
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.BULK_MAX_BYTES:
+            raise too_large
+
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            lines = [line for line in body.splitlines() if line.strip()]
+            if len(lines) > settings.BULK_MAX_ROLLS:
+                raise too_many_rolls
+            payload = [orjson.loads(line) for line in lines]
+        else:
+            payload = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Некорректное тело запроса: {str(e)}",
+        )
+
+    if isinstance(payload, list) and len(payload) > settings.BULK_MAX_ROLLS:
+        raise too_many_rolls
+
+    try:
+        rolls_data = roll_create_list.validate_python(payload)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+        )
+
+    try:
+        created_at = datetime.now()
+        ids = await RollsDAO.add_many(
+            [
+                {
+                    "length": roll_data.length,
+                    "weight": roll_data.weight,
+                    "created_at": created_at,
+                }
+                for roll_data in rolls_data
+            ]
+        )
+        return {"ids": ids}
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка базы данных: {str(e)}",
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Неизвестная ошибка: {str(e)}",
+        )
+
+
 @router_rolls.delete("/{roll_id}", response_model=RollResponse)
 async def delete_from_warehouse(roll_id: int):
     """
@@ -82,7 +231,38 @@ async def delete_from_warehouse(roll_id: int):
         )
 
 
-@router_rolls.get("/", response_model=list[RollResponse])
+@router_rolls.post("/batch-delete", response_model=RollBatchDeleteResponse)
+async def delete_many_from_warehouse(batch: RollBatchDelete):
+    """
+    Удаление со склада сразу нескольких рулонов одним запросом.
+    - **ids**: Список id удаляемых рулонов.
+    - **filters**: Либо фильтр, под который должны подходить удаляемые рулоны.
+    """
+    try:
+        return await RollsDAO.mark_many_as_deleted(
+            ids=batch.ids, filters=batch.filters
+        )
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Некорректные параметры запроса: {str(e)}",
+        )
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка базы данных: {str(e)}",
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Неизвестная ошибка: {str(e)}",
+        )
+
+
+@router_rolls.get("/", response_model=RollPageResponse)
 async def get_rolls(
     id_min: int | None = Query(None, description="Минимальное значение id"),
     id_max: int | None = Query(None, description="Максимальное значение id"),
@@ -94,11 +274,30 @@ async def get_rolls(
     created_at_max: datetime | None = Query(None, description="Максимальная дата добавления"),
     deleted_at_min: datetime | None = Query(None, description="Минимальная дата удаления"),
     deleted_at_max: datetime | None = Query(None, description="Максимальная дата удаления"),
+    limit: int | None = Query(
+        None, ge=1, le=1000, description="Размер страницы, по умолчанию ROLLS_PAGE_SIZE"
+    ),
+    cursor: str | None = Query(None, description="Курсор из поля next_cursor"),
+    order_by: Literal["id", "created_at"] = Query("id", description="Сортировка страниц"),
+    fields: str | None = Query(
+        None, description="Поля рулона через запятую, например id,weight"
+    ),
+    etag: Annotated[str | None, Depends(conditional_etag)] = None,
 ):
     """
-    Получение списка рулонов со склада с фильтрацией.
+    Получение списка рулонов со склада с фильтрацией постранично:
+    **limit** рулонов (по умолчанию настройка ROLLS_PAGE_SIZE) в **items**
+    и курсор следующей страницы в **next_cursor** и заголовке **X-Next-Cursor**
+    (null и без заголовка на последней странице). Все рулоны без страниц
+    отдаёт /rolls/export.
+    При указании **fields** из БД читаются и возвращаются только эти поля.
+    Ответ содержит ETag; с совпавшим If-None-Match возвращается 304.
     """
     try:
+        if fields is not None:
+            fields = RollsDAO.check_fields(
+                field.strip() for field in fields.split(",") if field.strip()
+            )
         filters = RollFilter(
             id_min=id_min,
             id_max=id_max,
@@ -111,8 +310,27 @@ async def get_rolls(
             deleted_at_min=deleted_at_min,
             deleted_at_max=deleted_at_max,
         )
-        rolls = await RollsDAO.find_all(filters)
-        return rolls
+        rolls, next_cursor = await RollsDAO.find_page(
+            filters,
+            limit=limit or settings.ROLLS_PAGE_SIZE,
+            cursor=RollCursor.decode(cursor) if cursor else None,
+            order_by=order_by,
+            fields=fields,
+        )
+        # Строки уже содержат float и datetime, поэтому отдаём их напрямую
+        # через orjson, минуя валидацию pydantic
+        if fields is None:
+            items = [row._asdict() for row in rolls]
+        else:
+            # Колонки сортировки, добавленные для курсора, отбрасываются
+            items = [dict(zip(fields, row)) for row in rolls]
+        next_cursor = next_cursor.encode() if next_cursor is not None else None
+        response = ORJSONResponse({"items": items, "next_cursor": next_cursor})
+        if etag is not None:
+            response.headers["ETag"] = etag
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
 
     except ValueError as e:
         raise HTTPException(
@@ -133,13 +351,212 @@ async def get_rolls(
         )
 
 
-@router_rolls.get("/statistics", response_model=RollStatisticsResponse)
+EXPORT_COLUMNS = ("id", "length", "weight", "created_at", "deleted_at")
+
+
+async def _export_ndjson(filters: RollFilter):
+    async for batch in RollsDAO.stream_all(filters, settings.EXPORT_BATCH_SIZE):
+        # Имена колонок подзапроса — quoted_name (подкласс str), как и в ORJSONResponse
+        yield b"".join(
+            orjson.dumps(
+                row._asdict(), option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+            )
+            for row in batch
+        )
+
+
+async def _export_csv(filters: RollFilter):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    async for batch in RollsDAO.stream_all(filters, settings.EXPORT_BATCH_SIZE):
+        writer.writerows(
+            (
+                row.id,
+                row.length,
+                row.weight,
+                row.created_at.isoformat() if row.created_at else "",
+                row.deleted_at.isoformat() if row.deleted_at else "",
+            )
+            for row in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+@router_rolls.get("/export")
+async def export_rolls(
+    filters: Annotated[RollFilter, Depends()],
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Формат выгрузки"),
+):
+    """
+    Потоковая выгрузка всех рулонов, подходящих под фильтры, в NDJSON или CSV.
+    Строки читаются из БД пачками и отправляются клиенту по мере получения.
+    """
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(filters),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="rolls.csv"'},
+        )
+    return StreamingResponse(
+        _export_ndjson(filters), media_type="application/x-ndjson"
+    )
+
+
+@router_rolls.get(
+    "/summary",
+    response_model=RollSummaryResponse,
+    dependencies=[Depends(conditional_etag)],
+)
+async def get_roll_summary(filters: Annotated[RollFilter, Depends()]):
+    """
+    Количество рулонов под те же фильтры, что и у списка рулонов, и сумма,
+    среднее, минимум и максимум их длины и веса. Считается в БД одним
+    запросом, сами рулоны не передаются.
+    """
+    try:
+        return await RollsDAO.get_summary(filters)
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка базы данных: {str(e)}",
+        )
+
+
+@router_rolls.get(
+    "/statistics/series",
+    response_model=list[RollStatisticsBucket],
+    dependencies=[Depends(conditional_etag)],
+)
+async def get_roll_statistics_series(
+    start_date: datetime = Query(..., description="Начальная дата периода"),
+    end_date: datetime = Query(..., description="Конечная дата периода"),
+    bucket: Literal["hour", "day", "week", "month"] = Query(
+        "day", description="Размер интервала"
+    ),
+):
+    """
+    Количество и вес добавленных и удалённых рулонов по интервалам
+    (час, день, неделя, месяц) за период, включая интервалы без движения.
+    Первый интервал начинается с начала часа/дня/недели/месяца start_date.
+    """
+    try:
+        if end_date < start_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Начальная дата больше конечной даты",
+            )
+
+        series = await RollsDAO.get_statistics_series(start_date, end_date, bucket)
+        return [row._asdict() for row in series]
+
+    except HTTPException:
+        raise
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Некорректные параметры запроса: {str(e)}",
+        )
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка базы данных: {str(e)}",
+        )
+
+
+@router_rolls.get("/statistics/percentiles", response_model=RollPercentilesResponse)
+async def get_roll_percentiles(
+    start_date: datetime = Query(..., description="Начальная дата периода"),
+    end_date: datetime = Query(..., description="Конечная дата периода"),
+):
+    """
+    Перцентили p50/p90/p99 длины и веса рулонов, добавленных за период,
+    и срока хранения (в днях) рулонов, удалённых за период.
+    Считаются по дневным t-digest, поэтому приблизительны: погрешность
+    меньше у крайних перцентилей.
+    """
+    try:
+        if end_date < start_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Начальная дата больше конечной даты",
+            )
+
+        percentiles = await RollsDAO.get_percentiles(start_date, end_date)
+
+        if not percentiles:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Статистика по рулонам за указанный период не найдена",
+            )
+        return percentiles
+
+    except HTTPException:
+        raise
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка базы данных: {str(e)}",
+        )
+
+
+@router_rolls.get("/inventory", response_model=RollInventoryResponse)
+async def get_roll_inventory():
+    """
+    Количество, суммарные длина и вес, минимальные и максимальные значения
+    по рулонам, которые сейчас на складе. Читаются из счётчиков rolls_inventory,
+    поэтому время ответа не зависит от количества рулонов.
+    """
+    try:
+        inventory = await RollsInventoryDAO.get()
+        if inventory is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Счётчики склада не посчитаны, запустите app.tools.inventory",
+            )
+        return {
+            "total_rolls": inventory["count"],
+            "total_length": inventory["length_sum"],
+            "total_weight": inventory["weight_sum"],
+            "min_length": inventory["length_min"],
+            "max_length": inventory["length_max"],
+            "min_weight": inventory["weight_min"],
+            "max_weight": inventory["weight_max"],
+            "updated_at": inventory["updated_at"],
+        }
+
+    except HTTPException:
+        raise
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка базы данных: {str(e)}",
+        )
+
+
+@router_rolls.get(
+    "/statistics",
+    response_model=RollStatisticsResponse,
+    dependencies=[Depends(conditional_etag)],
+)
 async def get_roll_statistics(
+    request: Request,
     start_date: datetime = Query(..., description="Начальная дата периода"),
     end_date: datetime = Query(..., description="Конечная дата периода"),
 ):
     """
     Получение статистики по рулонам за определённый период.
+    Ответ содержит ETag; с совпавшим If-None-Match возвращается 304.
     """
     try:
         if end_date < start_date:
@@ -148,7 +565,9 @@ async def get_roll_statistics(
                 detail="Начальная дата больше конечной даты",
             )
 
-        statistics = await RollsDAO.get_statistics(start_date, end_date)
+        statistics = await RollsDAO.get_statistics(
+            start_date, end_date, version=request.state.data_version
+        )
 
         if not statistics:
             raise HTTPException(
@@ -1,12 +1,17 @@
+import base64
 from datetime import date, datetime
+from typing import Literal
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class RollCreate(BaseModel):
     length: float = Field(gt=0)
     weight: float = Field(gt=0)
 
+class RollBulkResponse(BaseModel):
+    ids: list[int]
+
 class RollResponse(BaseModel):
     id: int
     length: float
@@ -17,6 +22,11 @@ class RollResponse(BaseModel):
     class ConfigDict:
         model_config = ConfigDict(from_attributes=True)
 
+class RollPageResponse(BaseModel):
+    """Страница рулонов и курсор следующей (None, если страница последняя)"""
+    items: list[RollResponse]
+    next_cursor: str | None
+
 class RollFilter(BaseModel):
     id_min: int | None = Field(None, description="Минимальное значение id")
     id_max: int | None = Field(None, description="Максимальное значение id")
@@ -29,6 +39,34 @@ class RollFilter(BaseModel):
     deleted_at_min: datetime | None = Field(None, description="Минимальная дата удаления")
     deleted_at_max: datetime | None = Field(None, description="Максимальная дата удаления")
 
+class RollBatchDelete(BaseModel):
+    ids: list[int] | None = Field(None, description="id удаляемых рулонов")
+    filters: RollFilter | None = Field(None, description="Фильтр удаляемых рулонов")
+
+    @model_validator(mode="after")
+    def check_ids_or_filters(self):
+        if (self.ids is None) == (self.filters is None):
+            raise ValueError("Нужно передать либо ids, либо filters")
+        return self
+
+class RollBatchDeleteResponse(BaseModel):
+    deleted: list[RollResponse]
+    not_found: list[int]
+    already_deleted: list[int]
+
+class RollCursor(BaseModel):
+    """Позиция keyset-пагинации, передаётся клиенту в виде непрозрачной строки"""
+    order_by: Literal["id", "created_at"]
+    id: int
+    created_at: datetime | None = None
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "RollCursor":
+        return cls.model_validate_json(base64.urlsafe_b64decode(token.encode()))
+
 class RollStatisticsResponse(BaseModel):
     total_added: int
     total_deleted: int
@@ -44,4 +82,46 @@ class RollStatisticsResponse(BaseModel):
     day_min_rolls: date | None
     day_max_rolls: date | None
     day_min_weight: date | None
-    day_max_weight: date | None
\ No newline at end of file
+    day_max_weight: date | None
+
+class RollStatisticsBucket(BaseModel):
+    bucket_start: datetime
+    added_count: int
+    deleted_count: int
+    added_weight: float
+    deleted_weight: float
+
+class RollPercentiles(BaseModel):
+    p50: float | None
+    p90: float | None
+    p99: float | None
+
+class RollPercentilesResponse(BaseModel):
+    total_added: int
+    total_deleted: int
+    length: RollPercentiles
+    weight: RollPercentiles
+    dwell: RollPercentiles = Field(description="Срок хранения удалённых рулонов, в днях")
+
+class RollInventoryResponse(BaseModel):
+    """Рулоны, которые сейчас на складе"""
+    total_rolls: int
+    total_length: float
+    total_weight: float
+    min_length: float | None
+    max_length: float | None
+    min_weight: float | None
+    max_weight: float | None
+    updated_at: datetime
+
+class RollSummaryResponse(BaseModel):
+    """Сводка по рулонам, подходящим под фильтры"""
+    total_rolls: int
+    total_length: float
+    total_weight: float
+    avg_length: float | None
+    avg_weight: float | None
+    min_length: float | None
+    max_length: float | None
+    min_weight: float | None
+    max_weight: float | None
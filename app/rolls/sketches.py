@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class TDigest:
+    """
+    t-digest: сжатое представление распределения в виде центроидов
+    (среднее, вес), по которому квантили считаются с ограниченной
+    погрешностью. Центроиды у краёв распределения мельче, поэтому p99
+    точнее p50. Дайджесты объединяются без потери точности, что позволяет
+    хранить их по дням и складывать за любой период.
+
+    compression ограничивает количество центроидов (примерно compression / 2).
+    """
+
+    def __init__(self, means=(), weights=(), minimum=None, maximum=None):
+        self.means = np.asarray(means, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        self.min = minimum
+        self.max = maximum
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    @classmethod
+    def merge(cls, digests, values=(), compression: int = 100) -> "TDigest":
+        """Объединяет дайджесты и отдельные значения в новый дайджест"""
+        digests = [digest for digest in digests if digest.count]
+        values = np.asarray(values, dtype=float)
+        means = np.concatenate([digest.means for digest in digests] + [values])
+        weights = np.concatenate(
+            [digest.weights for digest in digests] + [np.ones(len(values))]
+        )
+        if not len(means):
+            return cls()
+
+        extremes = [digest.min for digest in digests] + [digest.max for digest in digests]
+        if len(values):
+            extremes += [values.min(), values.max()]
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # Центроиды с одинаковым целым значением масштабной функции
+        # k(q) = compression / 2π · asin(2q − 1) сливаются в один
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = np.floor(compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)))
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(k)) + 1))
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return cls(merged_means, merged_weights, float(min(extremes)), float(max(extremes)))
+
+    def quantile(self, q: float) -> float | None:
+        """Значение квантиля q (0..1), None для пустого дайджеста"""
+        if not self.count:
+            return None
+        # Между центрами соседних центроидов значения интерполируются линейно
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate(([0], centers, [self.count]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(q * self.count, positions, values))
+
+    def to_json(self) -> dict:
+        return {
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "TDigest":
+        return cls(data["means"], data["weights"], data["min"], data["max"])
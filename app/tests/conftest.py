@@ -6,8 +6,9 @@ from httpx import ASGITransport, AsyncClient
 from sqlalchemy import insert
 
 from app.config import settings
-from app.database import Base, async_session_maker, engine
+from app.database import Base, async_session_maker, get_engine
 from app.main import app as fastapi_app
+from app.rolls.dao import RollsDailyStatsDAO, RollsInventoryDAO, get_statistics_cache
 from app.rolls.models import Rolls
 
 
@@ -16,7 +17,7 @@ async def prepare_database():
     # Обязательно убеждаемся, что работаем с тестовой БД
     assert settings.MODE == "TEST"
 
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         # Удаление всех заданных нами таблиц из БД
         await conn.run_sync(Base.metadata.drop_all)
         # Добавление всех заданных нами таблиц из БД
@@ -40,6 +41,12 @@ async def prepare_database():
         await session.execute(query)
         await session.commit()
 
+    # Рулоны вставлены напрямую, поэтому дневные агрегаты и счётчики склада
+    # пересчитываем, а кэш статистики от предыдущих тестов сбрасываем
+    await RollsDailyStatsDAO.rebuild()
+    await RollsInventoryDAO.rebuild()
+    get_statistics_cache().clear()
+
 @pytest.fixture(scope="function")
 async def ac():
     "Асинхронный клиент для тестирования эндпоинтов"
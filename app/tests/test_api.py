@@ -1,9 +1,16 @@
+import csv
+import json
 from datetime import datetime
+from operator import itemgetter
 
 import pytest
 from httpx import AsyncClient
 
-from app.rolls.schemas import RollFilter
+from app.config import settings
+from app.database import get_engine, get_slow_query_log
+from app.metrics.collector import registry
+from app.rolls.dao import RollsDAO
+from app.rolls.schemas import RollFilter, RollStatisticsResponse
 
 
 @pytest.mark.parametrize("payload, expected_status, expected_error", [
@@ -21,6 +28,44 @@ async def test_create_roll(ac: AsyncClient, payload, expected_status, expected_e
     if expected_error:
         assert "detail" in response.json()
 
+@pytest.mark.parametrize("content, headers, expected_status, expected_count", [
+    (json.dumps([{"length": 10, "weight": 20}, {"length": 1.5, "weight": 2.25}]), {}, 201, 2),
+    ("[]", {}, 201, 0),
+    ('{"length": 10, "weight": 20}\n\n{"length": 11, "weight": 21}\n',
+     {"Content-Type": "application/x-ndjson"}, 201, 2),
+    (json.dumps([{"length": 10, "weight": 20}, {"length": -1, "weight": 2}]), {}, 422, None),
+    (json.dumps({"length": 10, "weight": 20}), {}, 422, None),  # Не массив
+    ("[{", {}, 400, None),  # Некорректный JSON
+])
+async def test_create_rolls_bulk(ac: AsyncClient, content, headers, expected_status, expected_count):
+    response = await ac.post("/rolls/bulk", content=content, headers=headers)
+
+    assert response.status_code == expected_status
+
+    if expected_status == 201:
+        ids = response.json()["ids"]
+        assert len(ids) == expected_count
+        listed = await ac.get("/rolls/", params={"id_min": 15})
+        assert [roll["id"] for roll in listed.json()["items"]] == ids
+
+@pytest.mark.parametrize("content, headers", [
+    # Лишний рулон некорректен, но ответ 413, а не 422: валидации не было
+    (json.dumps([{"length": 10, "weight": 20}] * 2 + [{"length": -1}]), {}),
+    ('{"length": 10, "weight": 20}\n' * 2 + '{"length": -1}\n',
+     {"Content-Type": "application/x-ndjson"}),
+    # Тело больше BULK_MAX_BYTES
+    (json.dumps([{"length": 10, "weight": 20, "comment": "x" * 1000}]), {}),
+], ids=["json", "ndjson", "bytes"])
+async def test_create_rolls_bulk_too_large(ac: AsyncClient, monkeypatch, content, headers):
+    monkeypatch.setattr(settings, "BULK_MAX_ROLLS", 2)
+    monkeypatch.setattr(settings, "BULK_MAX_BYTES", 500)
+
+    response = await ac.post("/rolls/bulk", content=content, headers=headers)
+
+    assert response.status_code == 413
+    listed = await ac.get("/rolls/", params={"id_min": 15})
+    assert listed.json()["items"] == []
+
 @pytest.mark.parametrize("roll_id, expected_status", [
     (1, 200),  # Успешное удаление
     (9999, 404),  # Не найден
@@ -37,6 +82,24 @@ async def test_delete_from_warehouse(ac: AsyncClient, roll_id, expected_status):
         assert roll_data["id"] == roll_id
         assert roll_data["deleted_at"] is not None  
 
+@pytest.mark.parametrize("payload, expected_status", [
+    ({"ids": [1, 2, 9999]}, 200),
+    ({"filters": {"weight_min": 60}}, 200),
+    ({"filters": {}}, 400),  # Пустой фильтр удалил бы все рулоны
+    ({}, 422),
+    ({"ids": [1], "filters": {"id_min": 1}}, 422),
+])
+async def test_delete_many_from_warehouse(ac: AsyncClient, payload, expected_status):
+    response = await ac.post("/rolls/batch-delete", json=payload)
+
+    assert response.status_code == expected_status
+
+    if expected_status == 200 and "ids" in payload:
+        result = response.json()
+        assert [roll["id"] for roll in result["deleted"]] == [1]
+        assert result["already_deleted"] == [2]
+        assert result["not_found"] == [9999]
+
 @pytest.mark.parametrize("filters, expected_ids", [
     (RollFilter(), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]),  # Без фильтров
     (RollFilter(id_min=13), [13, 14]),  # Фильтр по min id
@@ -72,9 +135,118 @@ async def test_get_rolls(ac: AsyncClient, filters, expected_ids):
 
     assert response.status_code == 200
 
-    roll_ids = [roll["id"] for roll in response.json()]
+    roll_ids = [roll["id"] for roll in response.json()["items"]]
     assert set(roll_ids) == set(expected_ids), f"Ожидалось {expected_ids}, но получено {roll_ids}"
 
+async def test_get_rolls_pages(ac: AsyncClient):
+    roll_ids = []
+    params = {"limit": 4, "order_by": "created_at", "weight_min": 40}
+    while True:
+        response = await ac.get("/rolls/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        roll_ids.extend(roll["id"] for roll in page["items"])
+        assert response.headers.get("X-Next-Cursor") == page["next_cursor"]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert roll_ids == [2, 11, 14, 4, 7, 8, 10, 12, 13]
+
+
+async def test_get_rolls_default_page(ac: AsyncClient, monkeypatch):
+    # Без limit список ограничен ROLLS_PAGE_SIZE, остальное — по next_cursor
+    monkeypatch.setattr(settings, "ROLLS_PAGE_SIZE", 4)
+    roll_ids = []
+    params = {}
+    while True:
+        page = (await ac.get("/rolls/", params=params)).json()
+        assert len(page["items"]) <= 4
+        roll_ids.extend(roll["id"] for roll in page["items"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert roll_ids == list(range(1, 15))
+
+async def test_get_rolls_fields(ac: AsyncClient):
+    rolls = (await ac.get("/rolls/", params={"weight_min": 40})).json()["items"]
+
+    response = await ac.get("/rolls/", params={"weight_min": 40, "fields": "id, weight"})
+    assert response.status_code == 200
+    by_id = itemgetter("id")
+    assert sorted(response.json()["items"], key=by_id) == [
+        {"id": roll["id"], "weight": roll["weight"]} for roll in sorted(rolls, key=by_id)
+    ]
+
+    weights = []
+    params = {"limit": 4, "order_by": "created_at", "weight_min": 40, "fields": "weight"}
+    while True:
+        response = await ac.get("/rolls/", params=params)
+        page = response.json()
+        assert all(roll.keys() == {"weight"} for roll in page["items"])
+        weights.extend(roll["weight"] for roll in page["items"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert sorted(weights) == sorted(roll["weight"] for roll in rolls)
+
+@pytest.mark.parametrize("fields", ["id,password", ",", "id;weight"])
+async def test_get_rolls_fields_invalid(ac: AsyncClient, fields):
+    response = await ac.get("/rolls/", params={"fields": fields})
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("params", [
+    {"cursor": "не курсор"},
+    {"limit": 0},
+    {"limit": 2, "order_by": "weight"},
+])
+async def test_get_rolls_pages_invalid(ac: AsyncClient, params):
+    response = await ac.get("/rolls/", params=params)
+
+    assert response.status_code in (400, 422)
+
+async def test_get_roll_summary(ac: AsyncClient):
+    params = {"weight_min": 50, "length_max": 25}
+    rolls = (await ac.get("/rolls/", params=params)).json()["items"]
+
+    response = await ac.get("/rolls/summary", params=params)
+
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["total_rolls"] == len(rolls) == 5
+    assert summary["total_weight"] == pytest.approx(sum(roll["weight"] for roll in rolls))
+    assert summary["min_length"] == min(roll["length"] for roll in rolls)
+
+    empty = await ac.get("/rolls/summary", params={"id_min": 1000})
+    assert empty.json()["total_rolls"] == 0
+    assert empty.json()["avg_weight"] is None
+
+@pytest.mark.parametrize("filters, expected_ids", [
+    (RollFilter(), list(range(1, 15))),
+    (RollFilter(weight_min=50, length_max=25), [4, 7, 11, 12, 13]),
+    (RollFilter(deleted_at_min=datetime(2030, 1, 1)), []),
+])
+async def test_export_rolls(ac: AsyncClient, filters, expected_ids):
+    query_params = {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in filters.model_dump(exclude_none=True).items()
+    }
+
+    response = await ac.get("/rolls/export", params=query_params)
+    assert response.status_code == 200
+    rolls = [json.loads(line) for line in response.text.splitlines()]
+    assert [roll["id"] for roll in rolls] == expected_ids
+
+    listed = await ac.get("/rolls/", params=query_params)
+    assert rolls == listed.json()["items"]
+
+    response = await ac.get("/rolls/export", params={**query_params, "format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert [int(row["id"]) for row in rows] == expected_ids
+
 @pytest.mark.parametrize("start_date, end_date, expected_status, expected_response", [
     (datetime(2025, 1, 1), datetime(2025, 12, 31), 200, 
      {'total_added': 10, 
@@ -88,8 +260,8 @@ async def test_get_rolls(ac: AsyncClient, filters, expected_ids):
       'total_weight': 490.0, 
       'max_time_between_add_delete': 369.17745498842595, 
       'min_time_between_add_delete': 0.23277005787037036, 
-      'day_min_rolls': '2025-03-02', 
-      'day_max_rolls': '2025-03-02', 
+      'day_min_rolls': '2023-03-06', 
+      'day_max_rolls': '2023-03-06', 
       'day_min_weight': '2023-03-06', 
       'day_max_weight': '2025-01-01'}),
 
@@ -121,4 +293,190 @@ async def test_get_roll_statistics(ac: AsyncClient, start_date, end_date, expect
     assert response.status_code == expected_status
 
     if expected_status == 200:
-        assert response.json() == expected_response
\ No newline at end of file
+        assert response.json() == expected_response
+
+async def test_get_pool(ac: AsyncClient):
+    response = await ac.get("/admin/pool")
+
+    assert response.status_code == 200
+    assert "pool" in response.json()
+
+
+async def test_get_statistics_cache(ac: AsyncClient):
+    params = {"start_date": "2025-01-01T00:00:00", "end_date": "2025-02-01T00:00:00"}
+    await ac.get("/rolls/statistics", params=params)
+    before = (await ac.get("/admin/statistics-cache")).json()
+    await ac.get("/rolls/statistics", params=params)
+    after = (await ac.get("/admin/statistics-cache")).json()
+
+    assert after["hits"] == before["hits"] + 1
+
+
+@pytest.mark.parametrize("bucket, expected_buckets", [
+    ("hour", 8761),
+    ("week", 53),
+    ("month", 13),
+])
+async def test_get_statistics_series(ac: AsyncClient, bucket, expected_buckets):
+    params = {"start_date": "2025-01-01T00:00:00", "end_date": "2026-01-01T00:00:00"}
+    statistics = (await ac.get("/rolls/statistics", params=params)).json()
+
+    response = await ac.get("/rolls/statistics/series", params={**params, "bucket": bucket})
+
+    if expected_buckets > 1000:
+        assert response.status_code == 400
+        return
+    assert response.status_code == 200
+    series = response.json()
+    assert len(series) == expected_buckets
+    assert sum(item["added_count"] for item in series) == statistics["total_added"]
+    assert sum(item["deleted_count"] for item in series) == statistics["total_deleted"]
+
+
+@pytest.mark.parametrize("start_date, end_date, expected_status", [
+    ("2025-01-01T00:00:00", "2025-12-31T00:00:00", 200),
+    ("2020-01-01T00:00:00", "2020-12-31T00:00:00", 404),
+    ("2025-12-31T00:00:00", "2025-01-01T00:00:00", 400),
+])
+async def test_get_percentiles(ac: AsyncClient, start_date, end_date, expected_status):
+    response = await ac.get(
+        "/rolls/statistics/percentiles",
+        params={"start_date": start_date, "end_date": end_date},
+    )
+
+    assert response.status_code == expected_status
+    if expected_status == 200:
+        percentiles = response.json()
+        assert percentiles["total_added"] == 10
+        assert percentiles["weight"]["p50"] <= percentiles["weight"]["p90"] <= percentiles["weight"]["p99"]
+        assert set(percentiles["dwell"]) == {"p50", "p90", "p99"}
+
+
+async def test_get_inventory(ac: AsyncClient):
+    rolls = (await ac.get("/rolls/")).json()["items"]
+    active = [roll for roll in rolls if roll["deleted_at"] is None]
+
+    await ac.post("/rolls/", json={"length": 1000, "weight": 1})
+    await ac.delete(f"/rolls/{active[0]['id']}")
+    response = await ac.get("/rolls/inventory")
+
+    assert response.status_code == 200
+    inventory = response.json()
+    active = [*active[1:], {"length": 1000, "weight": 1}]
+    assert inventory["total_rolls"] == len(active)
+    assert inventory["total_weight"] == pytest.approx(sum(roll["weight"] for roll in active))
+    assert inventory["max_length"] == 1000
+    assert inventory["min_weight"] == min(roll["weight"] for roll in active)
+
+
+async def test_get_metrics(ac: AsyncClient):
+    registry.clear()
+    await ac.delete("/rolls/1")
+    await ac.delete("/rolls/100000")
+    await ac.get("/rolls/", params={"id_max": 5})
+
+    response = await ac.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert 'http_requests_total{method="DELETE",route="/rolls/{roll_id}",status="200"} 1' in lines
+    assert 'http_requests_total{method="DELETE",route="/rolls/{roll_id}",status="404"} 1' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/rolls/"} 1' in lines
+    assert 'db_query_duration_seconds_count{dao_method="RollsDAO.find_page"} 1' in lines
+    assert any(
+        line.startswith('db_query_duration_seconds_count{dao_method="RollsDAO.mark_as_deleted"}')
+        for line in lines
+    )
+
+
+async def test_get_slow_queries(ac: AsyncClient, monkeypatch):
+    log = get_slow_query_log()
+    monkeypatch.setattr(log, "threshold", 0)
+    log.clear()
+    log.instrument(get_engine())
+    try:
+        await ac.get("/rolls/summary", params={"weight_min": 40})
+        await log.wait_plans()
+    finally:
+        log.remove()
+
+    response = await ac.get("/admin/slow-queries")
+
+    assert response.status_code == 200
+    entries = response.json()
+    assert {entry["dao_method"] for entry in entries} >= {
+        "RollsInventoryDAO.get_version", "RollsDAO.get_summary"
+    }
+    # Одновременно снимается один план, поэтому с планом хотя бы первый запрос
+    assert any(
+        entry["plan_status"] == "captured" and "Execution Time" in entry["plan"]
+        for entry in entries
+    )
+    log.clear()
+
+async def test_read_your_writes_cookie(ac: AsyncClient):
+    # Успешная запись ставит cookie, по которой чтение идёт с основной БД
+    response = await ac.post("/rolls/", json={"length": 10, "weight": 20})
+    assert "last_write" in response.cookies
+
+    rejected = await ac.post("/rolls/", json={"length": -1, "weight": 20})
+    assert rejected.status_code == 422
+    assert "last_write" not in rejected.cookies
+
+    listed = await ac.get("/rolls/", headers={"X-Read-Your-Writes": "1"})
+    assert listed.status_code == 200
+    assert "last_write" not in listed.cookies
+
+    replicas = await ac.get("/admin/replicas")
+    assert replicas.json() == []
+
+@pytest.mark.parametrize("url, params, dao_method", [
+    ("/rolls/", {"weight_min": 40, "fields": "id"}, "find_page"),
+    ("/rolls/summary", {"weight_min": 40}, "get_summary"),
+    ("/rolls/statistics", {"start_date": "2025-03-01", "end_date": "2025-04-01"}, "get_statistics"),
+    ("/rolls/statistics/series", {"start_date": "2025-03-01", "end_date": "2025-04-01"},
+     "get_statistics_series"),
+])
+async def test_conditional_get(ac: AsyncClient, monkeypatch, url, params, dao_method):
+    response = await ac.get(url, params=params)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    # Другие параметры — другой ETag
+    other = await ac.get(url, params={**params, "end_date": "2025-05-01", "weight_min": 41})
+    assert other.headers["ETag"] != etag
+
+    # При совпавшем ETag запрос к rolls не выполняется
+    def not_called(*args, **kwargs):
+        raise AssertionError(f"{dao_method} не должен вызываться")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(RollsDAO, dao_method, not_called)
+        cached = await ac.get(url, params=params, headers={"If-None-Match": f'"x", {etag}'})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+    # После записи версия данных меняется
+    await ac.post("/rolls/", json={"length": 10, "weight": 20})
+    changed = await ac.get(url, params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+async def test_statistics_etag_not_served_from_other_worker_cache(ac: AsyncClient, monkeypatch):
+    params = {"start_date": "2023-01-01", "end_date": "2024-01-31"}
+    before = await ac.get("/rolls/statistics", params=params)
+
+    # Запись в другом воркере не сбрасывает кэш этого процесса
+    with monkeypatch.context() as patch:
+        patch.setattr(RollsDAO, "_invalidate_statistics", lambda rolls: None)
+        await RollsDAO.mark_as_deleted(6)
+
+    after = await ac.get("/rolls/statistics", params=params)
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert after.json() != before.json()
+    fresh = await RollsDAO.get_statistics(
+        datetime(2023, 1, 1), datetime(2024, 1, 31), strategy="single"
+    )
+    assert after.json() == json.loads(RollStatisticsResponse(**fresh).model_dump_json())
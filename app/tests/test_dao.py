@@ -1,10 +1,43 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
 from datetime import date, datetime
 from decimal import Decimal
+from statistics import median
 
 import pytest
 
-from app.rolls.dao import RollsDAO
+from sqlalchemy import NullPool, func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import database
+from app import replicas as replicas_module
+from app.config import get_settings, settings
+from app.database import (
+    Base,
+    InstrumentedPool,
+    async_session_maker,
+    dispose_engine,
+    get_engine,
+)
+from app.metrics.slow_queries import SlowQueryLog, is_read_only
+from app.replicas import ReplicaSet, read_from_primary, read_pin, replica_lag
+from app.rolls.cache import StatisticsCache
+from app.rolls.dao import (
+    RollsDailyStatsDAO,
+    RollsDAO,
+    RollsInventoryDAO,
+    get_statistics_cache,
+)
+from app.rolls.group_commit import GroupCommitter, get_group_committer
+from app.rolls.models import Rolls, RollsDailyStats
+from app.rolls.partitioner import run_partitioner
 from app.rolls.schemas import RollFilter
+from app.rolls.sketches import TDigest
 
 
 @pytest.mark.parametrize("roll_id, expected", [
@@ -24,6 +57,19 @@ async def test_mark_as_deleted(roll_id, expected):
     else:
         assert result is None
 
+@pytest.mark.parametrize("ids, filters, expected_deleted, expected_not_found, expected_already_deleted", [
+    ([1, 2, 5, 9999, 5], None, [1, 5], [9999], [2]),
+    ([9999], None, [], [9999], []),
+    (None, RollFilter(weight_max=38), [1, 5, 6], [], []),
+])
+async def test_mark_many_as_deleted(ids, filters, expected_deleted, expected_not_found, expected_already_deleted):
+    result = await RollsDAO.mark_many_as_deleted(ids=ids, filters=filters)
+
+    assert sorted(roll["id"] for roll in result["deleted"]) == expected_deleted
+    assert all(roll["deleted_at"] is not None for roll in result["deleted"])
+    assert result["not_found"] == expected_not_found
+    assert result["already_deleted"] == expected_already_deleted
+
 @pytest.mark.parametrize("filters, expected_ids", [
     (RollFilter(), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]),  # Без фильтров
     (RollFilter(id_min=13), [13, 14]),  # Фильтр по min id
@@ -54,6 +100,93 @@ async def test_find_all(filters, expected_ids):
     print(set(result_ids))
     assert set(result_ids) == set(expected_ids)
 
+async def test_find_with_fields():
+    filters = RollFilter(weight_min=50)
+    rolls = await RollsDAO.find_all(filters)
+
+    # find_all не упорядочивает строки, поэтому сравниваем по id
+    projected = await RollsDAO.find_all(filters, fields=("weight", "id", "weight"))
+    assert sorted((row._asdict() for row in projected), key=lambda row: row["id"]) == [
+        {"weight": roll.weight, "id": roll.id}
+        for roll in sorted(rolls, key=lambda roll: roll.id)
+    ]
+
+    # Колонки сортировки добавляются после запрошенных для курсора
+    page, cursor = await RollsDAO.find_page(
+        filters, limit=3, order_by="created_at", fields=("weight",)
+    )
+    assert page[0]._fields == ("weight", "created_at", "id")
+    assert cursor is not None
+
+    with pytest.raises(ValueError):
+        await RollsDAO.find_all(filters, fields=("id", "password"))
+    with pytest.raises(ValueError):
+        await RollsDAO.find_all(filters, fields=())
+
+@pytest.mark.parametrize("filters", [
+    RollFilter(),
+    RollFilter(weight_min=50, length_max=25),
+    RollFilter(deleted_at_min=datetime(2030, 1, 1)),  # Нет рулонов
+])
+async def test_get_summary(filters):
+    rolls = await RollsDAO.find_all(filters)
+    summary = await RollsDAO.get_summary(filters)
+
+    assert summary["total_rolls"] == len(rolls)
+    assert float(summary["total_weight"]) == pytest.approx(sum(roll.weight for roll in rolls))
+    assert float(summary["total_length"]) == pytest.approx(sum(roll.length for roll in rolls))
+    if rolls:
+        assert float(summary["max_length"]) == max(roll.length for roll in rolls)
+        assert float(summary["min_weight"]) == min(roll.weight for roll in rolls)
+        assert float(summary["avg_weight"]) == pytest.approx(
+            sum(roll.weight for roll in rolls) / len(rolls)
+        )
+    else:
+        assert summary["avg_length"] is None and summary["max_weight"] is None
+
+async def test_find_all_ignores_stale_rollup():
+    filters = RollFilter(deleted_at_min=datetime(2025, 1, 1))
+    expected = {roll.id for roll in await RollsDAO.find_all(filters)}
+    assert expected
+
+    # Дневные агрегаты разошлись с rolls (правка в обход DAO без rebuild)
+    async with async_session_maker() as session:
+        await session.execute(update(RollsDailyStats).values(dwell_max=None))
+        await session.commit()
+    assert {roll.id for roll in await RollsDAO.find_all(filters)} == expected
+    summary = await RollsDAO.get_summary(filters)
+    assert summary["total_rolls"] == len(expected)
+
+    async with async_session_maker() as session:
+        await session.execute(text("TRUNCATE rolls_daily_stats"))
+        await session.commit()
+    assert {roll.id for roll in await RollsDAO.find_all(filters)} == expected
+
+@pytest.mark.parametrize("order_by, limit", [
+    ("id", 5),
+    ("id", 14),
+    ("created_at", 3),
+    ("created_at", 100),
+])
+async def test_find_page(order_by, limit):
+    expected = sorted(
+        await RollsDAO.find_all(RollFilter()),
+        key=lambda roll: (roll.created_at, roll.id) if order_by == "created_at" else roll.id,
+    )
+
+    result_ids = []
+    cursor = None
+    while True:
+        rolls, cursor = await RollsDAO.find_page(
+            RollFilter(), limit=limit, cursor=cursor, order_by=order_by
+        )
+        assert len(rolls) <= limit
+        result_ids.extend(roll.id for roll in rolls)
+        if cursor is None:
+            break
+
+    assert result_ids == [roll.id for roll in expected]
+
 @pytest.mark.parametrize("start_date, end_date, expected", [
     (datetime(2023, 1, 1), datetime(2025, 1, 31), 
      {'total_added': 5, 
@@ -67,8 +200,8 @@ async def test_find_all(filters, expected_ids):
       'total_weight': Decimal('212.00'), 
       'max_time_between_add_delete': 369.17745498842595, 
       'min_time_between_add_delete': 365.0, 
-      'day_min_rolls': date(2024, 3, 11), 
-      'day_max_rolls': date(2024, 3, 11), 
+      'day_min_rolls': date(2023, 3, 6), 
+      'day_max_rolls': date(2023, 3, 6), 
       'day_min_weight': date(2023, 3, 6), 
       'day_max_weight': date(2025, 1, 1)}),
 
@@ -84,8 +217,8 @@ async def test_find_all(filters, expected_ids):
      'total_weight': Decimal('632.00'), 
      'max_time_between_add_delete': 369.17745498842595, 
      'min_time_between_add_delete': 0.23277005787037036, 
-     'day_min_rolls': date(2025, 3, 2), 
-     'day_max_rolls': date(2025, 3, 2), 
+     'day_min_rolls': date(2023, 3, 6), 
+     'day_max_rolls': date(2023, 3, 6), 
      'day_min_weight': date(2023, 3, 6), 
      'day_max_weight': date(2025, 1, 1)}),
     
@@ -113,3 +246,617 @@ async def test_get_statistics(start_date, end_date, expected):
     print(result)
     assert result == expected
 
+@pytest.mark.parametrize("start_date, end_date", [
+    (datetime(2023, 1, 1), datetime(2025, 1, 31)),
+    (datetime(2023, 1, 1), datetime(2026, 1, 31)),
+    (datetime(2025, 3, 4, 12), datetime(2025, 3, 10, 12)),
+    (datetime(2025, 3, 4, 12), datetime(2025, 3, 4, 18)),
+    (datetime(2025, 3, 2), datetime(2025, 3, 16)),
+    (datetime(2025, 3, 8, 10), datetime(2025, 7, 1, 12)),
+    (datetime(2029, 1, 1), datetime(2030, 1, 31)),
+])
+async def test_get_statistics_strategies_match(start_date, end_date):
+    rollup = await RollsDAO.get_statistics(start_date, end_date, strategy="rollup")
+    single = await RollsDAO.get_statistics(start_date, end_date, strategy="single")
+    legacy = await RollsDAO.get_statistics(start_date, end_date, strategy="legacy")
+
+    assert rollup == single
+
+    if legacy is None:
+        assert single is None
+        return
+
+    # При равном количестве рулонов старый расчёт выбирает день произвольно
+    for key in ("day_min_rolls", "day_max_rolls"):
+        single.pop(key)
+        legacy.pop(key)
+    assert single == legacy
+
+
+async def test_daily_stats_maintained_incrementally():
+    await RollsDAO.add(length=11, weight=21, created_at=datetime(2025, 3, 4, 9))
+    await RollsDAO.add(length=3, weight=99, created_at=datetime(2025, 5, 5, 9))
+    await RollsDAO.mark_as_deleted(1)
+    await RollsDAO.mark_as_deleted(5)
+
+    async def load_daily_stats():
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(RollsDailyStats.__table__.columns).order_by(RollsDailyStats.day)
+            )
+            return [dict(row) for row in result.mappings()]
+
+    incremental = await load_daily_stats()
+    await RollsDailyStatsDAO.rebuild()
+    assert incremental == await load_daily_stats()
+
+
+async def test_daily_stats_rebuild_invalidates_statistics():
+    key = ("statistics", datetime(2025, 3, 1), datetime(2025, 3, 31))
+    for rebuild in (RollsDailyStatsDAO.rebuild, RollsDailyStatsDAO.rebuild_digests):
+        version = await RollsInventoryDAO.get_version()
+        get_statistics_cache().set(key, datetime(2025, 3, 31), "stale")
+        await rebuild()
+        # Версия растёт в той же транзакции, кэш процесса сброшен
+        assert await RollsInventoryDAO.get_version() == version + 1
+        assert not get_statistics_cache().get(key)[0]
+
+
+async def test_add_many():
+    created_at = datetime(2025, 3, 4, 10)
+    ids = await RollsDAO.add_many([
+        {"length": 10.555, "weight": 20, "created_at": created_at},
+        {"length": 5, "weight": 7.5, "created_at": created_at, "deleted_at": datetime(2025, 3, 5)},
+    ])
+
+    assert len(ids) == 2
+    # find_all не упорядочивает строки
+    rolls = sorted(await RollsDAO.find_all(RollFilter(id_min=min(ids))), key=lambda roll: roll.id)
+    assert [(roll.id, roll.length, roll.weight) for roll in rolls] == [
+        (ids[0], 10.56, 20.0),
+        (ids[1], 5.0, 7.5),
+    ]
+
+    period = (datetime(2025, 3, 3), datetime(2025, 3, 7))
+    rollup = await RollsDAO.get_statistics(*period, strategy="rollup")
+    assert rollup == await RollsDAO.get_statistics(*period, strategy="single")
+
+
+async def test_statistics_cache():
+    past = (datetime(2023, 1, 1), datetime(2024, 1, 31))
+    current = (datetime(2025, 1, 1), datetime(2100, 1, 1))
+
+    expected_past = await RollsDAO.get_statistics(*past)
+    await RollsDAO.get_statistics(*current)
+    hits = get_statistics_cache().hits
+    assert await RollsDAO.get_statistics(*past) == expected_past
+    assert get_statistics_cache().hits == hits + 1
+
+    # Новый рулон не влияет на закончившийся период
+    await RollsDAO.add(length=1, weight=1, created_at=datetime.now())
+    assert get_statistics_cache().get(("rollup", *past))[0]
+    assert not get_statistics_cache().get(("rollup", *current))[0]
+
+    # Удаление рулона 2023 года меняет статистику прошлого периода
+    await RollsDAO.mark_as_deleted(6)
+    assert not get_statistics_cache().get(("rollup", *past))[0]
+    assert await RollsDAO.get_statistics(*past) == await RollsDAO.get_statistics(
+        *past, strategy="single"
+    )
+
+
+
+async def test_statistics_cache_skips_value_computed_before_write(monkeypatch):
+    period = (datetime(2023, 1, 1), datetime(2024, 1, 31))
+    calculate = RollsDAO._calculate_statistics
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_calculate(*args):
+        statistics = await calculate(*args)
+        started.set()
+        await release.wait()
+        return statistics
+
+    monkeypatch.setattr(RollsDAO, "_calculate_statistics", slow_calculate)
+    task = asyncio.create_task(RollsDAO.get_statistics(*period))
+    await started.wait()
+    # Запись завершилась, пока значение считалось по данным до неё
+    await RollsDAO.mark_as_deleted(6)
+    release.set()
+    await task
+
+    assert not get_statistics_cache().get(("rollup", *period))[0]
+
+
+def test_statistics_cache_closed_ttl(monkeypatch):
+    cache = StatisticsCache(max_size=10, ttl=5, closed_ttl=300)
+    now = time.monotonic()
+    cache.set("past", datetime(2024, 1, 1), 1)
+    monkeypatch.setattr(time, "monotonic", lambda: now + 301)
+    assert cache.get("past") == (False, None)
+
+async def test_slow_query_log():
+    log = SlowQueryLog(size=10, threshold=0)
+    log.instrument(get_engine())
+    try:
+        await RollsDAO.find_all(RollFilter(id_max=3))
+        await log.wait_plans()
+    finally:
+        log.remove()
+
+    [entry] = [entry for entry in log.list() if entry["dao_method"] == "RollsDAO.find_all"]
+    # Фильтр применяется и к rolls, и к rolls_archive; граница архива
+    # читается из строки склада
+    assert entry["parameters"] == [3, 3, RollsInventoryDAO.ROW_ID]
+    assert entry["plan_status"] == "captured"
+    assert "Execution Time" in entry["plan"]
+    # EXPLAIN самого журнала в журнал не попадает
+    assert not any(item["statement"].startswith("EXPLAIN") for item in log.list())
+
+
+async def test_slow_query_log_does_not_execute_writes():
+    log = SlowQueryLog(size=10, threshold=0, explain_timeout=2)
+    log.instrument(get_engine())
+    try:
+        async with async_session_maker() as session:
+            # Строка заблокирована до конца транзакции: EXPLAIN ANALYZE ждал
+            # бы её и повторил запись, план без выполнения снимается сразу
+            await session.execute(update(Rolls).where(Rolls.id == 1).values(weight=7))
+            await log.wait_plans()
+            await session.commit()
+    finally:
+        log.remove()
+
+    [entry] = [entry for entry in log.list() if entry["statement"].startswith("UPDATE")]
+    assert entry["plan_status"] == "captured"
+    assert "Update on rolls" in entry["plan"] and "actual time" not in entry["plan"]
+
+
+@pytest.mark.parametrize("statement, read_only", [
+    ("SELECT * FROM rolls WHERE id = $1", True),
+    ("WITH moved AS (SELECT id FROM rolls) SELECT count(*) FROM moved", True),
+    ("SELECT id FROM rolls_inventory WHERE id = $1 FOR UPDATE", False),
+    ("SELECT id FROM rolls FOR KEY SHARE", False),
+    ("WITH moved AS (DELETE FROM rolls RETURNING *) SELECT count(*) FROM moved", False),
+    ("INSERT INTO rolls (length, weight) VALUES ($1, $2)", False),
+    ("  update rolls SET weight = $1", False),
+    # Повторный запуск сдвинул бы последовательность или повторил DDL секций
+    ("SELECT nextval(pg_get_serial_sequence($1::VARCHAR, $2::VARCHAR)) AS nextval_1 "
+     "FROM generate_series($3::INTEGER, $4::INTEGER) AS generate_series_1", False),
+    ("SELECT setval('rolls_id_seq', $1)", False),
+    ("SELECT ensure_rolls_partitions($1::TIMESTAMP WITHOUT TIME ZONE, $2::INTEGER) "
+     "AS ensure_rolls_partitions_1", False),
+])
+def test_is_read_only(statement, read_only):
+    assert is_read_only(statement) is read_only
+
+
+async def test_ensure_partitions():
+    period = (datetime(2024, 1, 1), datetime(2025, 4, 1))
+    rolls_before = sorted(await RollsDAO.find_all(RollFilter()))
+    statistics_before = await RollsDAO.get_statistics(*period, strategy="single")
+
+    # Тестовые рулоны лежат в DEFAULT-секции и переносятся в месячные
+    created = await RollsDAO.ensure_partitions(since=datetime(2023, 1, 1), months_ahead=1)
+
+    assert created > 12
+    assert await RollsDAO.ensure_partitions(since=datetime(2023, 1, 1), months_ahead=1) == 0
+    async with async_session_maker() as session:
+        in_default = (await session.execute(text("SELECT count(*) FROM rolls_default"))).scalar()
+    assert in_default == 0
+    assert sorted(await RollsDAO.find_all(RollFilter())) == rolls_before
+    assert await RollsDAO.get_statistics(*period, strategy="single") == statistics_before
+
+
+async def test_run_partitioner():
+    async def partitions() -> int:
+        async with async_session_maker() as session:
+            return (await session.execute(text(
+                "SELECT count(*) FROM pg_inherits WHERE inhparent = 'rolls'::regclass"
+            ))).scalar()
+
+    before = await partitions()
+    task = asyncio.create_task(run_partitioner(interval=0.05))
+    try:
+        # Секции текущего месяца и вперёд создаются без перезапуска приложения
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if await partitions() > before:
+                break
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert await partitions() == before + settings.ROLLS_PARTITIONS_AHEAD + 1
+
+
+async def test_archive(monkeypatch):
+    period = (datetime(2023, 1, 1), datetime(2025, 4, 1))
+    rolls_before = await RollsDAO.find_all(RollFilter())
+    page_before = await RollsDAO.find_page(RollFilter(), limit=4, order_by="created_at")
+    statistics_before = {
+        strategy: await RollsDAO.get_statistics(*period, strategy=strategy)
+        for strategy in ("single", "rollup")
+    }
+
+    # Все удалённые тестовые рулоны удалены больше ARCHIVE_AFTER_DAYS назад
+    archived = await RollsDAO.archive(batch_size=3)
+    assert archived == sum(roll.deleted_at is not None for roll in rolls_before)
+    assert await RollsDAO.archive() == 0
+    async with async_session_maker() as session:
+        remaining = (await session.execute(
+            select(func.count()).where(Rolls.deleted_at.is_not(None))
+        )).scalar()
+    assert remaining == 0
+
+    # Дневные агрегаты после пересчёта учитывают архив
+    await RollsDailyStatsDAO.rebuild()
+    get_statistics_cache().clear()
+    assert sorted(await RollsDAO.find_all(RollFilter())) == sorted(rolls_before)
+    assert await RollsDAO.find_page(RollFilter(), limit=4, order_by="created_at") == page_before
+    for strategy, statistics in statistics_before.items():
+        assert await RollsDAO.get_statistics(*period, strategy=strategy) == statistics
+    # Свежие периоды архив не читают
+    assert await RollsDAO.find_all(RollFilter(created_at_min=datetime.now())) == []
+
+    # Граница архива хранится в БД: смена ARCHIVE_AFTER_DAYS не прячет рулоны
+    monkeypatch.setattr(settings, "ARCHIVE_AFTER_DAYS", 100000)
+    get_statistics_cache().clear()
+    assert sorted(await RollsDAO.find_all(RollFilter())) == sorted(rolls_before)
+    assert await RollsDAO.get_statistics(*period, strategy="single") == statistics_before["single"]
+    # Граница архива не сдвигается в будущее
+    with pytest.raises(ValueError):
+        await RollsDAO.archive(before=datetime(2100, 1, 1))
+
+    # Архивный рулон считается уже удалённым
+    archived_id = next(roll.id for roll in rolls_before if roll.deleted_at is not None)
+    result = await RollsDAO.mark_many_as_deleted(ids=[archived_id])
+    assert result["already_deleted"] == [archived_id]
+
+
+async def test_inventory_maintained_incrementally():
+    inventory = await RollsInventoryDAO.get()
+    active = [roll for roll in await RollsDAO.find_all(RollFilter()) if roll.deleted_at is None]
+    assert inventory["count"] == len(active)
+    assert inventory["length_min"] == min(Decimal(str(roll.length)) for roll in active)
+
+    await RollsDAO.add(length=0.5, weight=500, created_at=datetime.now())
+    await RollsDAO.add_many([
+        {"length": 7, "weight": 8, "created_at": datetime.now()},
+        {"length": 9, "weight": 1, "created_at": datetime.now(), "deleted_at": datetime.now()},
+    ])
+    # Удаление рулонов с минимальной длиной и максимальным весом
+    shortest = min(active, key=lambda roll: roll.length)
+    await RollsDAO.mark_as_deleted(shortest.id)
+    await RollsDAO.mark_many_as_deleted(filters=RollFilter(weight_min=500))
+
+    incremental = dict(await RollsInventoryDAO.get())
+    before, after = await RollsInventoryDAO.rebuild()
+    for key in ("count", "length_sum", "length_min", "length_max", "weight_sum", "weight_min", "weight_max"):
+        assert incremental[key] == before[key] == after[key], key
+
+
+
+
+async def test_inventory_concurrent_deletes():
+    active = sorted(
+        (roll for roll in await RollsDAO.find_all(RollFilter()) if roll.deleted_at is None),
+        key=lambda roll: roll.length,
+    )
+    shortest, next_shortest = active[0], active[1]
+
+    # Первая транзакция удаляет самый короткий рулон и держит блокировку
+    # строки счётчиков (её берёт apply_deleted)
+    async with async_session_maker() as session:
+        deleted = (
+            await session.execute(
+                update(Rolls)
+                .where(Rolls.id == shortest.id)
+                .values(deleted_at=datetime.now())
+                .returning(Rolls.__table__.columns)
+            )
+        ).all()
+        await RollsInventoryDAO.apply_deleted(session, deleted)
+
+        # Вторая удаляет следующий по длине и ждёт первую
+        second = asyncio.create_task(RollsDAO.mark_as_deleted(next_shortest.id))
+        await asyncio.sleep(0.3)
+        assert not second.done()
+        await session.commit()
+    await second
+
+    inventory = await RollsInventoryDAO.get()
+    assert inventory["length_min"] == Decimal(str(active[2].length))
+    _, rebuilt = await RollsInventoryDAO.rebuild()
+    assert inventory["length_min"] == rebuilt["length_min"]
+
+async def test_inventory_lock_taken_late(monkeypatch):
+    active = [roll for roll in await RollsDAO.find_all(RollFilter()) if roll.deleted_at is None]
+
+    # Массовое добавление останавливается после COPY, до обновления счётчиков
+    paused, resume = asyncio.Event(), asyncio.Event()
+    apply_added = RollsDailyStatsDAO.apply_added
+
+    async def paused_apply_added(session, rolls):
+        paused.set()
+        await resume.wait()
+        await apply_added(session, rolls)
+
+    monkeypatch.setattr(RollsDailyStatsDAO, "apply_added", paused_apply_added)
+    bulk = asyncio.create_task(
+        RollsDAO.add_many([{"length": 1, "weight": 1, "created_at": datetime.now()}] * 100)
+    )
+    await paused.wait()
+
+    # Удаление не ждёт незавершённую массовую запись: строка счётчиков
+    # блокируется только перед их обновлением
+    try:
+        deleted = await asyncio.wait_for(RollsDAO.mark_as_deleted(active[0].id), 2)
+    finally:
+        resume.set()
+        ids = await bulk
+    assert deleted is not None and len(ids) == 100
+
+    _, rebuilt = await RollsInventoryDAO.rebuild()
+    assert (await RollsInventoryDAO.get())["count"] == rebuilt["count"] == len(active) + 99
+
+async def test_inventory_version():
+    version = await RollsInventoryDAO.get_version()
+
+    roll = await RollsDAO.add(length=1, weight=1)
+    assert await RollsInventoryDAO.get_version() == version + 1
+    # Добавление уже удалённого рулона тоже меняет версию
+    await RollsDAO.add_many([
+        {"length": 2, "weight": 2, "created_at": datetime.now(), "deleted_at": datetime.now()},
+    ])
+    assert await RollsInventoryDAO.get_version() == version + 2
+    await RollsDAO.mark_as_deleted(roll["id"])
+    assert await RollsInventoryDAO.get_version() == version + 3
+    # Повторное удаление ничего не меняет
+    await RollsDAO.mark_as_deleted(roll["id"])
+    assert await RollsInventoryDAO.get_version() == version + 3
+
+async def test_get_statistics_series():
+    series = await RollsDAO.get_statistics_series(
+        datetime(2025, 3, 4, 6), datetime(2025, 3, 8, 12), "day"
+    )
+
+    assert [tuple(row) for row in series] == [
+        (datetime(2025, 3, 4), 1, 1, Decimal("30"), Decimal("30")),
+        (datetime(2025, 3, 5), 1, 1, Decimal("50"), Decimal("40")),
+        (datetime(2025, 3, 6), 1, 0, Decimal("38"), 0),
+        (datetime(2025, 3, 7), 1, 0, Decimal("55"), 0),
+        # Рулон 8 добавлен 8 марта после конца периода
+        (datetime(2025, 3, 8), 0, 1, 0, Decimal("50")),
+    ]
+
+
+async def test_get_percentiles():
+    start, end = datetime(2025, 3, 4, 12), datetime(2025, 4, 20)
+    rolls = await RollsDAO.find_all(RollFilter())
+    added = [roll for roll in rolls if start <= roll.created_at <= end]
+    deleted = [roll for roll in rolls if roll.deleted_at and start <= roll.deleted_at <= end]
+    dwell = TDigest.merge(
+        [], [(roll.deleted_at - roll.created_at).total_seconds() / 86400 for roll in deleted]
+    )
+
+    percentiles = await RollsDAO.get_percentiles(start, end)
+
+    assert percentiles["total_added"] == len(added)
+    assert percentiles["total_deleted"] == len(deleted)
+    assert percentiles["length"]["p50"] == median(roll.length for roll in added)
+    assert percentiles["weight"]["p99"] == max(roll.weight for roll in added)
+    assert percentiles["dwell"]["p90"] == pytest.approx(dwell.quantile(0.9))
+
+    # Дни без дайджестов (до их пересчёта) считаются по rolls
+    async with async_session_maker() as session:
+        await session.execute(
+            update(RollsDailyStats).values(length_digest=None, weight_digest=None, dwell_digest=None)
+        )
+        await session.commit()
+    assert await RollsDAO.get_percentiles(start, end) == percentiles
+    await RollsDailyStatsDAO.rebuild_digests()
+    assert await RollsDAO.get_percentiles(start, end) == percentiles
+
+
+async def test_group_commit():
+    committer = GroupCommitter(window=0.05, max_batch=3)
+    created_at = datetime(2025, 3, 4, 10)
+    results = await asyncio.gather(
+        *(
+            committer.add(length=length, weight=1, created_at=created_at)
+            for length in (1, 2, 3, 4, -5)
+        ),
+        return_exceptions=True,
+    )
+
+    # Пачка из трёх рулонов по max_batch и пачка из двух по таймеру;
+    # вторая откатилась из-за отрицательной длины и записана по одному
+    assert committer.batches == 2
+    assert committer.fallbacks == 1
+    assert [roll["length"] for roll in results[:4]] == [1, 2, 3, 4]
+    assert isinstance(results[4], IntegrityError)
+    assert len({roll["id"] for roll in results[:4]}) == 4
+
+    period = (datetime(2025, 3, 3), datetime(2025, 3, 7))
+    rollup = await RollsDAO.get_statistics(*period, strategy="rollup")
+    assert rollup == await RollsDAO.get_statistics(*period, strategy="single")
+
+
+@pytest.fixture
+async def replica_url():
+    "Пустая БД с той же схемой на том же сервере вместо второго экземпляра Postgres"
+    engine = get_engine()
+    url = engine.url.set(database=f"{engine.url.database}_replica")
+    admin = create_async_engine(engine.url, poolclass=NullPool, isolation_level="AUTOCOMMIT")
+    async with admin.connect() as conn:
+        exists = await conn.scalar(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": url.database}
+        )
+        if not exists:
+            await conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+    await admin.dispose()
+
+    replica = create_async_engine(url, poolclass=NullPool)
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await replica.dispose()
+    return url.render_as_string(hide_password=False)
+
+
+async def test_read_replicas(replica_url, monkeypatch):
+    unreachable = get_engine().url.set(port=1).render_as_string(hide_password=False)
+    replicas = ReplicaSet([replica_url, unreachable], {"poolclass": NullPool}, max_lag=10)
+    monkeypatch.setattr(database, "get_replicas", lambda: replicas)
+
+    # Недоступная реплика исключается из чтения; сервер тестов не в режиме
+    # восстановления, поэтому отставание не определено
+    await replicas.check(timeout=5)
+    assert [health["healthy"] for health in replicas.health] == [True, False]
+    assert replicas.health[0]["lag"] is None and replicas.health[1]["error"]
+
+    # Реплика пуста, поэтому чтение с неё отличается от основной БД
+    assert await RollsDAO.find_all(RollFilter()) == []
+    token = read_from_primary.set(True)
+    try:
+        assert len(await RollsDAO.find_all(RollFilter())) > 0
+    finally:
+        read_from_primary.reset(token)
+
+    # Запись всегда идёт на основную БД
+    roll = await RollsDAO.add(length=1, weight=1)
+    assert await RollsDAO.find_one_or_none(id=roll["id"]) is None
+
+    # Без здоровых реплик чтение возвращается на основную БД
+    replicas.health[0]["healthy"] = False
+    assert await RollsDAO.find_one_or_none(id=roll["id"]) is not None
+    await replicas.dispose()
+
+
+@pytest.mark.parametrize(
+    "state, lag",
+    [
+        ((False, None, False, None), None),
+        ((True, True, True, 120), 0),
+        # WAL receiver отключён: всё полученное применено, но данные устаревают
+        ((True, True, False, 120), 120),
+        ((True, False, True, 3.5), 3.5),
+        ((True, True, False, None), float("inf")),
+    ],
+)
+def test_replica_lag(state, lag):
+    assert replica_lag(*state) == lag
+
+
+async def test_replica_disconnected_from_primary(replica_url, monkeypatch):
+    replicas = ReplicaSet([replica_url], {"poolclass": NullPool}, max_lag=10)
+    # Реплика применила всё полученное, но WAL receiver не работает
+    monkeypatch.setattr(
+        replicas_module,
+        "LAG_QUERY",
+        text("SELECT true, true, false, extract(epoch FROM interval '1 minute')"),
+    )
+    await replicas.check(timeout=5)
+    assert replicas.health[0]["lag"] == 60
+    assert not replicas.health[0]["healthy"]
+    await replicas.dispose()
+
+
+async def test_read_pin(replica_url, monkeypatch):
+    replicas = ReplicaSet([replica_url, replica_url], {"poolclass": NullPool}, max_lag=10)
+    monkeypatch.setattr(database, "get_replicas", lambda: replicas)
+
+    # Без закрепления реплики чередуются
+    assert database.read_session_maker() is not database.read_session_maker()
+
+    # Все чтения одного HTTP-запроса идут на одну реплику
+    token = read_pin.set({})
+    try:
+        pinned = database.read_session_maker()
+        assert all(database.read_session_maker() is pinned for _ in range(3))
+    finally:
+        read_pin.reset(token)
+    await replicas.dispose()
+
+
+async def test_instrumented_pool():
+    engine = create_async_engine(
+        get_engine().url,
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.2,
+    )
+    pool = engine.sync_engine.pool
+    try:
+        conn = await engine.connect()
+
+        # Единственное соединение занято: ожидание заканчивается таймаутом
+        with pytest.raises(PoolTimeoutError):
+            await engine.connect()
+        assert pool.timeouts == 1
+        assert pool.wait_max >= 0.2
+
+        # Соединение освобождается во время ожидания
+        async def release():
+            await asyncio.sleep(0.05)
+            await conn.close()
+
+        releasing = asyncio.create_task(release())
+        async with engine.connect() as waited:
+            assert (await waited.execute(text("SELECT 1"))).scalar() == 1
+        await releasing
+        assert pool.checkouts == 3
+        assert pool.timeouts == 1
+        assert pool.wait_total >= pool.wait_max >= 0.2
+    finally:
+        await engine.dispose()
+
+
+async def test_warm_up_pool_logs_failures(monkeypatch, caplog):
+    unreachable = create_async_engine(get_engine().url.set(port=1), poolclass=NullPool)
+    monkeypatch.setattr(database, "get_engine", lambda: unreachable)
+
+    with caplog.at_level("WARNING", logger="app.database"):
+        await database.warm_up_pool(2)
+
+    assert "не открыто 2 из 2 соединений" in caplog.text
+    await unreachable.dispose()
+
+
+async def test_dispose_engine():
+    engine = get_engine()
+    await dispose_engine()
+    assert async_session_maker.kw["bind"] is None
+
+    # Первая сессия после закрытия создаёт движок заново
+    async with async_session_maker() as session:
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+    assert get_engine() is not engine
+
+
+def test_import_without_environment():
+    # Настройки читаются при первом обращении, а не при импорте app.main
+    env = {"PATH": os.environ["PATH"]}
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.main"], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_singletons_follow_settings(monkeypatch):
+    cache, committer = get_statistics_cache(), get_group_committer()
+    assert get_statistics_cache() is cache
+
+    monkeypatch.setenv("STATISTICS_CACHE_SIZE", "7")
+    monkeypatch.setenv("GROUP_COMMIT_MAX_BATCH", "3")
+    get_settings.cache_clear()
+    try:
+        assert get_statistics_cache() is not cache
+        assert get_statistics_cache().max_size == 7
+        assert get_group_committer() is not committer
+        assert get_group_committer().max_batch == 3
+    finally:
+        monkeypatch.undo()
+        get_settings.cache_clear()
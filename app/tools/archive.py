@@ -0,0 +1,28 @@
+"""
+Перенос давно удалённых рулонов в rolls_archive (например, из cron, если
+фоновое архивирование в приложении выключено через ARCHIVE_ENABLED).
+
+Запуск:
+    python -m app.tools.archive
+    python -m app.tools.archive --batch-size 10000
+"""
+import argparse
+import asyncio
+
+from app.database import dispose_engine
+from app.rolls.dao import RollsDAO, archive_cutoff
+
+
+async def main(args):
+    before = archive_cutoff()
+    archived = await RollsDAO.archive(before, batch_size=args.batch_size)
+    print(f"Перенесено в архив рулонов: {archived} (удалённых до {before:%Y-%m-%d %H:%M})")
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch-size", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
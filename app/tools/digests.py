@@ -0,0 +1,31 @@
+"""
+Пересчёт дневных t-digest в rolls_daily_stats (перцентили длины, веса
+и срока хранения).
+
+Нужен после миграции, добавившей дайджесты: пока у дня дайджеста нет,
+перцентили за этот день считаются по таблице rolls. Пересчёт блокирует
+запись рулонов до своего окончания.
+
+Запуск:
+    python -m app.tools.digests
+"""
+import argparse
+import asyncio
+import time
+
+from app.database import dispose_engine
+from app.rolls.dao import RollsDailyStatsDAO
+
+
+async def main(args):
+    started = time.perf_counter()
+    await RollsDailyStatsDAO.rebuild_digests()
+    print(f"Дайджесты пересчитаны за {time.perf_counter() - started:.1f} с")
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    asyncio.run(main(parser.parse_args()))
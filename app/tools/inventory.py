@@ -0,0 +1,42 @@
+"""
+Сверка счётчиков склада (rolls_inventory) с таблицей rolls.
+
+Счётчики обновляются при каждой записи в rolls; команда пересчитывает их
+с нуля (например, после загрузки рулонов в обход DAO) и показывает,
+насколько они разошлись.
+
+Запуск:
+    python -m app.tools.inventory
+"""
+import argparse
+import asyncio
+
+from app.database import dispose_engine
+from app.rolls.dao import RollsInventoryDAO
+
+FIELDS = (
+    "count",
+    "length_sum",
+    "length_min",
+    "length_max",
+    "weight_sum",
+    "weight_min",
+    "weight_max",
+)
+
+
+async def main(args):
+    before, after = await RollsInventoryDAO.rebuild()
+    drift = [name for name in FIELDS if before[name] != after[name]]
+    for name in FIELDS:
+        mark = " *" if name in drift else ""
+        print(f"{name:<12}{before[name]!s:>16} -> {after[name]!s:<16}{mark}")
+    print("Расхождений нет" if not drift else f"Исправлено полей: {len(drift)}")
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    asyncio.run(main(parser.parse_args()))
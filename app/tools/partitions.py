@@ -0,0 +1,34 @@
+"""
+Создание месячных секций rolls (например, из cron раз в сутки).
+
+Приложение создаёт секции на ROLLS_PARTITIONS_AHEAD месяцев вперёд при
+старте; если оно долго не перезапускается, новые рулоны попадут в
+rolls_default. Команда создаёт недостающие секции и переносит в них строки
+из rolls_default.
+
+Запуск:
+    python -m app.tools.partitions
+    python -m app.tools.partitions --since 2020-01-01 --months-ahead 6
+"""
+import argparse
+import asyncio
+from datetime import date, datetime
+
+from app.database import dispose_engine
+from app.rolls.dao import RollsDAO
+
+
+async def main(args):
+    since = datetime.combine(args.since, datetime.min.time()) if args.since else None
+    created = await RollsDAO.ensure_partitions(since, args.months_ahead)
+    print(f"Создано секций: {created}")
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--since", type=date.fromisoformat, help="Первый месяц (по умолчанию текущий)")
+    parser.add_argument("--months-ahead", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
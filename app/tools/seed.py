@@ -0,0 +1,288 @@
+"""
+Генератор синтетических рулонов для нагрузочных проверок.
+
+Рулоны генерируются векторно (numpy) и загружаются в rolls через
+COPY ... (FORMAT binary) блоками по --chunk-size строк:
+- поступление по дням: недельный профиль (--weekday-weights), рост за год
+  (--growth) и случайный разброс по дням (--daily-cv);
+- время поступления внутри дня — нормальное вокруг --hour-mean;
+- длина — логнормальная с медианой --length-median, вес — длина, умноженная
+  на логнормальную погонную массу с медианой --density-median;
+- время на складе — логнормальное с медианой --dwell-median-days; рулоны,
+  которые к --end ещё не успели уйти, остаются на складе.
+
+id выделяются из последовательности одним блоком, поэтому id растут вместе
+с created_at. Перед загрузкой создаются месячные секции rolls на весь период,
+после загрузки пересчитываются дневные агрегаты и выполняется
+VACUUM ANALYZE.
+
+Запуск (нужна БД с применёнными миграциями):
+    python -m app.tools.seed --rows 10000000 --days 1095
+    python -m app.tools.seed --rows 1000000 --start 2024-01-01 --end 2025-01-01 --truncate
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, text, update
+
+from app.database import dispose_engine, get_engine
+from app.rolls.dao import (
+    RollsDailyStatsDAO,
+    RollsDAO,
+    RollsInventoryDAO,
+    get_statistics_cache,
+)
+from app.rolls.models import Rolls, RollsArchive, RollsDailyStats, RollsInventory
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+# Начало отсчёта timestamp в двоичном формате COPY
+PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+COPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+# numeric(10, 2) в двоичном формате: ndigits, weight, sign, dscale и цифры
+# по основанию 10000. Используются всегда три цифры (две целой части и одна
+# дробной), лишние нули Postgres отбрасывает при чтении.
+NUMERIC = [
+    ("length", ">i4"),
+    ("ndigits", ">i2"),
+    ("weight", ">i2"),
+    ("sign", ">i2"),
+    ("dscale", ">i2"),
+    ("digits", ">i2", 3),
+]
+TIMESTAMP = [("length", ">i4"), ("value", ">i8")]
+NULL = [("length", ">i4")]
+
+
+def row_dtype(deleted: bool) -> np.dtype:
+    """Строка COPY: id, length, weight, created_at, deleted_at"""
+    return np.dtype([
+        ("fields", ">i2"),
+        ("id_length", ">i4"),
+        ("id", ">i4"),
+        ("length", NUMERIC),
+        ("weight", NUMERIC),
+        ("created_at", TIMESTAMP),
+        ("deleted_at", TIMESTAMP if deleted else NULL),
+    ])
+
+
+def fill_numeric(field: np.ndarray, cents: np.ndarray):
+    field["length"] = 14
+    field["ndigits"] = 3
+    field["weight"] = 1
+    field["sign"] = 0
+    field["dscale"] = 2
+    whole, fraction = np.divmod(cents, 100)
+    field["digits"] = np.stack(
+        [whole // 10000, whole % 10000, fraction * 100], axis=1
+    )
+
+
+def encode_rows(ids, length_cents, weight_cents, created_at, deleted_at) -> bytes:
+    """
+    Кодирует рулоны в строки двоичного COPY. Строки с deleted_at и без него
+    имеют разную длину, поэтому кодируются двумя массивами (порядок строк
+    в COPY не важен — id заданы явно).
+    """
+    deleted = ~np.isnat(deleted_at)
+    parts = []
+    for mask, is_deleted in ((deleted, True), (~deleted, False)):
+        rows = np.empty(int(mask.sum()), dtype=row_dtype(is_deleted))
+        rows["fields"] = 5
+        rows["id_length"] = 4
+        rows["id"] = ids[mask]
+        fill_numeric(rows["length"], length_cents[mask])
+        fill_numeric(rows["weight"], weight_cents[mask])
+        rows["created_at"]["length"] = 8
+        rows["created_at"]["value"] = (created_at[mask] - PG_EPOCH).astype(np.int64)
+        if is_deleted:
+            rows["deleted_at"]["length"] = 8
+            rows["deleted_at"]["value"] = (deleted_at[mask] - PG_EPOCH).astype(np.int64)
+        else:
+            rows["deleted_at"]["length"] = -1
+        parts.append(rows.tobytes())
+    return b"".join(parts)
+
+
+def daily_intake(args, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Дни периода и количество рулонов, поступивших в каждый из них"""
+    days = np.arange(
+        np.datetime64(args.start, "D"), np.datetime64(args.end, "D") + 1
+    )
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 — четверг
+    weights = np.asarray(args.weekday_weights, dtype=float)[weekday]
+    weights *= args.growth ** (np.arange(len(days)) / 365)
+    if args.daily_cv > 0:
+        shape = 1 / args.daily_cv**2
+        weights *= rng.gamma(shape, 1 / shape, len(days))
+    counts = rng.multinomial(args.rows, weights / weights.sum())
+    return days, counts
+
+
+def generate_chunk(args, rng, days, counts, offset: int, size: int, end: np.datetime64):
+    """Рулоны с порядковыми номерами [offset, offset + size)"""
+    boundaries = np.cumsum(counts)
+    day_index = np.searchsorted(boundaries, np.arange(offset, offset + size), side="right")
+
+    hour = np.clip(rng.normal(args.hour_mean, args.hour_std, size), 0, 24 - 1e-6)
+    created_at = days[day_index].astype("datetime64[us]") + (
+        hour * MICROSECONDS_PER_DAY / 24
+    ).astype("timedelta64[us]")
+    # Блок состоит из целых дней, так что сортировка упорядочивает его
+    # по времени и id растут вместе с created_at
+    created_at = np.sort(created_at)
+    created_at = np.minimum(created_at, end)
+
+    length = np.clip(
+        rng.lognormal(np.log(args.length_median), args.length_sigma, size),
+        args.length_range[0],
+        args.length_range[1],
+    )
+    density = rng.lognormal(np.log(args.density_median), args.density_sigma, size)
+    length_cents = np.rint(length * 100).astype(np.int64)
+    weight_cents = np.rint(np.clip(length * density, 0.01, 99_999_999.99) * 100).astype(np.int64)
+
+    dwell = rng.lognormal(
+        np.log(args.dwell_median_days * MICROSECONDS_PER_DAY), args.dwell_sigma, size
+    ).astype("timedelta64[us]")
+    deleted_at = created_at + dwell
+    deleted_at[deleted_at > end] = np.datetime64("NaT")
+    return length_cents, weight_cents, created_at, deleted_at
+
+
+def chunks(counts: np.ndarray, chunk_size: int):
+    """
+    Блоки (offset, size) примерно по chunk_size рулонов. Границы блоков
+    совпадают с границами дней, поэтому после сортировки внутри блока
+    created_at не убывает по всей таблице.
+    """
+    boundaries = np.cumsum(counts)
+    targets = np.arange(chunk_size, boundaries[-1], chunk_size)
+    ends = np.unique(boundaries[np.searchsorted(boundaries, targets)])
+    offset = 0
+    for end in [*ends[ends < boundaries[-1]], boundaries[-1]]:
+        if end > offset:
+            yield offset, int(end - offset)
+            offset = int(end)
+
+
+async def reserve_ids(conn, count: int) -> int:
+    """Выделяет count id подряд и возвращает первый"""
+    sequence = func.pg_get_serial_sequence(Rolls.__tablename__, "id")
+    first = (await conn.execute(select(func.nextval(sequence)))).scalar()
+    await conn.execute(select(func.setval(sequence, first + count - 1)))
+    return first
+
+
+async def seed(args):
+    rng = np.random.default_rng(args.random_seed)
+    days, counts = daily_intake(args, rng)
+    end = np.datetime64(args.end, "us") + np.timedelta64(1, "D") - np.timedelta64(1, "us")
+    end = min(end, np.datetime64(datetime.now(), "us"))
+
+    async with get_engine().begin() as conn:
+        if args.truncate:
+            await conn.execute(
+                text(
+                    f"TRUNCATE {Rolls.__tablename__}, {RollsArchive.__tablename__}, "
+                    f"{RollsDailyStats.__tablename__} RESTART IDENTITY"
+                )
+            )
+            # Архив пуст, граница архива больше не нужна
+            await conn.execute(update(RollsInventory).values(archived_before=None))
+        first_id = await reserve_ids(conn, args.rows)
+    # Секции на весь период, чтобы рулоны не легли в rolls_default
+    await RollsDAO.ensure_partitions(datetime.combine(args.start, datetime.min.time()))
+
+    started = time.perf_counter()
+    generation = 0.0
+    async with get_engine().connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+
+        async def source():
+            nonlocal generation
+            yield COPY_HEADER
+            for offset, size in chunks(counts, args.chunk_size):
+                chunk_started = time.perf_counter()
+                ids = np.arange(first_id + offset, first_id + offset + size)
+                chunk = encode_rows(
+                    ids, *generate_chunk(args, rng, days, counts, offset, size, end)
+                )
+                generation += time.perf_counter() - chunk_started
+                yield chunk
+                print(f"\r{offset + size}/{args.rows}", end="", flush=True)
+            yield COPY_TRAILER
+
+        await raw_connection.driver_connection.copy_to_table(
+            Rolls.__tablename__,
+            source=source(),
+            columns=("id", "length", "weight", "created_at", "deleted_at"),
+            format="binary",
+        )
+        await conn.commit()
+    loaded = time.perf_counter() - started
+    print(
+        f"\nЗагружено {args.rows} рулонов за {loaded:.1f} с "
+        f"({args.rows / loaded:.0f} строк/с, из них генерация {generation:.1f} с)"
+    )
+
+    await RollsDailyStatsDAO.rebuild()
+    await RollsInventoryDAO.rebuild()
+    get_statistics_cache().clear()
+    async with get_engine().connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"VACUUM ANALYZE {Rolls.__tablename__}"))
+        await conn.execute(text(f"VACUUM ANALYZE {RollsDailyStats.__tablename__}"))
+    print(f"Готово за {time.perf_counter() - started:.1f} с")
+    await dispose_engine()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--start", type=date.fromisoformat, help="Первый день поступлений")
+    parser.add_argument(
+        "--end", type=date.fromisoformat, help="Последний день поступлений (по умолчанию сегодня)"
+    )
+    parser.add_argument("--days", type=int, default=365, help="Длина периода, если не задан --start")
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--truncate", action="store_true", help="Очистить rolls перед загрузкой")
+    parser.add_argument("--random-seed", type=int, default=None)
+
+    intake = parser.add_argument_group("Поступление")
+    intake.add_argument(
+        "--weekday-weights", type=float, nargs=7, default=[1, 1, 1, 1, 1, 0.4, 0.1],
+        metavar=("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"),
+    )
+    intake.add_argument("--growth", type=float, default=1.2, help="Рост поступлений за год")
+    intake.add_argument("--daily-cv", type=float, default=0.3, help="Разброс по дням")
+    intake.add_argument("--hour-mean", type=float, default=13)
+    intake.add_argument("--hour-std", type=float, default=3)
+
+    rolls = parser.add_argument_group("Рулоны")
+    rolls.add_argument("--length-median", type=float, default=15)
+    rolls.add_argument("--length-sigma", type=float, default=0.5)
+    rolls.add_argument("--length-range", type=float, nargs=2, default=[1, 100])
+    rolls.add_argument("--density-median", type=float, default=2.8, help="Вес на единицу длины")
+    rolls.add_argument("--density-sigma", type=float, default=0.15)
+    rolls.add_argument("--dwell-median-days", type=float, default=10)
+    rolls.add_argument("--dwell-sigma", type=float, default=1.0)
+
+    args = parser.parse_args(argv)
+    args.end = args.end or date.today()
+    args.start = args.start or args.end - timedelta(days=args.days - 1)
+    if args.start > args.end:
+        parser.error("--start позже --end")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(parse_args()))
@@ -2,4 +2,4 @@
 
 alembic upgrade head
 
-gunicorn app.main:app --workers 1 --worker-class uvicorn.workers.UvicornWorker --bind=0.0.0.0:8000
\ No newline at end of file
+gunicorn app.main:app -c gunicorn.conf.py
\ No newline at end of file
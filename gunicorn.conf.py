@@ -0,0 +1,25 @@
+"""
+Настройки gunicorn: gunicorn app.main:app -c gunicorn.conf.py
+
+Переопределяются переменными окружения GUNICORN_BIND, GUNICORN_WORKERS,
+GUNICORN_TIMEOUT и GUNICORN_GRACEFUL_TIMEOUT.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Воркеры асинхронные, поэтому одного на ядро достаточно
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+# UvicornWorker сам выбирает uvloop и httptools, если они установлены
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Приложение импортируется один раз в мастер-процессе, воркеры получают его
+# через fork и сразу переходят к lifespan. Соединения с БД создаются уже
+# в воркере (см. app.database.get_engine), поэтому между процессами не делятся
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+# Время на lifespan shutdown: запись групповых пачек и закрытие пула
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5